@@ -22,7 +22,8 @@ import time
 import json
 import logging
 import os
-from datetime import datetime
+import hashlib
+from datetime import datetime, timezone
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
@@ -51,6 +52,11 @@ class S3Manager:
     Funciona apenas se credenciais AWS estiverem configuradas
     """
     
+    # Manifesto com a versão mais recente (lido pelo backend)
+    MANIFEST_KEY = "siop-data/latest.json"
+    # Tentativas de gravar o manifesto antes de considerar o upload falho
+    MANIFEST_RETRIES = 3
+    
     def __init__(self):
         self.s3_client = None
         self.bucket_name = None
@@ -125,6 +131,10 @@ class S3Manager:
             tamanho_mb = os.path.getsize(caminho_arquivo) / (1024 * 1024)
             logger.info(f"⬆️ Iniciando upload: {os.path.basename(caminho_arquivo)} ({tamanho_mb:.2f} MB)")
             
+            # SHA-256 do conteúdo: o backend confere o download em partes com ele
+            # (o ETag de uploads multipart não é o MD5 do arquivo)
+            sha256_arquivo = self._calcular_sha256(caminho_arquivo)
+            
             self.s3_client.upload_file(
                 caminho_arquivo,
                 self.bucket_name,
@@ -133,7 +143,8 @@ class S3Manager:
                     'Metadata': {
                         'upload-timestamp': str(int(time.time())),
                         'source': 'siop-automation',
-                        'file-size': str(os.path.getsize(caminho_arquivo))
+                        'file-size': str(os.path.getsize(caminho_arquivo)),
+                        'sha256': sha256_arquivo
                     }
                 }
             )
@@ -145,6 +156,14 @@ class S3Manager:
             logger.info(f"📁 S3: s3://{self.bucket_name}/{nome_no_s3}")
             logger.info(f"🔗 URL: {url_s3}")
             
+            # Atualizar manifesto latest.json (backend lê só este objeto): sem manifesto
+            # atualizado o backend continuaria servindo o arquivo anterior, então o
+            # upload só conta como sucesso quando o manifesto também foi gravado
+            if nome_no_s3.startswith("siop-data/") and os.path.basename(nome_no_s3).startswith("SIOP_"):
+                if not self.atualizar_manifesto(caminho_arquivo, nome_no_s3, sha256_arquivo):
+                    logger.error(f"❌ Upload de {nome_no_s3} sem manifesto atualizado - considerado falha")
+                    return False
+            
             return True
             
         except ClientError as e:
@@ -154,6 +173,117 @@ class S3Manager:
             logger.error(f"❌ Erro inesperado no upload: {e}")
             return False
     
+    def _calcular_sha256(self, caminho_arquivo):
+        """Calcula o SHA-256 (hex) do arquivo em blocos"""
+        digest = hashlib.sha256()
+        with open(caminho_arquivo, 'rb') as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(bloco)
+        return digest.hexdigest()
+    
+    def _descrever_arquivo(self, caminho_arquivo):
+        """
+        Conta registros e calcula hash do schema (cabeçalho) de um arquivo SIOP
+        
+        Mesma semântica do backend: a linha logo após o cabeçalho é descartada e
+        os registros são contados pelo parser CSV (campos entre aspas podem ter
+        quebras de linha, então linhas físicas não são registros).
+        
+        Returns:
+            tuple: (row_count, schema_hash) - valores None se não for possível calcular
+        """
+        try:
+            import pandas as pd
+            
+            if caminho_arquivo.lower().endswith('.csv'):
+                with open(caminho_arquivo, 'rb') as f:
+                    cabecalho = f.readline()
+                try:
+                    cabecalho.decode('utf-8-sig')
+                    encoding = 'utf-8-sig'
+                except UnicodeDecodeError:
+                    encoding = 'latin1'
+                texto = cabecalho.decode(encoding)
+                separador = ';' if texto.count(';') >= texto.count(',') else ','
+                colunas = [c.strip().strip('"') for c in texto.strip().split(separador)]
+                
+                # Só a primeira coluna, em blocos: conta registros sem carregar o arquivo
+                row_count = 0
+                for bloco in pd.read_csv(caminho_arquivo, sep=separador, encoding=encoding, skiprows=[1],
+                                         dtype=str, usecols=[0], chunksize=100_000):
+                    row_count += len(bloco)
+            else:
+                df = pd.read_excel(caminho_arquivo, skiprows=[1])
+                colunas = [str(c).strip() for c in df.columns]
+                row_count = len(df)
+            
+            schema_hash = hashlib.sha256("|".join(colunas).encode('utf-8')).hexdigest()[:16]
+            return row_count, schema_hash
+        except Exception as e:
+            logger.warning(f"⚠️ Não foi possível descrever arquivo para o manifesto: {e}")
+            return None, None
+    
+    def atualizar_manifesto(self, caminho_arquivo, nome_no_s3, sha256_arquivo=None):
+        """
+        Publica siop-data/latest.json apontando para o arquivo recém-enviado
+        
+        O manifesto evita que o backend precise listar todo o prefixo siop-data/
+        para descobrir o arquivo mais recente. Falhas transitórias são repetidas
+        (MANIFEST_RETRIES tentativas, com espera crescente).
+        
+        Args:
+            caminho_arquivo (str): Caminho local do arquivo enviado
+            nome_no_s3 (str): Chave do arquivo no S3
+            sha256_arquivo (str): SHA-256 do conteúdo (opcional)
+            
+        Returns:
+            bool: True se o manifesto foi atualizado
+        """
+        row_count, schema_hash = self._descrever_arquivo(caminho_arquivo)
+        
+        for tentativa in range(1, self.MANIFEST_RETRIES + 1):
+            if self._gravar_manifesto(nome_no_s3, sha256_arquivo, row_count, schema_hash):
+                return True
+            if tentativa < self.MANIFEST_RETRIES:
+                espera = 2 ** tentativa
+                logger.warning(f"🔄 Nova tentativa do manifesto em {espera}s ({tentativa}/{self.MANIFEST_RETRIES})")
+                time.sleep(espera)
+        
+        logger.error(f"❌ Manifesto não atualizado após {self.MANIFEST_RETRIES} tentativas")
+        return False
+    
+    def _gravar_manifesto(self, nome_no_s3, sha256_arquivo, row_count, schema_hash):
+        """Uma tentativa de gravar latest.json (True se gravado)"""
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket_name, Key=nome_no_s3)
+            
+            manifesto = {
+                'key': nome_no_s3,
+                'etag': head.get('ETag'),
+                'size': head.get('ContentLength'),
+                'last_modified': head['LastModified'].isoformat() if head.get('LastModified') else None,
+                'row_count': row_count,
+                'schema_hash': schema_hash,
+                'sha256': sha256_arquivo,
+                'uploaded_at': datetime.now(timezone.utc).isoformat(),
+                'source': 'siop-automation'
+            }
+            
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=self.MANIFEST_KEY,
+                Body=json.dumps(manifesto, ensure_ascii=False, indent=2).encode('utf-8'),
+                ContentType='application/json',
+                CacheControl='no-cache'
+            )
+            
+            logger.info(f"🧾 Manifesto atualizado: s3://{self.bucket_name}/{self.MANIFEST_KEY} → {nome_no_s3}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Erro ao atualizar manifesto: {e}")
+            return False
+    
     def gerar_nome_arquivo_padronizado(self, caminho_arquivo_original):
         """
         Gera nome padronizado para arquivo baseado no timestamp e tipo
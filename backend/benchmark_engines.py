@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark das engines de dados (pandas × Polars)
+================================================
+
+Roda o caminho completo sobre uma exportação SIOP real (.csv/.xlsx/.xls) com
+cada engine, via storage local (sem S3):
+- ingestão: download → streaming com filtros → deduplicação → tipagem → índices
+- consultas de /api/search e /api/opportunities sobre a geração publicada
+
+e verifica a equivalência entre as engines (mesmo frame, mesmo blob de busca,
+mesma seletividade dos filtros e respostas JSON idênticas) antes de comparar
+os tempos.
+
+Uso:
+    python benchmark_engines.py caminho/SIOP_emendas.csv [--repeat 3] [--engines pandas,polars]
+
+O cache local (.cache/s3_data) recebe uma entrada própria do benchmark, que é
+removida a cada repetição (cada ingestão é completa) e ao final.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+BENCHMARK_QUERIES = [
+    "/api/opportunities?limit=100000",
+    "/api/opportunities?limit=50&ministry=saúde",
+    "/api/search?q=&limit=50",
+    "/api/search?q=saude&limit=50",
+    "/api/search?q=ministerio da saude&limit=50",
+    "/api/search?q=MS&limit=50",
+    "/api/search?q=fundo nacional&limit=50&include_stats=true",
+    "/api/search?q=&years={year}&rp=6,7,8&limit=50",
+    "/api/search?q=&modalidades=99,90&ufs=SP,RJ,MG&limit=50",
+    "/api/search?q=&partidos=PT,PL&ministry=educa&limit=50",
+    "/api/search?q=saude&years={year}&ufs=SP&include_stats=true&limit=50",
+]
+
+# Campos que mudam a cada geração/requisição (fora da comparação)
+VOLATILE_KEYS = ("last_update", "timestamp", "dataset_version", "cache_info", "processing_time", "search_time_ms")
+
+
+def _prepare_storage(export_path: str) -> str:
+    """Diretório de storage local com a exportação na partição de hoje"""
+    root = tempfile.mkdtemp(prefix='siop_benchmark_')
+    partition = os.path.join(root, 'siop-data', datetime.now().strftime('%Y/%m/%d'))
+    os.makedirs(partition)
+    extension = os.path.splitext(export_path)[1].lower()
+    shutil.copyfile(export_path, os.path.join(partition, f"SIOP_benchmark_engines{extension}"))
+    return root
+
+
+def _strip_volatile(payload):
+    if isinstance(payload, dict):
+        for key in VOLATILE_KEYS:
+            payload.pop(key, None)
+        if isinstance(payload.get('stats'), dict):
+            payload['stats'].pop('cache_last_update', None)
+    return payload
+
+
+def _drop_cached_copy(main) -> None:
+    key = main.s3_service.last_loaded_key
+    if not key:
+        return
+    cache_file = os.path.join(main.s3_service._get_cache_dir(), main.s3_service._get_cache_filename(key))
+    for path in (cache_file, f"{cache_file}.meta"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _run_engine(main, client, engine_name: str, repeat: int) -> Dict:
+    from services.engine_service import create_engine
+
+    main.etl_service.engine = create_engine(engine_name)
+    if main.etl_service.engine.name != engine_name:
+        raise SystemExit(f"Engine '{engine_name}' indisponível (instale as dependências opcionais)")
+
+    ingest_ms: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    built = None
+    for _ in range(repeat):
+        _drop_cached_copy(main)
+        started = time.perf_counter()
+        built = main._build_dataset(force_download=True, source="benchmark")
+        ingest_ms.append((time.perf_counter() - started) * 1000)
+        if not built or built.get('unchanged'):
+            raise SystemExit("Ingestão não produziu uma geração (verifique o arquivo de exportação)")
+        for stage in built['payloads']['pipeline_trace']['stages']:
+            if stage['wall_ms'] is not None and '.' not in stage['name']:
+                stages.setdefault(stage['name'], []).append(stage['wall_ms'])
+
+    main.dataset_store.publish(
+        built['frame'],
+        source="benchmark",
+        source_key=built['source_key'],
+        source_etag=built['source_etag'],
+        indexes=built['indexes'],
+        payloads=built['payloads'],
+    )
+
+    year = built['frame']['Ano'].mode().iloc[0] if 'Ano' in built['frame'].columns and len(built['frame']) else 2025
+    queries: Dict[str, Dict] = {}
+    for template in BENCHMARK_QUERIES:
+        path = template.format(year=year)
+        timings = []
+        response = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(path)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise SystemExit(f"{path} → HTTP {response.status_code}: {response.text[:200]}")
+        queries[path] = {'ms': statistics.median(timings), 'response': _strip_volatile(response.json())}
+
+    _drop_cached_copy(main)
+    return {
+        'built': built,
+        'ingest_ms': statistics.median(ingest_ms),
+        'stages': {name: statistics.median(values) for name, values in stages.items()},
+        'queries': queries,
+    }
+
+
+def _compare(baseline: Dict, other: Dict, name: str) -> List[str]:
+    """Diferenças entre as engines (lista vazia = equivalentes)"""
+    import pandas as pd
+
+    problems = []
+    try:
+        pd.testing.assert_frame_equal(baseline['built']['frame'], other['built']['frame'])
+    except AssertionError as e:
+        problems.append(f"frame da geração difere: {str(e).splitlines()[0]}")
+    try:
+        pd.testing.assert_series_equal(baseline['built']['indexes']['search_blob'], other['built']['indexes']['search_blob'])
+    except AssertionError as e:
+        problems.append(f"blob de busca difere: {str(e).splitlines()[0]}")
+
+    def selectivity(result: Dict) -> List:
+        report = result['built']['payloads']['filter_report']
+        return [report['rows_in'], report['rows_out']] + [(r['name'], r.get('kept'), r.get('removed')) for r in report['rules']]
+    if selectivity(baseline) != selectivity(other):
+        problems.append("seletividade dos filtros difere")
+    if baseline['built']['payloads']['dedup_report'] != other['built']['payloads']['dedup_report']:
+        problems.append("relatório de deduplicação difere")
+
+    for path, result in baseline['queries'].items():
+        if json.dumps(result['response'], sort_keys=True, default=str) != \
+                json.dumps(other['queries'][path]['response'], sort_keys=True, default=str):
+            problems.append(f"resposta difere ({name}): {path}")
+    return problems
+
+
+def _print_report(results: Dict[str, Dict], engines: List[str]):
+    baseline = engines[0]
+    width = max(len(path) for path in results[baseline]['queries']) + 2
+
+    def row(label: str, values: List[Optional[float]]):
+        cells = [f"{v:>12.1f}" if v is not None else f"{'-':>12}" for v in values]
+        speedup = ""
+        if len(values) > 1 and values[0] and values[-1]:
+            speedup = f"{values[0] / values[-1]:>8.2f}x"
+        print(f"{label:<{width}}{''.join(cells)}{speedup}")
+
+    print()
+    print(f"{'etapa / consulta (ms, mediana)':<{width}}{''.join(f'{e:>12}' for e in engines)}{'ganho':>9}")
+    print("-" * (width + 12 * len(engines) + 9))
+    row("ingestão completa", [results[e]['ingest_ms'] for e in engines])
+    for stage in results[baseline]['stages']:
+        row(f"  {stage}", [results[e]['stages'].get(stage) for e in engines])
+    for path in results[baseline]['queries']:
+        row(path, [results[e]['queries'][path]['ms'] for e in engines])
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Compara as engines de dados (pandas × Polars) numa exportação SIOP")
+    parser.add_argument('export', help="Arquivo de exportação SIOP (.csv, .xlsx ou .xls)")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetições por medição (mediana)")
+    parser.add_argument('--engines', default='pandas,polars', help="Engines a comparar (a primeira é a referência)")
+    args = parser.parse_args()
+
+    root = _prepare_storage(args.export)
+    # Configuração antes de importar o app: storage local, sem poller/histórico/delta
+    os.environ.update(
+        STORAGE_BACKEND='local',
+        LOCAL_STORAGE_ROOT=root,
+        FRESHNESS_POLL_ENABLED='false',
+        HISTORY_ENABLED='false',
+        DELTA_INGEST_ENABLED='false',
+    )
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        import main
+        from fastapi.testclient import TestClient
+
+        client = TestClient(main.app)
+        engines = [e.strip() for e in args.engines.split(',') if e.strip()]
+        results = {engine: _run_engine(main, client, engine, args.repeat) for engine in engines}
+
+        rows = len(results[engines[0]]['built']['frame'])
+        print(f"\n📊 {args.export}: {rows:,} oportunidades após filtros e deduplicação")
+        _print_report(results, engines)
+
+        problems = [p for engine in engines[1:] for p in _compare(results[engines[0]], results[engine], engine)]
+        print()
+        if problems:
+            print("❌ Engines NÃO equivalentes:")
+            for problem in problems:
+                print(f"   • {problem}")
+            sys.exit(1)
+        print(f"✅ Engines equivalentes: frame, blob, filtros, deduplicação e {len(BENCHMARK_QUERIES)} consultas idênticos")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -21,17 +21,30 @@ from fastapi.responses import JSONResponse
 import os
 import logging
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import pandas as pd
 from dotenv import load_dotenv
 import re
 import unicodedata
 import hashlib
 import json
+import asyncio
+import time
 from functools import lru_cache
 
 from services.s3_service import S3Service
-from services.etl_service import ETLService
+from services.etl_service import ETLService, build_codigo_emenda
+from services.engine_service import normalize_search_text, search_blob_columns
+from services.dataset_service import DatasetStore, DatasetGeneration
+from services.delta_service import DeltaService
+from services.history_service import HistoryStore
+from services.schema_service import DatasetSchema
+from services.memory_service import (
+    deep_sizeof, directory_size, frame_columns_sizeof, hit_rate, process_memory, records_sizeof
+)
+from services.freshness_service import FreshnessPoller
+from services.trace_service import PipelineTrace
+from services.parallel_service import PartitionExecutor, PartitionedFilter
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -40,36 +53,87 @@ load_dotenv()
 # FUNÇÕES DE SUPORTE GLOBAL PARA BUSCA RÁPIDA
 # ------------------------------
 
-def _normalize_text(text: str) -> str:
-    """Normaliza texto removendo acentos, múltiplos espaços e converte para minúsculas."""
-    if text is None or (isinstance(text, float) and pd.isna(text)):
-        return ""
-    text = str(text).lower()
-    text = unicodedata.normalize('NFD', text)
-    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+def _build_search_blob(df: pd.DataFrame) -> pd.Series:
+    """Cria coluna agregada já normalizada para busca vetorizada (ETL paralelo: por partição de Ano)."""
+    return partition_executor.map_frame(df, etl_service.engine.search_blob, columns=search_blob_columns(df))
 
 
-def _build_search_blob(df: pd.DataFrame) -> pd.Series:
-    """Cria coluna agregada já normalizada para busca vetorizada."""
-    text_cols = [
-        'Autor', 'Ação', 'Localizador', 'Órgão', 'UO', 'Partido',
-        'UF Autor', 'Tipo Autor', 'RP', 'Modalidade', 'Natureza Despesa',
-        'GND', 'Codigo_Emenda'
-    ]
-    existing_cols = [c for c in text_cols if c in df.columns]
-    # Se nenhuma das colunas pré-definidas existir, usa TODAS as colunas disponíveis
-    if not existing_cols:
-        existing_cols = df.columns.tolist()
-    blob = (
-        df[existing_cols]
-        .fillna('')
-        .astype(str)
-        .agg(' '.join, axis=1)
-        .map(_normalize_text)
-    )
-    return blob
+# Siglas de UF: "ms", "mt", "pr" também são siglas de ministério (Saúde, Transportes, Presidência)
+UF_CODES = {
+    'ac', 'al', 'am', 'ap', 'ba', 'ce', 'df', 'es', 'go', 'ma', 'mg', 'ms', 'mt', 'pa',
+    'pb', 'pe', 'pi', 'pr', 'rj', 'rn', 'ro', 'rr', 'rs', 'sc', 'se', 'sp', 'to'
+}
+# Colunas de códigos curtos do blob de busca onde uma sigla pode aparecer com outro sentido
+SIGLA_AMBIGUITY_COLUMNS = ['UF Autor', 'Partido', 'Tipo Autor']
+
+
+def _build_orgao_synonyms(df: pd.DataFrame) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Siglas e nomes curtos oficiais → valores de Órgão (busca por sigla vira filtro direto)
+    
+    siglas_ambiguas: siglas que também são UF ou aparecem como palavra nas colunas
+    de códigos curtos (ex.: "ms" = Saúde ou Mato Grosso do Sul); na busca, o filtro
+    por Órgão delas é somado ao casamento de texto em vez de substituí-lo.
+    """
+    from ministerios_siglas import sinonimos_orgaos
+    
+    orgao_col = 'Órgão' if 'Órgão' in df.columns else 'orgao_orcamentario'
+    if orgao_col not in df.columns:
+        return {"siglas": {}, "nomes_curtos": {}, "siglas_ambiguas": {}}
+    synonyms = sinonimos_orgaos(df[orgao_col].dropna().unique())
+    
+    short_tokens = set(UF_CODES)
+    for col in SIGLA_AMBIGUITY_COLUMNS:
+        if col in df.columns:
+            for value in df[col].dropna().unique():
+                short_tokens.update(normalize_search_text(str(value)).split())
+    synonyms["siglas_ambiguas"] = {
+        sigla: orgaos for sigla, orgaos in synonyms["siglas"].items() if sigla in short_tokens
+    }
+    return synonyms
+
+
+def _search_criteria(df: pd.DataFrame, years: Optional[str], rp: Optional[str], modalidades: Optional[str],
+                     ufs: Optional[str], partidos: Optional[str], ministry: Optional[str]) -> List[Tuple[str, str, object]]:
+    """
+    Filtros de /api/search como critérios (rótulo, tipo, valores) do índice de consulta
+    
+    Mesma interpretação dos filtros em pandas do endpoint: listas separadas por
+    vírgula; valores inválidos ou colunas ausentes não filtram.
+    """
+    def split(value: str) -> List[str]:
+        return [v.strip() for v in value.split(',') if v.strip()]
+    
+    criteria = []
+    if years:
+        try:
+            year_list = [int(y) for y in split(years)]
+            if year_list:
+                criteria.append((f"Anos: {year_list}", 'years', year_list))
+        except ValueError:
+            logger.warning(f"Anos inválidos: {years}")
+    if rp:
+        try:
+            rp_list = [int(r) for r in split(rp)]
+            if rp_list and 'RP' in df.columns:
+                criteria.append((f"RP: {rp_list}", 'rp', rp_list))
+        except ValueError:
+            logger.warning(f"RPs inválidos: {rp}")
+    if modalidades and 'Modalidade' in df.columns:
+        modal_list = split(modalidades)
+        if modal_list:
+            criteria.append((f"Modalidades: {modal_list}", 'modalidades', modal_list))
+    if ufs and 'UF Autor' in df.columns:
+        uf_list = [u.upper() for u in split(ufs)]
+        if uf_list:
+            criteria.append((f"UFs: {uf_list}", 'ufs', uf_list))
+    if partidos and 'Partido' in df.columns:
+        partido_list = [p.upper() for p in split(partidos)]
+        if partido_list:
+            criteria.append((f"Partidos: {partido_list}", 'partidos', partido_list))
+    if ministry and ('Órgão' in df.columns or 'orgao_orcamentario' in df.columns):
+        criteria.append((f"Ministério: {ministry}", 'ministry', ministry))
+    return criteria
 
 
 # Configurar logging
@@ -98,14 +162,30 @@ app.add_middleware(GZipMiddleware, minimum_size=1000)
 # Inicializar serviços
 s3_service = S3Service()
 etl_service = ETLService()
+delta_service = DeltaService()
+dataset_schema = DatasetSchema()
+# ETL paralelo (ETL_PARALLEL_WORKERS > 1): filtros, códigos e blob de busca por partição
+partition_executor = PartitionExecutor()
+history_store = HistoryStore(
+    value_parser=etl_service.parse_monetary_series,
+    dedup_positions=etl_service.engine.dedup_positions,
+)
+
+# Dataset em memória: gerações imutáveis trocadas atomicamente a cada refresh
+# (em produção, usar Redis)
+dataset_store = DatasetStore()
 
-# Variável global para cache simples (em produção, usar Redis)
-cached_opportunities = None
-last_update = None
+# Refresh em andamento (single-flight): requisições concorrentes compartilham a mesma carga
+_refresh_lock = asyncio.Lock()
+_refresh_task: Optional[asyncio.Task] = None
 
-# Cache pré-computado de todos os registros já normalizados (lista de dicts)
-_cached_full_json_records = None
-_cached_full_json_hash = None
+# Falhas consecutivas de ingestão: requisições só voltam a disparar o refresh
+# depois do backoff (o poller e os endpoints explícitos não esperam)
+_refresh_failures = 0
+_refresh_retry_at = 0.0
+
+# Sincronização do histórico de snapshots (single-flight, roda no executor)
+_history_task: Optional[asyncio.Future] = None
 
 # Helper para UTC timezone-aware datetime (corrige DeprecationWarning)
 def utc_now():
@@ -114,6 +194,8 @@ def utc_now():
 
 # Cache da conversão JSON para evitar reconversões desnecessárias
 _json_conversion_cache = {}
+_json_cache_hits = 0
+_json_cache_misses = 0
 _last_cache_cleanup = utc_now()
 
 def normalize_field_names(record: Dict) -> Dict:
@@ -172,142 +254,130 @@ def normalize_field_names(record: Dict) -> Dict:
     
     return normalized_record
 
-def create_unique_codigo_and_deduplicate(df: pd.DataFrame) -> pd.DataFrame:
+def _build_codigo_emenda(df: pd.DataFrame) -> pd.Series:
+    """Código oficial AAAA-BBBB-CCCC de cada linha (ETL paralelo: por partição de Ano)"""
+    return partition_executor.map_frame(df, build_codigo_emenda, columns=['Ano', 'Nro. Emenda'])
+
+def create_unique_codigo_and_deduplicate(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict]:
     """
     Cria código único da emenda (formato Portal da Transparência) e remove duplicatas
     APLICADO SEMPRE AOS DADOS REAIS - GARANTINDO UNICIDADE NO CACHE PRINCIPAL
     
+    Entre registros com o mesmo código, vence o de maior Empenhado e, no empate,
+    maior Dotação Atual (primeira ocorrência em empate total). Códigos gerados
+    de forma vetorizada; contagem e escolha do vencedor sobre os códigos do hash.
+    
     Args:
         df: DataFrame com dados SIOP brutos
         
     Returns:
-        DataFrame com códigos únicos e duplicatas removidas
+        (DataFrame com códigos únicos e duplicatas removidas, relatório de duplicatas)
     """
     logger.info(f"🔄 Criando códigos únicos e deduplicando {len(df)} registros...")
+    report = {"total_records": len(df), "unique_codes": None, "duplicate_records": 0, "top_duplicates": []}
+    
+    if 'Ano' not in df.columns or 'Nro. Emenda' not in df.columns:
+        logger.warning("⚠️ Colunas 'Ano' ou 'Nro. Emenda' não encontradas - não foi possível criar códigos únicos")
+        return df, report
     
     # PRIMEIRA ETAPA: CRIAR CÓDIGO ÚNICO DA EMENDA (Portal da Transparência)
-    # Formato: AAAA-BBBB-CCCC (Ano + Código Autor + Número Sequencial)
-    if 'Ano' in df.columns and 'Nro. Emenda' in df.columns:
-        logger.info("🔑 Criando códigos únicos das emendas (formato oficial federal)...")
-        
-        def create_codigo_emenda(row):
-            try:
-                ano = str(int(row['Ano']))  # AAAA (4 dígitos do ano)
-                nro_emenda = str(row['Nro. Emenda']).zfill(8)  # Garantir 8 dígitos
-                
-                # Extrair componentes do número da emenda (8 dígitos = BBBB + CCCC)
-                codigo_autor = nro_emenda[:4]      # BBBB: Código SIOP do autor
-                num_sequencial = nro_emenda[4:]    # CCCC: Número sequencial da emenda
-                
-                # Formato oficial do Portal da Transparência: AAAA-BBBB-CCCC
-                codigo_emenda = f"{ano}-{codigo_autor}-{num_sequencial}"
-                return codigo_emenda
-                
-            except Exception as e:
-                logger.warning(f"⚠️ Erro ao criar código da emenda: {e} | Row data: Ano={row.get('Ano')}, Nro={row.get('Nro. Emenda')}")
-                # Fallback para casos excepcionais
-                return f"ERRO-{row.get('Ano', 'XXXX')}-{str(row.get('Nro. Emenda', 'XXXXXXXX')).zfill(8)}"
-        
-        # Aplicar criação do código para todas as linhas
-        df['Codigo_Emenda'] = df.apply(create_codigo_emenda, axis=1)
-        
-        # VERIFICAÇÃO DE DUPLICATAS (chave primária do sistema federal)
-        total_registros = len(df)
-        codigos_unicos = df['Codigo_Emenda'].nunique()
-        duplicatas = total_registros - codigos_unicos
-        
-        logger.info(f"🔍 Verificação de unicidade dos códigos das emendas:")
-        logger.info(f"   📊 Total de registros: {total_registros:,}")
-        logger.info(f"   🔑 Códigos únicos: {codigos_unicos:,}")
-        logger.info(f"   🔍 Duplicatas detectadas: {duplicatas:,}")
+    logger.info("🔑 Criando códigos únicos das emendas (formato oficial federal)...")
+    df = df.reset_index(drop=True)
+    df['Codigo_Emenda'] = _build_codigo_emenda(df)
+    
+    # VERIFICAÇÃO DE DUPLICATAS (chave primária do sistema federal) - uma contagem por código
+    occurrences = df['Codigo_Emenda'].value_counts(sort=True)
+    repeated = occurrences[occurrences > 1]
+    duplicatas = int(repeated.sum() - len(repeated))
+    report.update({
+        "unique_codes": int(len(occurrences)),
+        "duplicate_records": duplicatas,
+        "duplicated_codes": int(len(repeated)),
+        "top_duplicates": [{"codigo": codigo, "ocorrencias": int(count)} for codigo, count in repeated.head(10).items()],
+    })
+    
+    logger.info(f"🔍 Verificação de unicidade dos códigos das emendas:")
+    logger.info(f"   📊 Total de registros: {len(df):,}")
+    logger.info(f"   🔑 Códigos únicos: {len(occurrences):,}")
+    logger.info(f"   🔍 Duplicatas detectadas: {duplicatas:,}")
+    logger.info(f"   📋 Exemplos de códigos criados: {df['Codigo_Emenda'].head(5).tolist()}")
+    
+    if duplicatas == 0:
+        logger.info("✅ Perfeito! Todos os códigos são únicos - nenhuma duplicata encontrada!")
+        return df, report
+    
+    logger.warning(f"⚠️ ATENÇÃO: {duplicatas} duplicatas encontradas!")
+    for item in report["top_duplicates"][:5]:
+        logger.warning(f"     • {item['codigo']}: {item['ocorrencias']} ocorrências")
+    
+    # DEDUPLICAÇÃO: vencedor por código = maior (Empenhado, Dotação)
+    empenhado_col = next((c for c in ['Empenhado', 'empenhado'] if c in df.columns), None)
+    dotacao_col   = next((c for c in ['Dotação Atual Emenda', 'dotacao_atual'] if c in df.columns), None)
+    
+    # Colunas ausentes valem zero; valores já numéricos na ingestão (parser é no-op)
+    zeros = pd.Series(0.0, index=df.index)
+    empenhado = etl_service.parse_monetary_series(df[empenhado_col]) if empenhado_col else zeros
+    dotacao = etl_service.parse_monetary_series(df[dotacao_col]) if dotacao_col else zeros
+    
+    # Vencedores escolhidos pela engine de dados, sem sort_values/drop_duplicates no frame
+    winners = etl_service.engine.dedup_positions(df['Codigo_Emenda'], empenhado.to_numpy(), dotacao.to_numpy())
+    deduplicated = df.iloc[winners].reset_index(drop=True)
+    
+    removidos = len(df) - len(deduplicated)
+    report["removed_records"] = removidos
+    logger.info("✅ Deduplicação concluída:")
+    logger.info(f"   📊 Registros antes: {len(df):,}")
+    logger.info(f"   📊 Registros depois: {len(deduplicated):,}")
+    logger.info(f"   🗑️ Registros removidos: {removidos:,}")
+    logger.info(f"   🎯 Taxa de deduplicação: {(removidos/len(df))*100:.1f}%")
+    
+    return deduplicated, report
+
+def build_summary_payload(df: pd.DataFrame) -> Dict:
+    """
+    Resumo completo de /api/summary para uma geração do dataset
+    
+    Agregados por dimensão + lista de ministérios enriquecida (relacionamento
+    Innovatis e siglas oficiais). Calculado uma vez na construção da geração.
+    """
+    summary = etl_service.generate_summary(df)
+    
+    # Sistema oficial de siglas de ministérios (índice de resolução montado na importação)
+    from ministerios_siglas import resolver_orgaos
+    
+    # Adicionar lista completa de ministérios para o frontend
+    orgao_col = etl_service._find_column(df, ['Órgão', 'orgao_orcamentario', 'ministerio', 'orgao'])
+    if orgao_col and summary.get("by_ministry"):
+        by_ministry_count = summary["by_ministry"]["count"]
+        by_ministry_value = summary["by_ministry"]["value"]
+        
+        # Cada órgão distinto resolvido uma vez: relacionamento Innovatis + siglas oficiais
+        resolved = resolver_orgaos(by_ministry_count)
+        all_ministries = [
+            {
+                "ministry": ministry,
+                "count": count,
+                "total_value": by_ministry_value.get(ministry, 0),
+                **resolved[ministry],
+            }
+            for ministry, count in by_ministry_count.items()
+        ]
         
-        if duplicatas > 0:
-            logger.warning(f"⚠️ ATENÇÃO: {duplicatas} duplicatas encontradas!")
-            # Log das primeiras duplicatas para debug
-            duplicados = df[df['Codigo_Emenda'].duplicated(keep=False)].sort_values('Codigo_Emenda')
-            logger.warning(f"   Exemplos de códigos duplicados:")
-            for codigo in duplicados['Codigo_Emenda'].head(5).tolist():
-                count = (df['Codigo_Emenda'] == codigo).sum()
-                logger.warning(f"     • {codigo}: {count} ocorrências")
-        else:
-            logger.info("✅ Perfeito! Todos os códigos são únicos - nenhuma duplicata encontrada!")
+        # Ordenar por contagem (maiores primeiro)
+        all_ministries.sort(key=lambda x: x["count"], reverse=True)
         
-        # Log de exemplos dos códigos criados
-        exemplos = df['Codigo_Emenda'].head(5).tolist()
-        logger.info(f"   📋 Exemplos de códigos criados: {exemplos}")
+        summary["all_ministries"] = all_ministries
         
-        # DEDUPLICAÇÃO: Remover duplicatas baseado no código único
-        if duplicatas > 0:
-            logger.info(f"🔄 Iniciando deduplicação de {duplicatas} registros duplicados...")
-
-            # --- Estrutura auxiliar de priorização -------------------------
-            empenhado_col = next((c for c in ['Empenhado', 'empenhado'] if c in df.columns), None)
-            dotacao_col   = next((c for c in ['Dotação Atual Emenda', 'dotacao_atual'] if c in df.columns), None)
-
-            # As colunas de priorização podem estar ausentes dependendo do estágio do ETL;
-            # se não existirem, preenchemos com zeros para manter a lógica consistente.
-            if empenhado_col is None:
-                df['_tmp_empenhado'] = 0
-                empenhado_col = '_tmp_empenhado'
-            if dotacao_col is None:
-                df['_tmp_dotacao'] = 0
-                dotacao_col = '_tmp_dotacao'
-
-                        # Conversão robusta de valores monetários (formato brasileiro)
-            def _brl_to_float(series: pd.Series) -> pd.Series:
-                return (
-                    pd.to_numeric(
-                        series.astype(str)
-                              # remover espaços e símbolo de moeda
-                              .str.replace(r'[^0-9,.-]', '', regex=True)
-                              # remover separador de milhar '.'
-                              .str.replace('.', '', regex=False)
-                              # trocar vírgula decimal por ponto
-                              .str.replace(',', '.', regex=False),
-                        errors='coerce'
-                    )
-                    .fillna(0)
-                )
-
-            # Garantir que sejam numéricos para correta ordenação
-            df[empenhado_col] = _brl_to_float(df[empenhado_col])
-            df[dotacao_col]  = _brl_to_float(df[dotacao_col])
-
-            df_antes = len(df)
-
-            # Ordena pelos critérios de prioridade e mantém o 1º de cada código
-            df_sorted = (
-                df
-                .sort_values(by=[empenhado_col, dotacao_col], ascending=[False, False])
-                .drop_duplicates(subset=['Codigo_Emenda'], keep='first')
-                .reset_index(drop=True)
-            )
-
-            # Limpar colunas temporárias, se criadas
-            df_sorted.drop(columns=[c for c in ['_tmp_empenhado', '_tmp_dotacao'] if c in df_sorted.columns], inplace=True)
-
-            df_depois = len(df_sorted)
-            removidos = df_antes - df_depois
-
-            logger.info("✅ Deduplicação concluída:")
-            logger.info(f"   📊 Registros antes: {df_antes:,}")
-            logger.info(f"   📊 Registros depois: {df_depois:,}")
-            logger.info(f"   🗑️ Registros removidos: {removidos:,}")
-            logger.info(f"   🎯 Taxa de deduplicação: {(removidos/df_antes)*100:.1f}%")
-
-            # Verificação final
-            codigos_finais = df_sorted['Codigo_Emenda'].nunique(dropna=False)
-            if codigos_finais == df_depois:
-                logger.info("✅ SUCESSO: Cada código de emenda agora tem apenas 1 registro!")
-            else:
-                logger.warning(f"⚠️ Ainda há {df_depois - codigos_finais} duplicatas restantes")
-
-            df = df_sorted
+        # Manter compatibilidade - apenas os com relacionamento
+        ministries_with_relationship = [m for m in all_ministries if m["has_relationship"]]
+        summary["top_ministries"] = ministries_with_relationship[:10]
         
-        return df
-    else:
-        logger.warning("⚠️ Colunas 'Ano' ou 'Nro. Emenda' não encontradas - não foi possível criar códigos únicos")
-        return df
+        # Estatísticas adicionais
+        summary["ministries_count"] = len(all_ministries)
+        summary["ministries_with_relationship_count"] = len(ministries_with_relationship)
+        summary["ministries_without_relationship_count"] = len(all_ministries) - len(ministries_with_relationship)
+    
+    return summary
 
 def _generate_dataframe_hash(df: pd.DataFrame) -> str:
     """
@@ -372,11 +442,12 @@ def convert_dataframe_to_json(df: pd.DataFrame) -> List[Dict]:
     NOTA: Deduplicação é feita na função central _process_siop_data() para garantir números corretos
     OTIMIZAÇÃO: Cache implementado para evitar reconversões desnecessárias
     """
-    global _json_conversion_cache
+    global _json_conversion_cache, _json_cache_hits, _json_cache_misses
     
     # Verificar cache primeiro
     df_hash = _generate_dataframe_hash(df)
     if df_hash in _json_conversion_cache:
+        _json_cache_hits += 1
         cached_entry = _json_conversion_cache[df_hash]
         logger.info(f"✅ Cache hit: {len(df)} registros (hash: {df_hash[:8]}...)")
         
@@ -390,11 +461,35 @@ def convert_dataframe_to_json(df: pd.DataFrame) -> List[Dict]:
             # Remove entrada inválida e continua para reprocessar
             del _json_conversion_cache[df_hash]
     
+    _json_cache_misses += 1
     logger.info(f"🔄 Convertendo {len(df)} registros para JSON (cache miss)...")
     
     # Limpar cache periodicamente
     _cleanup_json_cache()
     
+    normalized_records = _frame_to_records(df)
+    
+    # Salvar no cache para futuras requisições
+    _json_conversion_cache[df_hash] = {
+        'data': normalized_records,
+        'timestamp': utc_now(),
+        'size': len(normalized_records)
+    }
+    
+    logger.info(f"✅ Conversão concluída: {len(normalized_records)} registros (cache salvo: {df_hash[:8]}...)")
+    return normalized_records
+
+def _frame_to_records(df: pd.DataFrame) -> List[Dict]:
+    """
+    Converte o DataFrame para registros do frontend, sem tocar no cache JSON
+    
+    Usado pela construção da geração (thread do executor) para os registros
+    completos; o cache JSON fica só para os subconjuntos das requisições.
+    """
+    # Trabalhar sobre cópia (o df pode ser fatia da geração publicada, imutável),
+    # já na representação original: categóricas/Arrow/Int16 → object
+    df = dataset_schema.to_object_frame(df)
+    
     # Processar colunas monetárias (dados reais do S3)
     monetary_columns = [
         'Dotação Inicial Emenda', 'Dotação Atual Emenda', 
@@ -406,33 +501,8 @@ def convert_dataframe_to_json(df: pd.DataFrame) -> List[Dict]:
         if col in df.columns:
             logger.info(f"💰 Processando coluna '{col}'...")
             
-            # Função para converter cada valor
-            def clean_monetary_value(val):
-                """Limpa e converte um valor monetário (string ou numérico) para float."""
-                if pd.isna(val) or val is None or val == '':
-                    return 0.0
-                
-                if isinstance(val, (int, float)):
-                    return float(val)
-                
-                if isinstance(val, str):
-                    try:
-                        clean_val = str(val).strip()
-                        # Lógica para formato brasileiro: "1.234,56" → "1234.56"
-                        clean_val = clean_val.replace('.', '').replace(',', '.')
-                        
-                        if not clean_val or clean_val.lower() in ['na', 'n/a', 'nan']:
-                            return 0.0
-                        
-                        return float(clean_val)
-                    except (ValueError, TypeError):
-                        logger.warning(f"⚠️ Não foi possível converter o valor monetário '{val}' para número.")
-                        return 0.0
-                
-                return 0.0
-            
-            # Aplicar conversão na coluna inteira (usando .loc para evitar SettingWithCopyWarning)
-            df.loc[:, col] = df[col].apply(clean_monetary_value)
+            # Colunas da geração já são float (convertidas na ingestão); o parser é no-op nesse caso
+            df[col] = etl_service.parse_monetary_series(df[col])
             
             # Log de amostra
             sample_values = df[col].head(3).tolist()
@@ -452,15 +522,6 @@ def convert_dataframe_to_json(df: pd.DataFrame) -> List[Dict]:
         normalized_records.append(normalized_record)
     
     logger.info(f"✅ Normalização concluída: {len(normalized_records)} registros")
-    
-    # Salvar no cache para futuras requisições
-    _json_conversion_cache[df_hash] = {
-        'data': normalized_records,
-        'timestamp': utc_now(),
-        'size': len(normalized_records)
-    }
-    
-    logger.info(f"✅ Conversão concluída: {len(normalized_records)} registros (cache salvo: {df_hash[:8]}...)")
     return normalized_records
 
 @app.get("/")
@@ -476,7 +537,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check da API com informações sobre dados carregados"""
-    global cached_opportunities
+    dataset = dataset_store.current()
     
     health_info = {
         "status": "healthy",
@@ -488,23 +549,31 @@ async def health_check():
     }
     
     # Adicionar informações sobre dados carregados (APÓS DEDUPLICAÇÃO)
-    if cached_opportunities is not None:
+    if dataset is not None:
+        frame = dataset.frame
         health_info["data_status"] = {
-            "total_opportunities": len(cached_opportunities),
-            "last_update": last_update,
-            "unique_codes": cached_opportunities['Codigo_Emenda'].nunique() if 'Codigo_Emenda' in cached_opportunities.columns else "N/A",
+            "total_opportunities": len(frame),
+            "last_update": dataset.last_update,
+            "dataset_version": dataset.version,
+            "stale": dataset_store.is_stale,
+            "refresh_in_progress": _refresh_task is not None and not _refresh_task.done(),
+            "refresh_failures": _refresh_failures,
+            "refresh_retry_in_seconds": round(_refresh_backoff_remaining(), 1),
+            "source_key": dataset.source_key,
+            "ingest_delta": dataset.payloads.get('ingest_delta'),
+            "unique_codes": frame['Codigo_Emenda'].nunique() if 'Codigo_Emenda' in frame.columns else "N/A",
             "data_source": "cache_siop_s3_real_data_deduplicated"
         }
         
         # Calcular valor total se possível
         valor_col = None
         for col in ['Empenhado', 'Dotação Atual Emenda']:
-            if col in cached_opportunities.columns:
+            if col in frame.columns:
                 valor_col = col
                 break
         
         if valor_col:
-            total_value = cached_opportunities[valor_col].sum()
+            total_value = frame[valor_col].sum()
             health_info["data_status"]["total_value"] = float(total_value)
     else:
         health_info["data_status"] = {
@@ -513,15 +582,18 @@ async def health_check():
             "data_source": "cache_empty"
         }
     
+    health_info["freshness"] = freshness_poller.status()
+    
     return health_info
 
 @app.post("/api/clear-cache")
 async def clear_cache():
     """
     Endpoint para forçar a limpeza de todos os caches (dados e JSON).
-    """
-    global cached_opportunities, last_update, _cached_full_json_records, _cached_full_json_hash
     
+    A geração em memória NÃO é descartada: ela é marcada como desatualizada e
+    continua servindo requisições enquanto a próxima é construída em background.
+    """
     cache_dir = Path("./cache_data")
     files_deleted = []
     
@@ -533,13 +605,12 @@ async def clear_cache():
             except OSError as e:
                 logger.error(f"Erro ao deletar cache {f}: {e}")
 
-    # Resetar variáveis de cache em memória
-    cached_opportunities = None
-    last_update = None
-    _cached_full_json_records = None
-    _cached_full_json_hash = None
+    # Caches derivados (JSON) e revalidação da geração corrente
+    _json_conversion_cache.clear()
+    dataset_store.mark_stale()
+    _schedule_refresh(source="limpeza de cache")
     
-    logger.info("Cache em memória e arquivos .pkl foram limpos.")
+    logger.info("Arquivos .pkl limpos; geração atual mantida até o refresh concluir.")
     
     return {
         "message": "Cache limpo com sucesso.",
@@ -593,8 +664,6 @@ async def search_opportunities(
     Returns:
         Dict com oportunidades + informações sobre filtros aplicados + estatísticas (se solicitado)
     """
-    global cached_opportunities, last_update, _cached_full_json_records, _cached_full_json_hash
-    
     # Converter include_stats para boolean
     include_stats_bool = include_stats is not None and include_stats.lower() in ['true', '1', 'yes']
     logger.info(f"📊 include_stats parameter: '{include_stats}' -> converted to: {include_stats_bool}")
@@ -602,12 +671,10 @@ async def search_opportunities(
 
     
     try:
-        # Se não tem cache ou está desatualizado, processar dados
-        if cached_opportunities is None or _is_cache_stale():
-            logger.info("Cache vazio ou desatualizado - processando dados...")
-            await process_new_data()
+        # Geração corrente (carga bloqueante apenas na primeira vez)
+        dataset = await _get_dataset()
         
-        if cached_opportunities is None:
+        if dataset is None:
             return {
                 "opportunities": [],
                 "total": 0,
@@ -617,137 +684,145 @@ async def search_opportunities(
         
         # HIERARQUIA: PRIMEIRO aplicar filtros, DEPOIS busca
         logger.info(f"🔍 Busca por: '{q}' | Filtros: years={years}, rp={rp}, modalidades={modalidades}")
-        logger.info(f"🔍 DEBUG - Registros iniciais no cache: {len(cached_opportunities)}")
+        logger.info(f"🔍 DEBUG - Registros iniciais no cache: {len(dataset.frame)}")
         
         # ETAPA 1: Aplicar todos os filtros PRIMEIRO (hierarquia)
-        filtered_data = cached_opportunities.copy()
-        filters_applied = []
-        logger.info(f"🔍 DEBUG - Iniciando com {len(filtered_data)} registros")
+        query_index = dataset.indexes.get('query_index')
+        if query_index is not None:
+            # Engine colunar: todos os filtros sobre as colunas pré-normalizadas da geração
+            criteria = _search_criteria(dataset.frame, years, rp, modalidades, ufs, partidos, ministry)
+            filtered_data = dataset.frame.iloc[query_index.select(criteria)]
+            filters_applied = [label for label, _, _ in criteria]
+            logger.info(f"🧮 Filtros aplicados no índice de consulta: {filters_applied} → {len(filtered_data)} registros")
+        else:
+            filtered_data = dataset.frame.copy()
+            filters_applied = []
+            logger.info(f"🔍 DEBUG - Iniciando com {len(filtered_data)} registros")
         
-        # 1. Aplicar filtro de anos (se especificado)
-        if years:
-            try:
-                year_list = [int(y.strip()) for y in years.split(',') if y.strip()]
-                if year_list:
-                    ano_col = pd.to_numeric(filtered_data['Ano'], errors='coerce')
-                    filtered_data = filtered_data[ano_col.isin(year_list)]
-                    filters_applied.append(f"Anos: {year_list}")
-                    logger.info(f"📅 Filtro anos aplicado: {year_list} → {len(filtered_data)} registros")
-                    if len(filtered_data) == 0:
-                        logger.warning(f"⚠️ FILTRO ANOS ZEROU OS DADOS! Verificar se anos {year_list} existem no dataset")
-            except ValueError:
-                logger.warning(f"Anos inválidos: {years}")
-        
-        # 2. Aplicar filtro de RP (se especificado)
-        if rp:
-            try:
-                rp_list = [int(r.strip()) for r in rp.split(',') if r.strip()]
-                if rp_list and 'RP' in filtered_data.columns:
-                    # DEBUG: Verificar valores únicos na coluna RP
-                    unique_rp_values = filtered_data['RP'].unique()[:10]  # Primeiros 10
-                    logger.info(f"🔍 DEBUG RP - Valores únicos encontrados: {unique_rp_values}")
-                    logger.info(f"🔍 DEBUG RP - Tipo da coluna: {filtered_data['RP'].dtype}")
-                    logger.info(f"🔍 DEBUG RP - Buscando por: {rp_list}")
+            # 1. Aplicar filtro de anos (se especificado)
+            if years:
+                try:
+                    year_list = [int(y.strip()) for y in years.split(',') if y.strip()]
+                    if year_list:
+                        ano_col = pd.to_numeric(filtered_data['Ano'], errors='coerce')
+                        filtered_data = filtered_data[ano_col.isin(year_list)]
+                        filters_applied.append(f"Anos: {year_list}")
+                        logger.info(f"📅 Filtro anos aplicado: {year_list} → {len(filtered_data)} registros")
+                        if len(filtered_data) == 0:
+                            logger.warning(f"⚠️ FILTRO ANOS ZEROU OS DADOS! Verificar se anos {year_list} existem no dataset")
+                except ValueError:
+                    logger.warning(f"Anos inválidos: {years}")
+        
+            # 2. Aplicar filtro de RP (se especificado)
+            if rp:
+                try:
+                    rp_list = [int(r.strip()) for r in rp.split(',') if r.strip()]
+                    if rp_list and 'RP' in filtered_data.columns:
+                        # DEBUG: Verificar valores únicos na coluna RP
+                        unique_rp_values = filtered_data['RP'].unique()[:10]  # Primeiros 10
+                        logger.info(f"🔍 DEBUG RP - Valores únicos encontrados: {unique_rp_values}")
+                        logger.info(f"🔍 DEBUG RP - Tipo da coluna: {filtered_data['RP'].dtype}")
+                        logger.info(f"🔍 DEBUG RP - Buscando por: {rp_list}")
                     
-                    # Extrair apenas o número do início da string (ex: "6 - Emendas Individuais" → 6)
-                    rp_col = filtered_data['RP'].astype(str).str.extract(r'^(\d+)', expand=False)
-                    rp_col = pd.to_numeric(rp_col, errors='coerce')
-                    logger.info(f"🔍 DEBUG RP - Após extração numérica, valores únicos: {rp_col.unique()[:10]}")
+                        # Extrair apenas o número do início da string (ex: "6 - Emendas Individuais" → 6)
+                        rp_col = filtered_data['RP'].astype(str).str.extract(r'^(\d+)', expand=False)
+                        rp_col = pd.to_numeric(rp_col, errors='coerce')
+                        logger.info(f"🔍 DEBUG RP - Após extração numérica, valores únicos: {rp_col.unique()[:10]}")
                     
-                    rp_mask = rp_col.isin(rp_list)
-                    matches_found = rp_mask.sum()
-                    logger.info(f"🔍 DEBUG RP - Matches encontrados: {matches_found}")
+                        rp_mask = rp_col.isin(rp_list)
+                        matches_found = rp_mask.sum()
+                        logger.info(f"🔍 DEBUG RP - Matches encontrados: {matches_found}")
                     
-                    filtered_data = filtered_data[rp_mask]
-                    filters_applied.append(f"RP: {rp_list}")
-                    logger.info(f"🎯 Filtro RP aplicado: {rp_list} → {len(filtered_data)} registros")
-            except ValueError:
-                logger.warning(f"RPs inválidos: {rp}")
+                        filtered_data = filtered_data[rp_mask]
+                        filters_applied.append(f"RP: {rp_list}")
+                        logger.info(f"🎯 Filtro RP aplicado: {rp_list} → {len(filtered_data)} registros")
+                except ValueError:
+                    logger.warning(f"RPs inválidos: {rp}")
                 
-        # 3. Aplicar filtro de modalidades (se especificado)
-        if modalidades:
-            try:
-                modal_list = [m.strip() for m in modalidades.split(',') if m.strip()]
-                if modal_list and 'Modalidade' in filtered_data.columns:
-                    # DEBUG: Verificar valores únicos na coluna Modalidade
-                    unique_modal_values = filtered_data['Modalidade'].unique()[:10]
-                    logger.info(f"🔍 DEBUG Modalidade - Valores únicos encontrados: {unique_modal_values}")
-                    logger.info(f"🔍 DEBUG Modalidade - Buscando por: {modal_list}")
+            # 3. Aplicar filtro de modalidades (se especificado)
+            if modalidades:
+                try:
+                    modal_list = [m.strip() for m in modalidades.split(',') if m.strip()]
+                    if modal_list and 'Modalidade' in filtered_data.columns:
+                        # DEBUG: Verificar valores únicos na coluna Modalidade
+                        unique_modal_values = filtered_data['Modalidade'].unique()[:10]
+                        logger.info(f"🔍 DEBUG Modalidade - Valores únicos encontrados: {unique_modal_values}")
+                        logger.info(f"🔍 DEBUG Modalidade - Buscando por: {modal_list}")
                     
-                    # Extrair apenas o número do início da string da modalidade
-                    modal_col = filtered_data['Modalidade'].astype(str).str.extract(r'^(\d+)', expand=False)
-                    modal_mask = modal_col.isin(modal_list)
-                    matches_found = modal_mask.sum()
-                    logger.info(f"🔍 DEBUG Modalidade - Matches encontrados: {matches_found}")
+                        # Extrair apenas o número do início da string da modalidade
+                        modal_col = filtered_data['Modalidade'].astype(str).str.extract(r'^(\d+)', expand=False)
+                        modal_mask = modal_col.isin(modal_list)
+                        matches_found = modal_mask.sum()
+                        logger.info(f"🔍 DEBUG Modalidade - Matches encontrados: {matches_found}")
                     
-                    filtered_data = filtered_data[modal_mask]
-                    filters_applied.append(f"Modalidades: {modal_list}")
-                    logger.info(
-                        f"🏛️ Filtro modalidades aplicado: {modal_list} → {len(filtered_data)} registros"
-                    )
-            except ValueError:
-                logger.warning(f"Modalidades inválidas: {modalidades}")
-
-        # 4. Aplicar filtro de UFs (se especificado)
-        if ufs:
-            try:
-                uf_list = [u.strip().upper() for u in ufs.split(',') if u.strip()]
-                if uf_list and 'UF Autor' in filtered_data.columns:
-                    # DEBUG: Verificar valores únicos na coluna UF Autor
-                    unique_uf_values = filtered_data['UF Autor'].unique()[:10]
-                    logger.info(f"🔍 DEBUG UF - Valores únicos encontrados: {unique_uf_values}")
-                    logger.info(f"🔍 DEBUG UF - Buscando por: {uf_list}")
+                        filtered_data = filtered_data[modal_mask]
+                        filters_applied.append(f"Modalidades: {modal_list}")
+                        logger.info(
+                            f"🏛️ Filtro modalidades aplicado: {modal_list} → {len(filtered_data)} registros"
+                        )
+                except ValueError:
+                    logger.warning(f"Modalidades inválidas: {modalidades}")
+
+            # 4. Aplicar filtro de UFs (se especificado)
+            if ufs:
+                try:
+                    uf_list = [u.strip().upper() for u in ufs.split(',') if u.strip()]
+                    if uf_list and 'UF Autor' in filtered_data.columns:
+                        # DEBUG: Verificar valores únicos na coluna UF Autor
+                        unique_uf_values = filtered_data['UF Autor'].unique()[:10]
+                        logger.info(f"🔍 DEBUG UF - Valores únicos encontrados: {unique_uf_values}")
+                        logger.info(f"🔍 DEBUG UF - Buscando por: {uf_list}")
                     
-                    # Normalizar UF para comparação (remover espaços e converter para maiúsculas)
-                    uf_col = filtered_data['UF Autor'].astype(str).str.strip().str.upper()
-                    uf_mask = uf_col.isin(uf_list)
-                    matches_found = uf_mask.sum()
-                    logger.info(f"🔍 DEBUG UF - Matches encontrados: {matches_found}")
+                        # Normalizar UF para comparação (remover espaços e converter para maiúsculas)
+                        uf_col = filtered_data['UF Autor'].astype(str).str.strip().str.upper()
+                        uf_mask = uf_col.isin(uf_list)
+                        matches_found = uf_mask.sum()
+                        logger.info(f"🔍 DEBUG UF - Matches encontrados: {matches_found}")
                     
-                    filtered_data = filtered_data[uf_mask]
-                    filters_applied.append(f"UFs: {uf_list}")
-                    logger.info(f"🗺️ Filtro UFs aplicado: {uf_list} → {len(filtered_data)} registros")
-            except ValueError:
-                logger.warning(f"UFs inválidas: {ufs}")
-        
-        # 5. Aplicar filtro de Partidos (se especificado)
-        if partidos:
-            try:
-                partido_list = [p.strip().upper() for p in partidos.split(',') if p.strip()]
-                if partido_list and 'Partido' in filtered_data.columns:
-                    # DEBUG: Verificar valores únicos na coluna Partido
-                    unique_partido_values = filtered_data['Partido'].unique()[:10]
-                    logger.info(f"🔍 DEBUG Partido - Valores únicos encontrados: {unique_partido_values}")
-                    logger.info(f"🔍 DEBUG Partido - Buscando por: {partido_list[:5]}...")  # Primeiros 5
+                        filtered_data = filtered_data[uf_mask]
+                        filters_applied.append(f"UFs: {uf_list}")
+                        logger.info(f"🗺️ Filtro UFs aplicado: {uf_list} → {len(filtered_data)} registros")
+                except ValueError:
+                    logger.warning(f"UFs inválidas: {ufs}")
+        
+            # 5. Aplicar filtro de Partidos (se especificado)
+            if partidos:
+                try:
+                    partido_list = [p.strip().upper() for p in partidos.split(',') if p.strip()]
+                    if partido_list and 'Partido' in filtered_data.columns:
+                        # DEBUG: Verificar valores únicos na coluna Partido
+                        unique_partido_values = filtered_data['Partido'].unique()[:10]
+                        logger.info(f"🔍 DEBUG Partido - Valores únicos encontrados: {unique_partido_values}")
+                        logger.info(f"🔍 DEBUG Partido - Buscando por: {partido_list[:5]}...")  # Primeiros 5
                     
-                    # Normalizar Partido para comparação (remover espaços e converter para maiúsculas)
-                    partido_col = filtered_data['Partido'].astype(str).str.strip().str.upper()
-                    partido_mask = partido_col.isin(partido_list)
-                    matches_found = partido_mask.sum()
-                    logger.info(f"🔍 DEBUG Partido - Matches encontrados: {matches_found}")
+                        # Normalizar Partido para comparação (remover espaços e converter para maiúsculas)
+                        partido_col = filtered_data['Partido'].astype(str).str.strip().str.upper()
+                        partido_mask = partido_col.isin(partido_list)
+                        matches_found = partido_mask.sum()
+                        logger.info(f"🔍 DEBUG Partido - Matches encontrados: {matches_found}")
                     
-                    filtered_data = filtered_data[partido_mask]
-                    filters_applied.append(f"Partidos: {partido_list}")
-                    logger.info(f"🏛️ Filtro partidos aplicado: {partido_list} → {len(filtered_data)} registros")
-            except ValueError:
-                logger.warning(f"Partidos inválidos: {partidos}")
-        
-        # 6. Aplicar filtro de ministério (se especificado)
-        if ministry:
-            orgao_col = 'Órgão' if 'Órgão' in filtered_data.columns else 'orgao_orcamentario'
-            if orgao_col in filtered_data.columns:
-                # DEBUG: Verificar valores únicos na coluna Órgão
-                unique_orgao_values = filtered_data[orgao_col].unique()[:5]
-                logger.info(f"🔍 DEBUG Órgão - Valores únicos encontrados: {unique_orgao_values}")
-                logger.info(f"🔍 DEBUG Órgão - Buscando por: {ministry}")
+                        filtered_data = filtered_data[partido_mask]
+                        filters_applied.append(f"Partidos: {partido_list}")
+                        logger.info(f"🏛️ Filtro partidos aplicado: {partido_list} → {len(filtered_data)} registros")
+                except ValueError:
+                    logger.warning(f"Partidos inválidos: {partidos}")
+        
+            # 6. Aplicar filtro de ministério (se especificado)
+            if ministry:
+                orgao_col = 'Órgão' if 'Órgão' in filtered_data.columns else 'orgao_orcamentario'
+                if orgao_col in filtered_data.columns:
+                    # DEBUG: Verificar valores únicos na coluna Órgão
+                    unique_orgao_values = filtered_data[orgao_col].unique()[:5]
+                    logger.info(f"🔍 DEBUG Órgão - Valores únicos encontrados: {unique_orgao_values}")
+                    logger.info(f"🔍 DEBUG Órgão - Buscando por: {ministry}")
                 
-                ministry_mask = filtered_data[orgao_col].astype(str).str.contains(ministry, case=False, na=False)
-                matches_found = ministry_mask.sum()
-                logger.info(f"🔍 DEBUG Órgão - Matches encontrados: {matches_found}")
+                    ministry_mask = filtered_data[orgao_col].astype(str).str.contains(ministry, case=False, na=False)
+                    matches_found = ministry_mask.sum()
+                    logger.info(f"🔍 DEBUG Órgão - Matches encontrados: {matches_found}")
                 
-                filtered_data = filtered_data[ministry_mask]
-                filters_applied.append(f"Ministério: {ministry}")
-                logger.info(f"🏢 Filtro ministério aplicado: {ministry} → {len(filtered_data)} registros")
+                    filtered_data = filtered_data[ministry_mask]
+                    filters_applied.append(f"Ministério: {ministry}")
+                    logger.info(f"🏢 Filtro ministério aplicado: {ministry} → {len(filtered_data)} registros")
         
         # ETAPA 2: AGORA aplicar busca nos dados já filtrados (HIERARQUIA)
         search_term = q.strip().lower()
@@ -845,8 +920,12 @@ async def search_opportunities(
             logger.info(f"🔍 Padrões de busca gerados: {search_patterns[:3]}...")
 
             # ---------- NOVA BUSCA VETORIZADA ----------
-            if 'search_blob' not in filtered_data.columns:
-                filtered_data['search_blob'] = _build_search_blob(filtered_data)
+            # Blob normalizado vem pronto da geração (índice alinhado ao frame)
+            search_blob = dataset.indexes.get('search_blob')
+            if search_blob is None:
+                search_blob = _build_search_blob(filtered_data)
+            else:
+                search_blob = search_blob.loc[filtered_data.index]
 
             # Construir tokens para busca E (todas as palavras devem aparecer)
             tokens: Set[str] = set()
@@ -857,11 +936,46 @@ async def search_opportunities(
                     if tok:
                         tokens.add(tok)
 
-            if tokens:
+            # Sigla oficial ("MEC", "MS") ou nome curto do ministério: filtro direto por
+            # Órgão via índice de sinônimos, em vez de varrer o texto (sem ruído de substring);
+            # siglas ambíguas (também UF/partido) mantêm o casamento de texto como alternativa
+            synonyms = dataset.indexes.get('orgao_synonyms') or {}
+            orgao_col = 'Órgão' if 'Órgão' in filtered_data.columns else 'orgao_orcamentario'
+            facet_terms = []
+            if synonyms and orgao_col in filtered_data.columns:
+                normalized_query = normalize_search_text(search_term)
+                whole_query = synonyms['siglas'].get(normalized_query) or synonyms['nomes_curtos'].get(normalized_query)
+                if whole_query:
+                    facet_terms.append((normalized_query, whole_query))
+                    tokens = set()
+                else:
+                    for tok in sorted(tokens):
+                        if tok in synonyms['siglas']:
+                            facet_terms.append((tok, synonyms['siglas'][tok]))
+                            tokens.discard(tok)
+            
+            ambiguous = synonyms.get('siglas_ambiguas') or {}
+            for term, orgaos in facet_terms:
+                facet_mask = filtered_data[orgao_col].isin(orgaos).to_numpy()
+                if term in ambiguous:
+                    # Sigla que também é UF/partido ("MS", "PR"): Órgão OU o casamento de texto
+                    facet_mask |= search_blob.str.contains(re.escape(term), na=False).to_numpy()
+                filtered_data = filtered_data[facet_mask]
+                search_blob = search_blob[facet_mask]
+                logger.info(f"🏛️ Sigla/nome de ministério '{term}' → Órgão {orgaos} → {len(filtered_data)} registros")
+
+            if tokens and query_index is not None:
+                # Termos sobre o blob da cópia colunar, a partir das linhas já filtradas
+                positions = dataset.frame.index.get_indexer(filtered_data.index)
+                filtered_data = dataset.frame.iloc[query_index.match_tokens(positions, sorted(tokens))]
+                logger.info(f" Busca vetorizada '{search_term}' → {len(filtered_data)} resultados após filtro")
+            elif tokens:
                 # Aplicar filtro incremental (AND) – garante que todos os termos estejam presentes
                 for tok in tokens:
                     tok_regex = re.escape(tok)
-                    filtered_data = filtered_data[filtered_data['search_blob'].str.contains(tok_regex, na=False)]
+                    token_mask = search_blob.str.contains(tok_regex, na=False)
+                    filtered_data = filtered_data[token_mask.values]
+                    search_blob = search_blob[token_mask]
                     logger.info(f" Busca vetorizada '{search_term}' → {len(filtered_data)} resultados após filtro")
 
             # Paginação
@@ -883,7 +997,7 @@ async def search_opportunities(
             if include_stats_bool:
                 response["stats"] = {
                     "available_after_filters": len(filtered_data),
-                    "cache_last_update": last_update
+                    "cache_last_update": dataset.last_update
                 }
 
             return response
@@ -1007,7 +1121,7 @@ async def search_opportunities(
             # SOLUÇÃO ROBUSTA: Aplicar filtro de busca usando iterrows para garantir compatibilidade
             filtered_indices = []
             
-            for idx, row in cached_opportunities.iterrows():
+            for idx, row in dataset.frame.iterrows():
                 # Converter row para dict para garantir compatibilidade
                 row_dict = row.to_dict()
                 
@@ -1138,9 +1252,10 @@ async def search_opportunities(
             "search_term": q,
             "filters_applied": filters_applied,
             "hierarchy_info": "Filtros aplicados ANTES da busca (filtros têm prioridade)",
-            "last_update": last_update,
+            "last_update": dataset.last_update,
+            "dataset_version": dataset.version,
             "data_source": "cache_siop_s3_real_data",
-            "cache_info": f"Cache SIOP → S3 carregado em {last_update}",
+            "cache_info": f"Cache SIOP → S3 carregado em {dataset.last_update}",
             "timestamp": utc_now().isoformat()
         }
 
@@ -1226,15 +1341,11 @@ async def get_opportunities(
         offset: Offset para paginação
         ministry: Filtrar por ministério específico
     """
-    global cached_opportunities, last_update, _cached_full_json_records, _cached_full_json_hash
-    
     try:
-        # Se não tem cache ou está desatualizado, processar dados
-        if cached_opportunities is None or _is_cache_stale():
-            logger.info("Cache vazio ou desatualizado - processando dados...")
-            await process_new_data()
+        # Geração corrente (carga bloqueante apenas na primeira vez)
+        dataset = await _get_dataset()
         
-        if cached_opportunities is None:
+        if dataset is None:
             return {
                 "opportunities": [],
                 "total": 0,
@@ -1243,7 +1354,7 @@ async def get_opportunities(
             }
         
         # Aplicar filtros
-        filtered_data = cached_opportunities
+        filtered_data = dataset.frame
         
         if ministry:
             # Verificar se a coluna existe (pode ser 'Órgão' ou 'orgao_orcamentario')
@@ -1256,18 +1367,10 @@ async def get_opportunities(
         # Total após filtros
         total = len(filtered_data)
 
-        # Construir/atualizar cache JSON completo se necessário (somente quando não há filtro específico)
-        if ministry is None:
-            df_hash = _generate_dataframe_hash(cached_opportunities)
-            if _cached_full_json_records is None or _cached_full_json_hash != df_hash:
-                logger.info("🔄 Construindo cache JSON completo (records já normalizados)...")
-                _cached_full_json_records = convert_dataframe_to_json(cached_opportunities)
-                _cached_full_json_hash = df_hash
-
         # Selecionar oportunidades
         if ministry is None and offset == 0 and limit >= total:
-            # Entrega lista já pronta do cache completo
-            opportunities = _cached_full_json_records
+            # Entrega lista já pronta, codificada junto com a geração
+            opportunities = dataset.payloads['full_records']
         else:
             # Slice no DataFrame filtrado e conversão pontual
             paged_df = filtered_data.iloc[offset:offset+limit]
@@ -1285,9 +1388,10 @@ async def get_opportunities(
             "total": total,
             "limit": limit,
             "offset": offset,
-            "last_update": last_update,
+            "last_update": dataset.last_update,
+            "dataset_version": dataset.version,
             "data_source": "cache_siop_s3_real_data",  # SEMPRE dados reais do SIOP via S3 - NUNCA MOCK
-            "cache_info": f"Cache SIOP → S3 carregado em {last_update}",
+            "cache_info": f"Cache SIOP → S3 carregado em {dataset.last_update}",
             "timestamp": utc_now().isoformat()
         }
         
@@ -1298,69 +1402,22 @@ async def get_opportunities(
 @app.get("/api/summary")
 async def get_summary() -> Dict:
     """Retorna resumo das oportunidades"""
-    global cached_opportunities
-    
     try:
-        # CORREÇÃO: Aplicar mesma lógica da API Opportunities - reprocessar se cache vazio
-        if cached_opportunities is None or _is_cache_stale():
-            logger.info("Cache vazio ou desatualizado para Summary - processando dados...")
-            await process_new_data()
+        # CORREÇÃO: Aplicar mesma lógica da API Opportunities - carregar se não houver geração
+        dataset = await _get_dataset()
         
-        if cached_opportunities is None:
+        if dataset is None:
             return {"message": "Nenhum dado disponível - falha no processamento"}
         
-        summary = etl_service.generate_summary(cached_opportunities)
-        
-        # Importar sistema oficial de siglas de ministérios
-        from ministerios_siglas import get_ministerios_com_relacionamento, enriquecer_dados_ministerios
-        
-        # Lista de ministérios com projetos vigentes Innovatis (usando sistema oficial)
-        ministerios_com_relacionamento = get_ministerios_com_relacionamento()
-        
-        # Adicionar lista completa de ministérios para o frontend
-        orgao_col = etl_service._find_column(cached_opportunities, ['Órgão', 'orgao_orcamentario', 'ministerio', 'orgao'])
-        if orgao_col and summary.get("by_ministry"):
-            by_ministry_count = summary["by_ministry"]["count"]
-            by_ministry_value = summary["by_ministry"]["value"]
-            
-            # Criar lista completa de ministérios com estatísticas E flag de relacionamento
-            all_ministries = []
-            for ministry, count in by_ministry_count.items():
-                # Verificar se tem relacionamento (busca flexível por substring)
-                has_relationship = any(
-                    proj_min.upper() in ministry.upper() or ministry.upper() in proj_min.upper()
-                    for proj_min in ministerios_com_relacionamento
-                )
-                
-                all_ministries.append({
-                    "ministry": ministry,
-                    "count": count,
-                    "total_value": by_ministry_value.get(ministry, 0),
-                    "has_relationship": has_relationship
-                })
-            
-            # Ordenar por contagem (maiores primeiro)
-            all_ministries.sort(key=lambda x: x["count"], reverse=True)
-            
-            # Enriquecer com siglas oficiais
-            all_ministries = enriquecer_dados_ministerios(all_ministries)
-            
-            summary["all_ministries"] = all_ministries
-            
-            # Manter compatibilidade - apenas os com relacionamento
-            ministries_with_relationship = [m for m in all_ministries if m["has_relationship"]]
-            summary["top_ministries"] = ministries_with_relationship[:10]
-            
-            # Estatísticas adicionais
-            summary["ministries_count"] = len(all_ministries)
-            summary["ministries_with_relationship_count"] = len(ministries_with_relationship)
-            summary["ministries_without_relationship_count"] = len(all_ministries) - len(ministries_with_relationship)
+        # Resumo materializado na geração: consulta a um dicionário
+        summary = dataset.payloads['summary']
         
         return {
             "summary": summary,
-            "last_update": last_update,
+            "last_update": dataset.last_update,
+            "dataset_version": dataset.version,
             "data_source": "cache_siop_s3_real_data",  # SEMPRE dados reais do SIOP via S3 - NUNCA MOCK
-            "cache_info": f"Cache SIOP → S3 atualizado em {last_update}. Não são dados em tempo real.",
+            "cache_info": f"Cache SIOP → S3 atualizado em {dataset.last_update}. Não são dados em tempo real.",
             "timestamp": utc_now().isoformat()
         }
         
@@ -1368,6 +1425,50 @@ async def get_summary() -> Dict:
         logger.error(f"Erro ao gerar resumo: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/history")
+async def get_history_status():
+    """
+    Resumo do histórico de snapshots SIOP (quantos snapshots, período, tamanho em disco)
+    """
+    return {
+        "history": history_store.status(),
+        "sync_in_progress": _history_task is not None and not _history_task.done(),
+        "timestamp": utc_now().isoformat()
+    }
+
+@app.get("/api/history/{codigo_emenda}")
+async def get_emenda_history(codigo_emenda: str):
+    """
+    Série temporal de uma emenda (dotação, empenhado, liquidado, pago) ao longo
+    dos snapshots diários. Retorna apenas os pontos em que os valores mudaram.
+    """
+    try:
+        # Lê partições do disco: fora do event loop
+        loop = asyncio.get_running_loop()
+        series = await loop.run_in_executor(None, history_store.series, codigo_emenda)
+    except Exception as e:
+        logger.error(f"Erro ao consultar histórico de {codigo_emenda}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if series is None:
+        raise HTTPException(status_code=404, detail=f"Emenda {codigo_emenda} não encontrada no histórico")
+    return series
+
+@app.get("/api/filters")
+async def get_filter_rules():
+    """
+    Regras dos filtros Innovatis (filter_rules.json) e a seletividade de cada
+    regra na ingestão que gerou a geração atual
+    """
+    dataset = dataset_store.current()
+    pending = etl_service.filter_rules.pending_signature()
+    return {
+        "rules": etl_service.filter_rules.describe(),
+        "pending_signature": pending if pending != etl_service.filter_rules.signature else None,
+        "current_generation": dataset.payloads.get('filter_report') if dataset is not None else None,
+        "timestamp": utc_now().isoformat()
+    }
+
 @app.get("/api/s3/status")
 async def get_s3_status():
     """
@@ -1382,47 +1483,35 @@ async def get_s3_status():
                 "requires_real_data": True
             }
         
-        # Buscar arquivo mais recente
+        # Buscar arquivo mais recente (manifesto; metadados S3 ficam em cache com TTL curto)
         logger.info("🔍 Verificando status do S3...")
         latest_file = s3_service._find_latest_file()
         
         # Informações do cache
         cache_info = s3_service.get_cache_info()
         
-        # Arquivos recentes
-        recent_files = s3_service.list_recent_files(days=7)
-        
-        # Buscar todos os arquivos SIOP para debug
+        # Buscar todos os arquivos SIOP para debug (uma única listagem paginada)
         all_siop_files = []
         try:
-            response = s3_service.s3_client.list_objects_v2(
-                Bucket=s3_service.bucket_name,
-                Prefix="siop-data/"
-            )
-            if 'Contents' in response:
-                for obj in response['Contents']:
-                    key = obj['Key']
-                    filename = key.split('/')[-1]
-                    if filename.startswith('SIOP_') and any(key.lower().endswith(ext) for ext in ['.csv', '.xlsx', '.xls']):
-                        all_siop_files.append({
-                            'key': key,
-                            'filename': filename,
-                            'last_modified': obj['LastModified'].isoformat(),
-                            'size': obj['Size']
-                        })
-                # Ordenar por data de modificação
-                all_siop_files.sort(key=lambda x: x['last_modified'], reverse=True)
+            all_siop_files = s3_service.list_all_siop_files()
         except Exception as e:
             logger.error(f"Erro ao listar arquivos SIOP: {e}")
         
+        # Arquivos recentes derivados da mesma listagem
+        recent_cutoff = (utc_now() - timedelta(days=7)).isoformat()
+        recent_files = [f for f in all_siop_files if f['last_modified'] > recent_cutoff]
+        
         return {
             "s3_available": True,
+            "storage": s3_service.storage.describe(),
             "latest_file": latest_file,
+            "manifest": s3_service.read_manifest(),
             "latest_file_metadata": s3_service.get_file_metadata(latest_file) if latest_file else None,
             "all_siop_files": all_siop_files,
             "recent_files_count": len(recent_files),
             "recent_files": recent_files[:5],  # Últimos 5
             "cache_info": cache_info,
+            "metadata_cache": s3_service.get_metadata_cache_stats(),
             "last_check": utc_now().isoformat()
         }
         
@@ -1470,10 +1559,10 @@ async def clear_s3_cache():
     try:
         s3_service.clear_cache()
         
-        # Também limpar cache de oportunidades
-        global cached_opportunities, last_update, _cached_full_json_records, _cached_full_json_hash
-        cached_opportunities = None
-        last_update = None
+        # Também revalidar oportunidades: a geração atual segue servindo até a próxima ficar pronta
+        _json_conversion_cache.clear()
+        dataset_store.mark_stale()
+        _schedule_refresh(source="limpeza de cache S3")
         
         return {
             "message": "Cache SIOP → S3 limpo com sucesso",
@@ -1487,12 +1576,14 @@ async def clear_s3_cache():
 @app.get("/api/debug/codigo-emenda")
 async def debug_codigo_emenda():
     """Endpoint para verificar códigos únicos das emendas"""
-    global cached_opportunities
+    dataset = dataset_store.current()
     
     try:
-        if cached_opportunities is None:
+        if dataset is None:
             return {"error": "Nenhum dado carregado no cache"}
         
+        cached_opportunities = dataset.frame
+        
         if 'Codigo_Emenda' not in cached_opportunities.columns:
             return {"error": "Coluna Codigo_Emenda não encontrada - execute processo de conversão"}
         
@@ -1505,7 +1596,7 @@ async def debug_codigo_emenda():
         duplicatas_info = []
         if duplicatas > 0:
             duplicados = cached_opportunities[cached_opportunities['Codigo_Emenda'].duplicated(keep=False)]
-            duplicatas_agrupadas = duplicados.groupby('Codigo_Emenda').size().sort_values(ascending=False)
+            duplicatas_agrupadas = duplicados.groupby('Codigo_Emenda', observed=True).size().sort_values(ascending=False)
             
             duplicatas_info = [
                 {
@@ -1517,7 +1608,10 @@ async def debug_codigo_emenda():
             ]
         
         # Análise dos códigos por ano
-        codigos_por_ano = cached_opportunities.groupby('Ano')['Codigo_Emenda'].nunique().to_dict()
+        codigos_por_ano = {
+            str(ano): total
+            for ano, total in cached_opportunities.groupby('Ano', observed=True)['Codigo_Emenda'].nunique().items()
+        }
         
         # Exemplos de códigos válidos
         exemplos_codigos = cached_opportunities['Codigo_Emenda'].head(10).tolist()
@@ -1540,9 +1634,115 @@ async def debug_codigo_emenda():
         logger.error(f"Erro na verificação de códigos: {e}")
         return {"error": str(e)}
 
+def _memory_accounting(json_entries: List[Dict]) -> Dict:
+    """
+    Mede memória por estrutura/coluna, caches e disco (bloqueante: roda no executor)
+    
+    json_entries é uma cópia das entradas do cache JSON tirada no event loop
+    (as requisições alteram o dict enquanto a medição roda).
+    """
+    dataset = dataset_store.current()
+    structures = {}
+    # Objetos já contados (uma entrada do cache JSON pode ser um payload da geração)
+    accounted_ids = set()
+    
+    if dataset is not None:
+        columns = frame_columns_sizeof(dataset.frame)
+        structures["dataset_frame"] = {
+            "dataset_version": dataset.version,
+            "rows": len(dataset.frame),
+            "bytes": sum(c["bytes"] for c in columns) + int(dataset.frame.index.memory_usage(deep=True)),
+            "columns": columns,
+        }
+        structures["indexes"] = {name: deep_sizeof(value) for name, value in dataset.indexes.items()}
+        structures["payloads"] = {}
+        for name, value in dataset.payloads.items():
+            is_records = isinstance(value, list) and value and isinstance(value[0], dict)
+            structures["payloads"][name] = records_sizeof(value) if is_records else deep_sizeof(value)
+            accounted_ids.add(id(value))
+    
+    json_bytes, json_shared = 0, 0
+    for entry in json_entries:
+        data = entry['data']
+        if id(data) in accounted_ids:
+            json_shared += 1
+            continue
+        json_bytes += records_sizeof(data)
+    
+    caches = {
+        "json_conversion": {
+            "entries": len(json_entries),
+            "entries_shared_with_dataset": json_shared,
+            "bytes": json_bytes,
+            "hits": _json_cache_hits,
+            "misses": _json_cache_misses,
+            "hit_rate": hit_rate(_json_cache_hits, _json_cache_misses),
+        },
+        "s3_metadata": s3_service.get_metadata_cache_stats(),
+        "history": history_store.memory_usage(),
+    }
+    
+    disk = {
+        "s3_data": directory_size(s3_service._get_cache_dir()),
+        "history": directory_size(history_store.root),
+    }
+    
+    dataset_bytes = 0
+    if dataset is not None:
+        dataset_bytes = (
+            structures["dataset_frame"]["bytes"]
+            + sum(structures["indexes"].values())
+            + sum(structures["payloads"].values())
+        )
+    
+    return {
+        "process": process_memory(),
+        "accounted_bytes": dataset_bytes + json_bytes + caches["history"]["bytes"],
+        "structures": structures,
+        "caches": caches,
+        "disk": disk,
+        "timestamp": utc_now().isoformat(),
+    }
+
+@app.get("/api/debug/memory")
+async def debug_memory():
+    """
+    Contabilidade de memória: bytes por estrutura e por coluna da geração atual,
+    tamanho e taxa de acerto de cada cache, cache em disco e RSS do processo
+    """
+    try:
+        loop = asyncio.get_running_loop()
+        json_entries = list(_json_conversion_cache.values())
+        return await loop.run_in_executor(None, _memory_accounting, json_entries)
+    except Exception as e:
+        logger.error(f"Erro na contabilidade de memória: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/debug/data-processing")
-async def debug_data_processing():
-    """Endpoint temporário para debug do processamento de dados"""
+async def debug_data_processing(recompute: bool = False):
+    """
+    Debug do processamento de dados
+    
+    Padrão: trace da ingestão que gerou a geração atual (tempo de parede e CPU,
+    variação de memória e linhas por etapa) + relatórios de filtros e deduplicação,
+    sem reprocessar nada. Com recompute=true, baixa e refiltra os dados brutos
+    (amostras e valores únicos das colunas de filtro).
+    """
+    if not recompute:
+        dataset = await _get_dataset()
+        if dataset is None:
+            return {"error": "Nenhuma geração do dataset carregada", "pipeline_trace": None}
+        return {
+            "dataset_version": dataset.version,
+            "last_update": dataset.last_update,
+            "source_key": dataset.source_key,
+            "rows": len(dataset.frame),
+            "pipeline_trace": dataset.payloads.get('pipeline_trace'),
+            "filter_report": dataset.payloads.get('filter_report'),
+            "dedup_report": dataset.payloads.get('dedup_report'),
+            "ingest_delta": dataset.payloads.get('ingest_delta'),
+        }
+    
     try:
         logger.info("🔍 Debug: Iniciando análise do processamento de dados...")
         
@@ -1562,22 +1762,17 @@ async def debug_data_processing():
             "sample_raw_data": raw_data.head(3).to_dict('records') if len(raw_data) > 0 else []
         }
         
-        # Aplicar cada filtro individualmente para debug
-        df_step1 = etl_service._filter_natureza_despesa(raw_data.copy())
-        debug_info["after_natureza_filter"] = len(df_step1)
-        
-        df_step2 = etl_service._filter_modalidade(df_step1.copy())
-        debug_info["after_modalidade_filter"] = len(df_step2)
-        
-        df_step3 = etl_service._filter_resultado_primario(df_step2.copy())
-        debug_info["after_rp_filter"] = len(df_step3)
-        
-        # Não aplicar filtro de ministério para ver se é isso que está zerando
-        # df_step4 = etl_service._filter_ministerios_vigentes(df_step3.copy())
-        # debug_info["after_ministerio_filter"] = len(df_step4)
-        
-        debug_info["final_filtered_rows"] = len(df_step3)
-        debug_info["sample_filtered_data"] = df_step3.head(3).to_dict('records') if len(df_step3) > 0 else []
+        # Seletividade de cada regra sobre os dados brutos (máscara única)
+        etl_service.filter_rules.refresh()
+        parsed = etl_service.parse_monetary_columns(raw_data)
+        mask, filter_report = etl_service.filter_rules.evaluate(
+            parsed, etl_service._find_column, etl_service.parse_monetary_series,
+            rule_mask=etl_service.engine.rule_mask
+        )
+        filtered = raw_data[mask]
+        debug_info["filter_rules"] = filter_report
+        debug_info["final_filtered_rows"] = len(filtered)
+        debug_info["sample_filtered_data"] = filtered.head(3).to_dict('records') if len(filtered) > 0 else []
         
         # Verificar valores únicos das colunas de filtro
         natureza_col = etl_service._find_column(raw_data, ['Natureza Despesa', 'natureza_despesa', 'natureza', 'cod_natureza'])
@@ -1598,51 +1793,85 @@ async def debug_data_processing():
         logger.error(f"Erro no debug: {e}")
         return {"error": str(e)}
 
-async def _process_siop_data(force_download: bool = False, source: str = "automático") -> bool:
+def _build_dataset(force_download: bool = False, source: str = "automático") -> Optional[Dict]:
     """
-    Função central para processar dados SIOP
+    Constrói todos os componentes da próxima geração do dataset
     Aplica filtros Innovatis + DEDUPLICAÇÃO POR CÓDIGO ÚNICO
-    Atualiza cache com números finais corretos
+    
+    Executado fora do event loop; não toca na geração publicada.
     
     Args:
         force_download: Se True, força download mesmo se já existe cache
         source: Fonte da chamada (para logs)
         
+    Cada etapa (download, parse, encoding, filtros, deduplicação, tipagem,
+    índices, codificação) é medida no trace da ingestão, guardado na geração.
+    
     Returns:
-        bool: True se processamento foi bem-sucedido
+        Dict com frame, indexes, payloads e source_key; {'unchanged': True} se o
+        arquivo de origem não mudou (304); ou None se não há dados
     """
-    global cached_opportunities, last_update, _cached_full_json_records, _cached_full_json_hash
+    logger.info(f"🔄 Iniciando processamento {source} de dados (force_download={force_download})...")
+    trace = PipelineTrace()
     
-    try:
-        logger.info(f"🔄 Iniciando processamento {source} de dados (force_download={force_download})...")
-        
-        # 1. Baixar dados mais recentes do S3
-        raw_data = s3_service.download_latest_csv(force_download=force_download)
-        
-        if raw_data is None:
-            logger.error("❌ Nenhum dado disponível do S3 ou cache")
-            return False
-        
-        logger.info(f"📊 Dados carregados: {len(raw_data):,} registros")
-        
-        # 2. Aplicar filtros Innovatis
-        filtered_data = etl_service.apply_innovatis_filters(raw_data)
-        
-        logger.info(f"🎯 Após filtros Innovatis: {len(filtered_data):,} registros")
-        
-        # 3. ✅ APLICAR DEDUPLICAÇÃO POR CÓDIGO ÚNICO (ÚNICA VEZ NO SISTEMA)
-        logger.info("🔑 Aplicando deduplicação por código único da emenda...")
+    # Regras de filtro fixadas para toda a ingestão (filter_rules.json recarregado se mudou)
+    etl_service.filter_rules.refresh()
+    etl_service.reset_filter_stats()
+    # Filtro por bloco/partição: nos processos do pool com o ETL paralelo ligado
+    row_filter = PartitionedFilter(partition_executor, etl_service.filter_partition, etl_service.merge_filter_report)
+    
+    # 1. Baixar dados mais recentes do S3 (CSV: streaming com filtros aplicados por bloco)
+    raw_data = s3_service.download_latest_csv(
+        force_download=force_download,
+        row_filter=row_filter,
+        loaded_version=_current_source_version(),
+        filter_signature=etl_service.filter_rules.signature,
+        trace=trace
+    )
+    
+    if raw_data is None and s3_service.last_not_modified:
+        logger.info("✅ Arquivo de origem inalterado (304) - geração atual mantida")
+        return {'unchanged': True}
+    
+    if raw_data is None:
+        logger.error("❌ Nenhum dado disponível do S3 ou cache")
+        return None
+    
+    logger.info(f"📊 Dados carregados: {len(raw_data):,} registros")
+    
+    # 2. Aplicar filtros Innovatis (já aplicados durante o streaming, se for o caso)
+    if s3_service.last_loaded_prefiltered:
+        logger.info("🌊 Filtros Innovatis já aplicados na ingestão em streaming")
+        filtered_data = raw_data
+    else:
+        with trace.stage('filter', rows_in=len(raw_data)) as stage:
+            filtered_data = row_filter.apply_frame(raw_data)
+            stage['rows_out'] = len(filtered_data)
+    
+    logger.info(f"🎯 Após filtros Innovatis: {len(filtered_data):,} registros")
+    
+    # Seletividade por regra (cópia local pré-filtrada com as mesmas regras: sem contagens)
+    filter_report = etl_service.filter_report()
+    filter_report['from_prefiltered_cache'] = filter_report['rows_in'] == 0 and s3_service.last_loaded_prefiltered
+    for rule in filter_report['rules']:
+        if rule['rows_in'] or rule['kept']:
+            trace.add(f"filter.{rule['name']}", rule['wall_ms'], rule['cpu_ms'],
+                      rows_in=rule['rows_in'], rows_out=rule['rows_in'] - rule['removed'])
+    
+    # 3. ✅ APLICAR DEDUPLICAÇÃO POR CÓDIGO ÚNICO (ÚNICA VEZ NO SISTEMA)
+    logger.info("🔑 Aplicando deduplicação por código único da emenda...")
+    with trace.stage('dedup', rows_in=len(filtered_data)) as stage:
         try:
             # Verificar se as colunas necessárias existem antes da deduplicação
             colunas_necessarias = ['Ano', 'Nro. Emenda']
             colunas_disponiveis = list(filtered_data.columns)
             logger.info(f"🔍 Colunas disponíveis no DataFrame: {colunas_disponiveis[:10]}...")  # Mostrar apenas primeiras 10
-            
+        
             missing_columns = [col for col in colunas_necessarias if col not in colunas_disponiveis]
             if missing_columns:
                 logger.warning(f"⚠️ Colunas ausentes para deduplicação: {missing_columns}")
                 logger.info("🔄 Tentando mapeamento alternativo de colunas...")
-                
+            
                 # Tentar mapear colunas com nomes alternativos
                 if 'Ano' not in colunas_disponiveis:
                     for col_alt in ['ano', 'Year', 'ANO']:
@@ -1650,40 +1879,181 @@ async def _process_siop_data(force_download: bool = False, source: str = "autom
                             filtered_data = filtered_data.rename(columns={col_alt: 'Ano'})
                             logger.info(f"✅ Mapeado '{col_alt}' → 'Ano'")
                             break
-                
+            
                 if 'Nro. Emenda' not in colunas_disponiveis:
                     for col_alt in ['Numero_Sequencial', 'nro_emenda', 'numero_emenda', 'Nro Emenda']:
                         if col_alt in colunas_disponiveis:
                             filtered_data = filtered_data.rename(columns={col_alt: 'Nro. Emenda'})
                             logger.info(f"✅ Mapeado '{col_alt}' → 'Nro. Emenda'")
                             break
-            
-            deduplicated_data = create_unique_codigo_and_deduplicate(filtered_data)
+        
+            deduplicated_data, dedup_report = create_unique_codigo_and_deduplicate(filtered_data)
             logger.info(f"🎯 Após deduplicação: {len(deduplicated_data):,} oportunidades únicas")
-            
+        
         except Exception as e:
             logger.error(f"❌ Erro na deduplicação: {e}")
             logger.info("🔄 Prosseguindo sem deduplicação - usando dados filtrados...")
             deduplicated_data = filtered_data
+            dedup_report = None
             logger.warning(f"⚠️ ATENÇÃO: Dados podem conter duplicatas (deduplicação falhou)")
             # Log detalhado para debug
             import traceback
             logger.error(f"Stack trace completo: {traceback.format_exc()}")
+    
+        stage['rows_out'] = len(deduplicated_data)
+    
+    # 4. Valores monetários numéricos na geração (consumidores leem floats)
+    #    Normalmente já convertidos pelos filtros na ingestão; cobre caches antigos em texto
+    # 5. Schema de memória: categóricas, inteiros pequenos, strings Arrow
+    #    (as duas formam a etapa 'typing' do trace)
+    with trace.stage('typing', rows_in=len(deduplicated_data)) as stage:
+        deduplicated_data = etl_service.parse_monetary_columns(deduplicated_data)
+        object_bytes = dataset_schema.memory_report(deduplicated_data)['total_bytes']
+        deduplicated_data = dataset_schema.apply(deduplicated_data)
+        memory_report = dataset_schema.memory_report(deduplicated_data)
+        memory_report['object_bytes'] = object_bytes
+        stage['rows_out'] = len(deduplicated_data)
+    logger.info(
+        f"🧮 Memória do frame: {object_bytes / 1e6:.1f} MB → {memory_report['total_bytes'] / 1e6:.1f} MB "
+        f"({object_bytes / max(memory_report['total_bytes'], 1):.1f}x menor)"
+    )
+    
+    # 6. Índices e payloads da geração (construídos ANTES da publicação)
+    #    Modo delta: search_blob e full_records só reconstroem as emendas inseridas/alteradas
+    #    desde a geração anterior; hashes, sinônimos, query_index e resumo são recalculados
+    previous = dataset_store.current()
+    rows = len(deduplicated_data)
+    with trace.stage('indexing', rows_in=rows) as stage:
+        row_hashes = delta_service.row_hashes(deduplicated_data)
+        delta = delta_service.plan(
+            previous.frame if previous is not None else None,
+            previous.indexes.get('row_hashes') if previous is not None else None,
+            deduplicated_data,
+            row_hashes,
+        )
+        if delta is not None:
+            search_blob = delta_service.merge_series(
+                deduplicated_data, previous.frame, previous.indexes['search_blob'], delta, _build_search_blob
+            )
+        else:
+            search_blob = _build_search_blob(deduplicated_data)
+        indexes = {
+            'search_blob': search_blob,
+            'row_hashes': row_hashes,
+            'orgao_synonyms': _build_orgao_synonyms(deduplicated_data),
+        }
+        # Engine colunar: cópia das colunas da busca pré-normalizadas (pandas: sem índice)
+        query_index = etl_service.engine.query_index(deduplicated_data, search_blob)
+        if query_index is not None:
+            indexes['query_index'] = query_index
+        stage['rows_out'] = len(search_blob)
+    
+    with trace.stage('encoding', rows_in=rows) as stage:
+        if delta is not None:
+            full_records = delta_service.merge_records(
+                deduplicated_data, previous.frame, previous.payloads['full_records'], delta, _frame_to_records
+            )
+        else:
+            full_records = _frame_to_records(deduplicated_data)
+        stage['rows_out'] = len(full_records)
+    
+    with trace.stage('summary', rows_in=rows):
+        summary = build_summary_payload(deduplicated_data)
+    
+    trace.finish()
+    trace.log_summary()
+    payloads = {
+        'full_records': full_records,
+        'ingest_delta': delta.summary() if delta is not None else {"mode": "full"},
+        'memory_report': memory_report,
+        'filter_report': filter_report,
+        'dedup_report': dedup_report,
+        'summary': summary,
+        'pipeline_trace': trace.as_dict(),
+    }
+    
+    logger.info(f"✅ Processamento {source} concluído com sucesso!")
+    logger.info(f"📊 Total final: {len(deduplicated_data):,} oportunidades únicas")
+    
+    return {
+        'frame': deduplicated_data,
+        'indexes': indexes,
+        'payloads': payloads,
+        'source_key': s3_service.last_loaded_key,
+        'source_etag': s3_service.last_loaded_etag,
+    }
+
+async def _process_siop_data(force_download: bool = False, source: str = "automático") -> bool:
+    """
+    Função central para processar dados SIOP
+    Constrói a próxima geração fora do event loop e a publica com troca atômica.
+    Enquanto isso, a geração anterior continua servindo as requisições.
+    
+    Args:
+        force_download: Se True, força download mesmo se já existe cache
+        source: Fonte da chamada (para logs)
         
-        # 4. Atualizar cache global COM DADOS DEDUPLICADOS
-        deduplicated_data['search_blob'] = _build_search_blob(deduplicated_data)
-        cached_opportunities = deduplicated_data
-        last_update = utc_now().isoformat()
-        
-        logger.info(f"✅ Processamento {source} concluído com sucesso!")
-        logger.info(f"📅 Última atualização: {last_update}")
-        logger.info(f"📊 Total final no cache: {len(cached_opportunities):,} oportunidades únicas")
-        
-        return True
-        
-    except Exception as e:
-        logger.error(f"❌ Erro no processamento {source}: {e}")
-        return False
+    Returns:
+        bool: True se processamento foi bem-sucedido
+    """
+    async with _refresh_lock:
+        try:
+            loop = asyncio.get_running_loop()
+            built = await loop.run_in_executor(None, _build_dataset, force_download, source)
+            
+            if built is None:
+                _record_refresh_failure(source)
+                return False
+            
+            _record_refresh_success()
+            if built.get('unchanged'):
+                dataset_store.revalidate()
+                freshness_poller.clear_signal()
+                return True
+            
+            generation = dataset_store.publish(
+                built['frame'],
+                source=source,
+                source_key=built['source_key'],
+                source_etag=built['source_etag'],
+                indexes=built['indexes'],
+                payloads=built['payloads'],
+            )
+            logger.info(f"📅 Última atualização: {generation.last_update}")
+            freshness_poller.clear_signal()
+            s3_service.invalidate_metadata_cache()
+            _schedule_history_sync()
+            
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Erro no processamento {source}: {e}")
+            _record_refresh_failure(source)
+            return False
+
+def _record_refresh_failure(source: str):
+    """Conta a falha e adia o próximo refresh disparado por requisições (backoff do poller)"""
+    global _refresh_failures, _refresh_retry_at
+    
+    _refresh_failures += 1
+    delay = freshness_poller.next_delay(_refresh_failures)
+    _refresh_retry_at = time.monotonic() + delay
+    logger.warning(
+        f"⏳ Refresh {source} falhou ({_refresh_failures}x seguidas) - "
+        f"requisições só tentam de novo em {delay:.0f}s"
+    )
+
+def _record_refresh_success():
+    global _refresh_failures, _refresh_retry_at
+    
+    _refresh_failures = 0
+    _refresh_retry_at = 0.0
+
+def _refresh_backoff_remaining() -> float:
+    """Segundos até as requisições poderem disparar outro refresh (0 = liberado)"""
+    if not _refresh_failures:
+        return 0.0
+    return max(0.0, _refresh_retry_at - time.monotonic())
 
 async def process_new_data():
     """
@@ -1698,57 +2068,122 @@ async def refresh_data_from_s3(force_download: bool = False):
     REFATORADO: Agora chama função central para evitar duplicação
     
     Args:
-        force_download: Se True, ignora cache e baixa do S3
+        force_download: Se True, revalida no S3 (GET condicional: 304 mantém a geração atual)
     """
     return await _process_siop_data(force_download=force_download, source="manual")
 
+def _sync_history() -> Dict:
+    """Ingere no histórico os snapshots de siop-data/ ainda não catalogados (bloqueante)"""
+    summary = history_store.sync(s3_service.list_all_siop_files(), s3_service.read_object_frame)
+    if summary.get('ingested'):
+        logger.info(f"🗂️ Histórico sincronizado: {summary}")
+    return summary
+
+def _schedule_history_sync() -> Optional[asyncio.Task]:
+    """Agenda a sincronização do histórico em background (single-flight)"""
+    global _history_task
+    
+    if not history_store.enabled or not s3_service.is_available():
+        return None
+    if _history_task is None or _history_task.done():
+        loop = asyncio.get_running_loop()
+        _history_task = asyncio.ensure_future(loop.run_in_executor(None, _sync_history))
+    return _history_task
+
+def _schedule_refresh(force_download: bool = False, source: str = "revalidação") -> asyncio.Task:
+    """
+    Agenda um refresh em background (single-flight)
+    
+    Se já houver um refresh em andamento, reutiliza a mesma task em vez de
+    disparar outra carga. A geração atual continua servindo até a troca.
+    """
+    global _refresh_task
+    
+    if _refresh_task is None or _refresh_task.done():
+        logger.info(f"🔄 Agendando refresh em background ({source})...")
+        _refresh_task = asyncio.create_task(
+            _process_siop_data(force_download=force_download, source=source)
+        )
+    return _refresh_task
+
+async def _get_dataset() -> Optional[DatasetGeneration]:
+    """
+    Retorna a geração corrente do dataset (stale-while-revalidate)
+    
+    - Sem geração publicada: carga bloqueante (apenas na primeira requisição)
+    - Geração desatualizada: agenda refresh em background e serve a atual
+    """
+    dataset = dataset_store.current()
+    refreshing = _refresh_task is not None and not _refresh_task.done()
+    
+    if dataset is None:
+        if not refreshing and _refresh_backoff_remaining() > 0:
+            return None
+        logger.info("Cache vazio - carregando dados...")
+        await _schedule_refresh(source="automático")
+        return dataset_store.current()
+    
+    if _is_cache_stale() and (refreshing or _refresh_backoff_remaining() == 0):
+        logger.info("Cache desatualizado - servindo geração atual e revalidando em background...")
+        _schedule_refresh(source="revalidação")
+    
+    return dataset
+
 def _is_cache_stale() -> bool:
     """
     Verifica se cache está desatualizado
-    Sistema inteligente que verifica:
+    
+    Não faz chamadas ao S3: a detecção de novas versões é feita em background
+    pelo FreshnessPoller, que marca a geração como desatualizada.
     1. Se existe cache (se não, está desatualizado)
-    2. Se cache tem mais de 1 hora (forçar verificação S3)
-    3. Se existe arquivo mais novo no S3
+    2. Se a geração foi marcada para revalidação (limpeza de cache ou nova versão no S3)
     """
-    if last_update is None or cached_opportunities is None:
+    if dataset_store.current() is None:
         logger.info("📋 Cache vazio - precisa atualizar")
         return True
     
-    try:
-        # Verificar idade do cache (1 hora = considera stale)
-        last_update_dt = datetime.fromisoformat(last_update)
-        hours_diff = (utc_now() - last_update_dt).total_seconds() / 3600
-        
-        if hours_diff > 1:
-            logger.info(f"⏰ Cache com {hours_diff:.1f}h - verificando S3...")
-            
-            # Se S3 disponível, verificar se tem arquivo mais novo
-            if s3_service.is_available():
-                latest_file = s3_service._find_latest_file()
-                if latest_file:
-                    s3_metadata = s3_service.get_file_metadata(latest_file)
-                    if s3_metadata and 'last_modified' in s3_metadata:
-                        s3_modified = s3_metadata['last_modified']
-                        
-                        # Se arquivo S3 é mais novo que cache, está stale
-                        if isinstance(s3_modified, str):
-                            s3_modified = datetime.fromisoformat(s3_modified.replace('Z', '+00:00'))
-                        
-                        if s3_modified.replace(tzinfo=None) > last_update_dt:
-                            logger.info("📄 Arquivo S3 mais recente que cache - atualizando")
-                            return True
-            
-            # Cache antigo mas sem arquivo S3 mais novo
-            logger.info("📋 Cache antigo mas sem atualizações S3")
-            return False
-        
-        # Cache recente
-        logger.debug(f"📋 Cache recente ({hours_diff:.1f}h)")
-        return False
-        
-    except Exception as e:
-        logger.error(f" Erro ao verificar cache: {e}")
-        return True  # Em caso de erro, força atualização
+    return dataset_store.is_stale
+
+def _current_source_version() -> Optional[Dict]:
+    """Versão (chave + ETag) do arquivo que originou a geração corrente"""
+    dataset = dataset_store.current()
+    if dataset is None:
+        return None
+    return {
+        'key': dataset.source_key,
+        'etag': dataset.source_etag,
+        'filter_signature': dataset.payloads.get('filter_report', {}).get('signature'),
+    }
+
+def _check_latest_version() -> Optional[Dict]:
+    """Versão mais recente no storage + assinatura das regras de filtro em disco (bloqueante)"""
+    latest = s3_service.get_latest_version()
+    if latest:
+        latest = {**latest, 'filter_signature': etl_service.filter_rules.pending_signature()}
+    return latest
+
+def _on_new_source_version(latest: Dict):
+    """Sinal do poller: nova versão no S3 → revalidar com uma única ingestão"""
+    dataset_store.mark_stale()
+    _schedule_refresh(source="nova versão S3")
+
+freshness_poller = FreshnessPoller(
+    check_latest=_check_latest_version,
+    current_version=_current_source_version,
+    on_new_version=_on_new_source_version,
+)
+
+@app.on_event("startup")
+async def start_freshness_poller():
+    """Inicia a verificação de frescor em background (se S3 disponível)"""
+    if s3_service.is_available() and os.getenv('FRESHNESS_POLL_ENABLED', 'true').lower() in ['true', '1', 'yes']:
+        freshness_poller.start()
+    _schedule_history_sync()
+
+@app.on_event("shutdown")
+async def stop_freshness_poller():
+    await freshness_poller.stop()
+    partition_executor.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
@@ -10,7 +10,12 @@ conforme Portal do Governo Federal e Manual Técnico de Orçamento.
 Fonte: Lista fornecida pelo usuário com siglas oficiais verificadas.
 """
 
-from typing import Dict, Optional
+import bisect
+import re
+import unicodedata
+from functools import lru_cache
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
 
 # Mapeamento oficial de ministérios para siglas
 # Chave: Nome completo do ministério/órgão conforme aparece nos dados SIOP
@@ -444,22 +449,36 @@ def buscar_ministerio_por_substring(substring: str) -> Optional[Dict]:
     """
     Busca ministério por substring no nome (busca flexível)
     
+    Ignora acentos e maiúsculas; considera também sigla e nome curto.
+    
     Args:
-        substring: Parte do nome do ministério
+        substring: Parte do nome do ministério (ou sigla, ex.: "MEC")
         
     Returns:
-        Informações do primeiro ministério encontrado ou None
+        Informações do ministério mais relevante ou None
+    """
+    encontrados = buscar_ministerios(substring, limite=1)
+    return encontrados[0] if encontrados else None
+
+def buscar_ministerios(termo: str, limite: int = 10) -> List[Dict]:
     """
-    substring_upper = substring.upper()
+    Busca ministérios por substring, com resultados ordenados por relevância
     
-    for nome_completo, info in MINISTERIOS_SIGLAS.items():
-        if substring_upper in nome_completo:
-            return {
-                "nome_completo": nome_completo,
-                **info
-            }
+    Relevância: sigla exata, nome exato, início do nome, início de palavra,
+    qualquer posição; empate pela ordem do mapeamento. Consultas repetidas
+    são memoizadas.
     
-    return None
+    Args:
+        termo: Parte do nome, nome curto ou sigla (sem distinção de acentos/maiúsculas)
+        limite: Máximo de resultados
+        
+    Returns:
+        Lista de dicionários com nome_completo, sigla, nome_curto, codigo e relevancia
+    """
+    return [
+        {"nome_completo": nome, **MINISTERIOS_SIGLAS[nome], "relevancia": relevancia}
+        for nome, relevancia in _buscar_ranqueado(normalizar_nome_orgao(termo), limite)
+    ]
 
 def listar_todos_ministerios() -> Dict[str, Dict]:
     """
@@ -513,26 +532,230 @@ def enriquecer_dados_ministerios(all_ministries: list) -> list:
         Lista enriquecida com siglas oficiais
     """
     for ministry_info in all_ministries:
-        nome_completo = ministry_info.get("ministry", "").upper()
+        ministry_info.update(resolver_ministerio(ministry_info.get("ministry", "")))
+    
+    return all_ministries 
+
+
+# =====================================================================
+# ÍNDICE DE RESOLUÇÃO (construído uma vez, na importação do módulo)
+# =====================================================================
+
+# Código orçamentário no início do nome SIOP ("36000 - MINISTÉRIO DA SAÚDE")
+CODIGO_ORGAO_PATTERN = re.compile(r'^\s*(\d{5})\s*-')
+
+
+def normalizar_nome_orgao(nome: str) -> str:
+    """Maiúsculas, sem acentos e com espaços simples ("Ministério  da Saúde" → "MINISTERIO DA SAUDE")"""
+    sem_acentos = unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sem_acentos.upper().split())
+
+
+class _IndiceMinisterios:
+    """
+    Índices de MINISTERIOS_SIGLAS e da lista de relacionamento Innovatis
+    
+    - nome exato (maiúsculas) → info
+    - nome normalizado (sem acentos/espaços extras) → info
+    - código orçamentário → info
+    - busca por substring: nomes concatenados numa única string, localizados
+      com str.find e convertidos de volta ao nome por bisect (primeiro nome
+      na ordem do mapeamento, como a varredura linear)
+    - busca ranqueada: índice de n-gramas (trigramas) sobre nome, nome curto e
+      sigla normalizados; candidatos pela interseção das listas e conferidos
+    - relacionamento: regex única com todos os nomes relacionados (nome
+      relacionado contido no órgão) + substring na lista concatenada (órgão
+      contido num nome relacionado)
+    """
+    
+    SEPARADOR = '\x00'
+    N_GRAMA = 3
+    
+    def __init__(self, siglas: Dict[str, Dict], relacionados: List[str]):
+        self.por_nome = siglas
+        self.por_nome_normalizado: Dict[str, Dict] = {}
+        self.por_codigo: Dict[str, Dict] = {}
+        for nome, info in siglas.items():
+            self.por_nome_normalizado.setdefault(normalizar_nome_orgao(nome), info)
+            # Preferir o nome oficial "CÓDIGO - NOME" às variações sem código
+            if nome.startswith(f"{info['codigo']} - "):
+                self.por_codigo.setdefault(info['codigo'], info)
+        for info in siglas.values():
+            self.por_codigo.setdefault(info['codigo'], info)
+        
+        self._nomes = list(siglas)
+        self._texto_nomes, self._inicios = self._concatenar(self._nomes)
         
-        # Buscar informações oficiais
-        info_oficial = get_info_ministerio(nome_completo)
+        # Documento normalizado por nome: "NOME\x00NOME CURTO\x00SIGLA"
+        self._documentos: List[str] = []
+        self._nomes_sem_codigo: List[str] = []
+        self._siglas: List[str] = []
+        self._ngramas: Dict[str, set] = defaultdict(set)
+        for posicao, (nome, info) in enumerate(siglas.items()):
+            nome_normalizado = normalizar_nome_orgao(nome)
+            self._siglas.append(normalizar_nome_orgao(info['sigla']))
+            self._nomes_sem_codigo.append(nome_normalizado.split(' - ', 1)[-1])
+            documento = self.SEPARADOR.join([nome_normalizado, normalizar_nome_orgao(info['nome_curto']), self._siglas[-1]])
+            self._documentos.append(documento)
+            for inicio in range(len(documento) - self.N_GRAMA + 1):
+                self._ngramas[documento[inicio:inicio + self.N_GRAMA]].add(posicao)
+        
+        relacionados_upper = [nome.upper() for nome in relacionados]
+        self._texto_relacionados, _ = self._concatenar(relacionados_upper)
+        self._relacionado_contido = re.compile(
+            '|'.join(re.escape(nome) for nome in sorted(relacionados_upper, key=len, reverse=True))
+        ) if relacionados_upper else None
+    
+    @classmethod
+    def _concatenar(cls, nomes: List[str]) -> Tuple[str, List[int]]:
+        inicios, posicao = [], 0
+        for nome in nomes:
+            inicios.append(posicao)
+            posicao += len(nome) + len(cls.SEPARADOR)
+        return cls.SEPARADOR.join(nomes), inicios
+    
+    def buscar_substring(self, termo_upper: str) -> Optional[Tuple[str, Dict]]:
+        """Primeiro nome do mapeamento que contém o termo"""
+        posicao = self._texto_nomes.find(termo_upper)
+        if posicao < 0:
+            return None
+        nome = self._nomes[bisect.bisect_right(self._inicios, posicao) - 1]
+        return nome, self.por_nome[nome]
+    
+    def _candidatos(self, termo: str) -> Iterable[int]:
+        if len(termo) < self.N_GRAMA:
+            return range(len(self._documentos))
+        listas = sorted(
+            (self._ngramas.get(termo[inicio:inicio + self.N_GRAMA], set()) for inicio in range(len(termo) - self.N_GRAMA + 1)),
+            key=len,
+        )
+        return sorted(set.intersection(*listas))
+    
+    def _relevancia(self, termo: str, posicao: int) -> int:
+        """0 = sigla exata ... 4 = substring em qualquer posição"""
+        documento = self._documentos[posicao]
+        nome, nome_curto, _ = documento.split(self.SEPARADOR)
+        if termo == self._siglas[posicao]:
+            return 0
+        if termo in (nome, nome_curto, self._nomes_sem_codigo[posicao]):
+            return 1
+        if nome.startswith(termo) or nome_curto.startswith(termo) or self._nomes_sem_codigo[posicao].startswith(termo):
+            return 2
+        if f" {termo}" in f" {documento.replace(self.SEPARADOR, ' ')}":
+            return 3
+        return 4
+    
+    def buscar_ranqueado(self, termo: str, limite: int) -> List[Tuple[str, int]]:
+        """Nomes que contêm o termo normalizado, ordenados por (relevância, ordem do mapeamento)"""
+        if not termo:
+            return []
+        encontrados = [
+            (self._relevancia(termo, posicao), posicao)
+            for posicao in self._candidatos(termo)
+            if termo in self._documentos[posicao]
+        ]
+        encontrados.sort()
+        return [(self._nomes[posicao], relevancia) for relevancia, posicao in encontrados[:limite]]
+    
+    def tem_relacionamento(self, nome_upper: str) -> bool:
+        """Nome relacionado contido no órgão ou órgão contido num nome relacionado"""
+        if self._relacionado_contido is not None and self._relacionado_contido.search(nome_upper):
+            return True
+        return self._texto_relacionados.find(nome_upper) >= 0
+    
+    def resolver(self, nome: str) -> Optional[Dict]:
+        """
+        Info oficial do órgão: nome exato → substring (mesma ordem de antes) →
+        nome normalizado → código orçamentário
+        """
+        nome_upper = nome.upper()
+        info = self.por_nome.get(nome_upper)
+        if info is None:
+            encontrado = self.buscar_substring(nome_upper)
+            info = encontrado[1] if encontrado else None
+        if info is None:
+            info = self.por_nome_normalizado.get(normalizar_nome_orgao(nome))
+        if info is None:
+            codigo = CODIGO_ORGAO_PATTERN.match(nome_upper)
+            info = self.por_codigo.get(codigo.group(1)) if codigo else None
+        return info
+
+
+_INDICE = _IndiceMinisterios(MINISTERIOS_SIGLAS, get_ministerios_com_relacionamento())
+
+
+@lru_cache(maxsize=1024)
+def _buscar_ranqueado(termo_normalizado: str, limite: int) -> Tuple[Tuple[str, int], ...]:
+    return tuple(_INDICE.buscar_ranqueado(termo_normalizado, limite))
+
+
+@lru_cache(maxsize=4096)
+def _resolver_cached(nome: str) -> Tuple[Tuple[str, str], ...]:
+    info = _INDICE.resolver(nome)
+    if info is not None:
+        return (("sigla", info["sigla"]), ("nome_curto", info["nome_curto"]), ("codigo", info["codigo"]))
+    
+    # Fallback para ministérios não mapeados
+    nome_completo = nome.upper()
+    if " - " in nome_completo:
+        codigo = nome_completo.split(" - ")[0]
+        nome_curto = nome_completo.replace(codigo + " - ", "")
+    else:
+        codigo, nome_curto = "XXXXX", nome_completo
+    return (("sigla", "N/A"), ("nome_curto", nome_curto), ("codigo", codigo))
+
+
+def resolver_ministerio(nome: str) -> Dict[str, str]:
+    """
+    Sigla, nome curto e código do órgão (memoizado por nome)
+    
+    Args:
+        nome: Valor da coluna Órgão como aparece nos dados SIOP
         
-        if info_oficial:
-            ministry_info["sigla"] = info_oficial["sigla"]
-            ministry_info["nome_curto"] = info_oficial["nome_curto"]
-            ministry_info["codigo"] = info_oficial["codigo"]
-        else:
-            # Tentar busca por substring se não encontrar match exato
-            info_substring = buscar_ministerio_por_substring(nome_completo)
-            if info_substring:
-                ministry_info["sigla"] = info_substring["sigla"]
-                ministry_info["nome_curto"] = info_substring["nome_curto"]
-                ministry_info["codigo"] = info_substring["codigo"]
-            else:
-                # Fallback para ministérios não mapeados
-                ministry_info["sigla"] = "N/A"
-                ministry_info["nome_curto"] = nome_completo.replace(nome_completo.split(" - ")[0] + " - ", "") if " - " in nome_completo else nome_completo
-                ministry_info["codigo"] = nome_completo.split(" - ")[0] if " - " in nome_completo else "XXXXX"
+    Returns:
+        Dicionário com sigla, nome_curto e codigo ("N/A" se não mapeado)
+    """
+    return dict(_resolver_cached(nome))
+
+
+@lru_cache(maxsize=4096)
+def tem_relacionamento(nome: str) -> bool:
+    """Se o órgão tem projetos vigentes Innovatis (busca flexível por substring)"""
+    return _INDICE.tem_relacionamento(nome.upper())
+
+
+def resolver_orgaos(nomes: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Resolve cada valor distinto de Órgão uma única vez (por geração do dataset)
     
-    return all_ministries 
\ No newline at end of file
+    Returns:
+        {nome: {"has_relationship", "sigla", "nome_curto", "codigo"}}
+    """
+    return {
+        nome: {"has_relationship": tem_relacionamento(nome), **resolver_ministerio(nome)}
+        for nome in dict.fromkeys(nomes)
+    }
+
+
+def sinonimos_orgaos(orgaos: Iterable[str]) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Sinônimos de busca dos órgãos presentes nos dados
+    
+    Sigla oficial ("mec", "ms", "mcti") e nome curto ("ministerio da saude"),
+    em minúsculas e sem acentos como o índice de busca, apontando para os
+    valores de Órgão que resolvem para eles.
+    
+    Returns:
+        {"siglas": {sigla: [órgãos]}, "nomes_curtos": {nome curto: [órgãos]}}
+    """
+    siglas: Dict[str, List[str]] = defaultdict(list)
+    nomes_curtos: Dict[str, List[str]] = defaultdict(list)
+    for orgao in dict.fromkeys(orgaos):
+        if not isinstance(orgao, str):
+            continue
+        info = _INDICE.resolver(orgao)
+        if info is None:
+            continue
+        siglas[normalizar_nome_orgao(info["sigla"]).lower()].append(orgao)
+        nomes_curtos[normalizar_nome_orgao(info["nome_curto"]).lower()].append(orgao)
+    return {"siglas": dict(siglas), "nomes_curtos": dict(nomes_curtos)}
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Dataset Service - Gerações imutáveis do dataset em memória
+==========================================================
+
+Responsável por:
+- Representar cada carga processada como uma geração imutável
+  (frame, índices, payloads pré-codificados e versão)
+- Publicar uma nova geração com troca atômica, só depois de totalmente construída
+- Manter a geração anterior servindo requisições durante um refresh
+  (stale-while-revalidate)
+"""
+
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DatasetGeneration:
+    """Snapshot imutável do dataset processado"""
+
+    version: int
+    frame: pd.DataFrame
+    last_update: str
+    source: str = ""
+    source_key: Optional[str] = None
+    source_etag: Optional[str] = None
+    indexes: Mapping[str, Any] = field(default_factory=dict)
+    payloads: Mapping[str, Any] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+
+class DatasetStore:
+    """
+    Guarda a geração corrente do dataset
+
+    Leitores obtêm a geração com `current()` e trabalham sobre ela até o fim da
+    requisição; um refresh constrói a próxima geração por fora e a publica com
+    `publish()`, que apenas troca a referência. Nunca existe janela em que o
+    dataset fica vazio.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: Optional[DatasetGeneration] = None
+        self._version = 0
+        self._stale = False
+
+    def current(self) -> Optional[DatasetGeneration]:
+        """Retorna a geração publicada (ou None se nada foi carregado ainda)"""
+        return self._current
+
+    @property
+    def is_stale(self) -> bool:
+        """True se a geração corrente foi marcada para revalidação"""
+        return self._stale
+
+    def mark_stale(self):
+        """Marca a geração corrente para revalidação sem descartá-la"""
+        self._stale = True
+
+    def revalidate(self):
+        """Confirma a geração corrente como atual (fonte inalterada no storage)"""
+        self._stale = False
+
+    def publish(
+        self,
+        frame: pd.DataFrame,
+        source: str = "",
+        source_key: Optional[str] = None,
+        source_etag: Optional[str] = None,
+        indexes: Optional[Dict[str, Any]] = None,
+        payloads: Optional[Dict[str, Any]] = None,
+    ) -> DatasetGeneration:
+        """
+        Publica uma nova geração já totalmente construída
+
+        Args:
+            frame: DataFrame final (filtrado e deduplicado)
+            source: Fonte da carga (para logs)
+            source_key: Chave do arquivo de origem no storage
+            source_etag: ETag do arquivo de origem (identifica a versão)
+            indexes: Estruturas auxiliares de busca/filtro
+            payloads: Respostas pré-codificadas
+
+        Returns:
+            A geração publicada
+        """
+        with self._lock:
+            self._version += 1
+            generation = DatasetGeneration(
+                version=self._version,
+                frame=frame,
+                last_update=datetime.now(timezone.utc).isoformat(),
+                source=source,
+                source_key=source_key,
+                source_etag=source_etag,
+                indexes=MappingProxyType(dict(indexes or {})),
+                payloads=MappingProxyType(dict(payloads or {})),
+            )
+            previous = self._current
+            self._current = generation
+            self._stale = False
+
+        logger.info(
+            f"🔁 Geração {generation.version} publicada "
+            f"({len(frame):,} registros; anterior: {previous.version if previous else '—'})"
+        )
+        return generation
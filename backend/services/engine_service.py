@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Engine Service - Engine de dados dos caminhos quentes do ETL e da busca
+=======================================================================
+
+Responsável por:
+- Escolher a engine pelo DATA_ENGINE (pandas | polars | auto)
+- Implementar, por engine, as operações de texto mais caras
+  - conversão de valores monetários (formato brasileiro)
+  - máscaras das regras de filtro de texto (prefixo, codigo_em)
+  - escolha do vencedor de cada Codigo_Emenda na deduplicação
+  - blob normalizado da busca
+  - índice de consulta da busca (filtros de /api/search e termos sobre o blob)
+- Normalização de texto da busca (compartilhada pelas engines)
+
+O frame da geração continua em pandas (schema, JSON, resumo): a engine Polars
+recebe colunas, devolve máscaras/posições/valores e só converte as colunas que
+usa. Onde a conversão não é possível (ex.: coluna object com tipos misturados),
+cai para a implementação pandas com o mesmo resultado.
+"""
+
+import os
+import re
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+# Polars é opcional (conversão pandas ↔ Polars usa pyarrow): sem ele, engine pandas
+try:
+    import polars as pl
+    POLARS_AVAILABLE = True
+except ImportError:
+    POLARS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Primeira versão do Polars com todas as expressões usadas (str.normalize chegou na 1.20)
+POLARS_MIN_VERSION = (1, 20, 0)
+
+# Textos monetários tratados como zero
+MONEY_BLANKS = ['', '-', 'na', 'n/a', 'nan', 'none', 'null']
+
+# Colunas concatenadas no blob de busca (sem nenhuma delas, usa todas as colunas)
+SEARCH_BLOB_COLUMNS = [
+    'Autor', 'Ação', 'Localizador', 'Órgão', 'UO', 'Partido',
+    'UF Autor', 'Tipo Autor', 'RP', 'Modalidade', 'Natureza Despesa',
+    'GND', 'Codigo_Emenda'
+]
+
+# Filtros de /api/search: tipo do critério → coluna do frame
+QUERY_COLUMNS = {
+    'years': 'Ano',
+    'rp': 'RP',
+    'modalidades': 'Modalidade',
+    'ufs': 'UF Autor',
+    'partidos': 'Partido',
+}
+
+
+def normalize_search_text(text: str) -> str:
+    """Normaliza texto removendo acentos, múltiplos espaços e converte para minúsculas."""
+    if text is None or (isinstance(text, float) and pd.isna(text)):
+        return ""
+    text = str(text).lower()
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def search_blob_columns(df: pd.DataFrame) -> List[str]:
+    """Colunas do frame que entram no blob de busca"""
+    existing_cols = [c for c in SEARCH_BLOB_COLUMNS if c in df.columns]
+    # Se nenhuma das colunas pré-definidas existir, usa TODAS as colunas disponíveis
+    return existing_cols or df.columns.tolist()
+
+
+def orgao_column(df: pd.DataFrame) -> str:
+    return 'Órgão' if 'Órgão' in df.columns else 'orgao_orcamentario'
+
+
+class PandasEngine:
+    """Engine padrão: operações vetorizadas em pandas (sobre valores únicos quando possível)"""
+
+    name = 'pandas'
+
+    def parse_money(self, values: pd.Series) -> pd.Series:
+        """
+        Converte uma coluna monetária para float64 (vetorizado)
+
+        Aceita "R$ 1.234,56", "1.234", "1234.56", negativos ("-1.234,56",
+        "(1.234,56)", "1.234,56-"), números já convertidos e vazios (→ 0.0).
+        O parse roda sobre os valores únicos da coluna e é espalhado por código,
+        então o custo é proporcional à cardinalidade, não ao número de linhas.
+        """
+        if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+            return values.astype(np.float64).fillna(0.0)
+
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+        uniques = pd.Series(np.asarray(uniques, dtype=object))
+
+        parsed = pd.Series(np.nan, index=uniques.index, dtype=np.float64)
+        is_text = uniques.map(lambda v: isinstance(v, str)).astype(bool)
+        if (~is_text).any():
+            parsed[~is_text] = pd.to_numeric(uniques[~is_text], errors='coerce')
+
+        if is_text.any():
+            text = uniques[is_text].str.replace(r'(?i)r\$|\s', '', regex=True)
+            negative = (
+                text.str.startswith('-') | text.str.endswith('-')
+                | (text.str.startswith('(') & text.str.endswith(')'))
+            )
+            digits = text.str.replace(r'[()+-]', '', regex=True)
+            # Formato brasileiro: '.' separa milhares e ',' decimais; sem vírgula,
+            # um ponto que não agrupa milhares ("1234.56") é separador decimal
+            thousands = digits.str.contains(',', regex=False) | digits.str.fullmatch(r'\d{1,3}(\.\d{3})+')
+            digits = digits.where(~thousands, digits.str.replace('.', '', regex=False))
+            numbers = pd.to_numeric(digits.str.replace(',', '.', regex=False), errors='coerce')
+            numbers[negative] = -numbers[negative]
+
+            invalid = numbers.isna() & ~text.str.lower().isin(MONEY_BLANKS)
+            if invalid.any():
+                examples = uniques[is_text][invalid].head(3).tolist()
+                logger.warning(f"⚠️ {int(invalid.sum())} valores monetários não convertidos (→ 0.0), ex.: {examples}")
+            parsed[is_text] = numbers
+
+        # Código -1 (nulo) aponta para o 0.0 acrescentado ao final
+        result = np.append(parsed.fillna(0.0).to_numpy(), 0.0)[codes]
+        return pd.Series(result, index=values.index, name=values.name)
+
+    def rule_mask(self, rule: Dict[str, Any], series: pd.Series,
+                  parse_money: Callable[[pd.Series], pd.Series]) -> Optional[np.ndarray]:
+        """Máscara de uma regra de filtro; None = avaliação padrão do FilterRuleSet"""
+        return None
+
+    def dedup_positions(self, codes: pd.Series, empenhado: np.ndarray, dotacao: np.ndarray) -> np.ndarray:
+        """
+        Posições do vencedor de cada código: maior Empenhado, depois maior Dotação,
+        depois a primeira ocorrência (na ordem do ranking)
+        """
+        # Ordenação estável por (Empenhado, Dotação) decrescentes e 1ª ocorrência de cada
+        # código pelos códigos inteiros do hash (factorize), sem sort_values/drop_duplicates no frame
+        order = np.lexsort((-dotacao, -empenhado))
+        codigo_ids, _ = pd.factorize(codes)
+        first_of_code = ~pd.Series(codigo_ids[order]).duplicated().to_numpy()
+        return order[first_of_code]
+
+    def search_blob(self, df: pd.DataFrame) -> pd.Series:
+        """Cria coluna agregada já normalizada para busca vetorizada."""
+        blob = (
+            df[search_blob_columns(df)]
+            .astype(object)
+            .fillna('')
+            .astype(str)
+            .agg(' '.join, axis=1)
+            .map(normalize_search_text)
+        )
+        return blob
+
+    def query_index(self, frame: pd.DataFrame, search_blob: pd.Series) -> Optional[Any]:
+        """Índice de consulta da geração; None = filtros da busca em pandas no próprio endpoint"""
+        return None
+
+
+class PolarsEngine(PandasEngine):
+    """Engine Polars: as mesmas operações em expressões Polars (Rust, strings Arrow)"""
+
+    name = 'polars'
+
+    @staticmethod
+    def _text(series: pd.Series) -> 'pl.Series':
+        """Coluna pandas como texto Polars (nulos preservados)"""
+        return pl.from_pandas(series).cast(pl.Utf8)
+
+    def parse_money(self, values: pd.Series) -> pd.Series:
+        if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+            return values.astype(np.float64).fillna(0.0)
+        try:
+            text = self._text(values)
+        except Exception:
+            # Ex.: coluna object com números e textos misturados
+            return super().parse_money(values)
+
+        text = text.str.replace_all(r'(?i)r\$|\s', '')
+        negative = (
+            text.str.starts_with('-') | text.str.ends_with('-')
+            | (text.str.starts_with('(') & text.str.ends_with(')'))
+        )
+        digits = text.str.replace_all(r'[()+-]', '')
+        # Mesma regra do pandas para separador de milhares vs. decimal
+        thousands = digits.str.contains(',', literal=True) | digits.str.contains(r'^\d{1,3}(\.\d{3})+$')
+        digits = pl.select(
+            pl.when(thousands).then(digits.str.replace_all('.', '', literal=True)).otherwise(digits)
+        ).to_series()
+        numbers = digits.str.replace_all(',', '.', literal=True).cast(pl.Float64, strict=False)
+        numbers = pl.select(pl.when(negative).then(-numbers).otherwise(numbers)).to_series()
+
+        invalid = (numbers.is_null() | numbers.is_nan()) & text.is_not_null() & ~text.str.to_lowercase().is_in(MONEY_BLANKS)
+        if invalid.any():
+            invalid_values = pl.from_pandas(values).filter(invalid).unique(maintain_order=True)
+            logger.warning(f"⚠️ {len(invalid_values)} valores monetários não convertidos (→ 0.0), ex.: {invalid_values.head(3).to_list()}")
+
+        result = numbers.fill_nan(0.0).fill_null(0.0).to_numpy()
+        return pd.Series(result, index=values.index, name=values.name)
+
+    def rule_mask(self, rule: Dict[str, Any], series: pd.Series,
+                  parse_money: Callable[[pd.Series], pd.Series]) -> Optional[np.ndarray]:
+        # Regras numéricas já usam parse_money (desta engine)
+        if rule['tipo'] not in ('prefixo', 'codigo_em'):
+            return None
+        try:
+            text = self._text(series)
+        except Exception:
+            return None
+
+        if rule['tipo'] == 'prefixo':
+            mask = pl.select(pl.any_horizontal([text.str.starts_with(str(v)) for v in rule['valores']])).to_series()
+        else:
+            allowed = [float(v) for v in rule['valores']]
+            mask = text.str.extract(r'^\s*(\d+)', 1).cast(pl.Float64, strict=False).is_in(allowed)
+        return mask.fill_null(False).to_numpy()
+
+    def dedup_positions(self, codes: pd.Series, empenhado: np.ndarray, dotacao: np.ndarray) -> np.ndarray:
+        try:
+            codigo = pl.from_pandas(codes)
+        except Exception:
+            return super().dedup_positions(codes, empenhado, dotacao)
+        ranking = pl.DataFrame({
+            'codigo': codigo,
+            # + 0.0 iguala -0.0 a 0.0 (o lexsort do pandas também os empata)
+            'empenhado': empenhado + 0.0,
+            'dotacao': dotacao + 0.0,
+            'posicao': np.arange(len(codes)),
+        })
+        winners = (
+            ranking
+            .sort(['empenhado', 'dotacao', 'posicao'], descending=[True, True, False])
+            .unique(subset='codigo', keep='first', maintain_order=True)
+        )
+        return winners['posicao'].to_numpy()
+
+    def search_blob(self, df: pd.DataFrame) -> pd.Series:
+        columns = search_blob_columns(df)
+        try:
+            frame = pl.from_pandas(df[columns])
+        except Exception:
+            return super().search_blob(df)
+        blob = frame.select(
+            pl.concat_str([pl.col(c).cast(pl.Utf8).fill_null('') for c in frame.columns], separator=' ')
+            .str.to_lowercase()
+            .str.normalize('NFD')
+            .str.replace_all(r'\p{Mn}', '')
+            .str.replace_all(r'\s+', ' ')
+            .str.strip_chars()
+        ).to_series()
+        return pd.Series(blob.to_numpy(), index=df.index, dtype=object)
+
+    def query_index(self, frame: pd.DataFrame, search_blob: pd.Series) -> Optional['PolarsQueryIndex']:
+        try:
+            return PolarsQueryIndex(frame, search_blob)
+        except Exception as e:
+            logger.warning(f"⚠️ Índice de consulta Polars não construído ({e}) - busca em pandas")
+            return None
+
+
+class PolarsQueryIndex:
+    """
+    Colunas de /api/search pré-normalizadas numa cópia Polars da geração
+
+    Mesma semântica dos filtros em pandas do endpoint (texto de nulos = 'nan',
+    códigos extraídos do início do texto); devolve posições de linha do frame.
+    """
+
+    def __init__(self, frame: pd.DataFrame, search_blob: pd.Series):
+        self.frame = frame
+        self.orgao_col = orgao_column(frame)
+        columns = {'blob': pl.from_pandas(search_blob.reset_index(drop=True)).cast(pl.Utf8)}
+
+        def text(col: str) -> 'pl.Series':
+            return pl.from_pandas(frame[col].reset_index(drop=True)).cast(pl.Utf8).fill_null('nan')
+
+        if 'Ano' in frame.columns:
+            columns['years'] = pl.from_pandas(frame['Ano'].reset_index(drop=True)).cast(pl.Float64, strict=False)
+        if 'RP' in frame.columns:
+            columns['rp'] = text('RP').str.extract(r'^(\d+)', 1).cast(pl.Float64, strict=False)
+        if 'Modalidade' in frame.columns:
+            columns['modalidades'] = text('Modalidade').str.extract(r'^(\d+)', 1)
+        for kind in ('ufs', 'partidos'):
+            if QUERY_COLUMNS[kind] in frame.columns:
+                columns[kind] = text(QUERY_COLUMNS[kind]).str.strip_chars().str.to_uppercase()
+        if self.orgao_col in frame.columns:
+            columns['ministry'] = text(self.orgao_col)
+        self.columns = pl.DataFrame(columns)
+
+    def estimated_size(self) -> int:
+        return int(self.columns.estimated_size())
+
+    def select(self, criteria: List[Tuple[str, str, Any]]) -> np.ndarray:
+        """
+        Posições das linhas que passam em todos os critérios
+
+        Args:
+            criteria: [(rótulo, tipo, valores)] - tipos de QUERY_COLUMNS (lista de valores)
+                      ou 'ministry' (padrão de texto, sem diferenciar maiúsculas)
+        """
+        mask = np.ones(len(self.columns), dtype=bool)
+        for _, kind, values in criteria:
+            if kind == 'ministry':
+                mask &= self._ministry_mask(values)
+            elif kind in ('years', 'rp'):
+                mask &= self.columns[kind].is_in([float(v) for v in values]).fill_null(False).to_numpy()
+            else:
+                mask &= self.columns[kind].is_in(list(values)).fill_null(False).to_numpy()
+        return np.flatnonzero(mask)
+
+    def _ministry_mask(self, pattern: str) -> np.ndarray:
+        try:
+            return self.columns['ministry'].str.contains(f"(?i){pattern}").fill_null(False).to_numpy()
+        except Exception:
+            # Padrão fora da sintaxe de regex do Polars: mesma busca em pandas
+            return self.frame[self.orgao_col].astype(str).str.contains(pattern, case=False, na=False).to_numpy()
+
+    def match_tokens(self, positions: np.ndarray, tokens: List[str]) -> np.ndarray:
+        """Posições (entre `positions`) cujo blob contém todos os termos (texto literal)"""
+        blob = self.columns['blob'].gather(positions)
+        mask = np.ones(len(positions), dtype=bool)
+        for token in tokens:
+            mask &= blob.str.contains(token, literal=True).fill_null(False).to_numpy()
+        return positions[mask]
+
+
+ENGINES = {'pandas': PandasEngine, 'polars': PolarsEngine}
+
+
+def polars_supported() -> bool:
+    """Polars instalado e com versão >= POLARS_MIN_VERSION"""
+    if not POLARS_AVAILABLE:
+        return False
+    version = tuple(int(part) for part in re.findall(r'\d+', pl.__version__)[:3])
+    return version >= POLARS_MIN_VERSION
+
+
+def create_engine(preferred: Optional[str] = None) -> PandasEngine:
+    """Engine configurada em DATA_ENGINE (padrão pandas; auto = polars se instalado)"""
+    preferred = (preferred or os.getenv('DATA_ENGINE', 'pandas')).strip().lower()
+    if preferred == 'auto':
+        preferred = 'polars' if polars_supported() else 'pandas'
+    if preferred not in ENGINES:
+        logger.warning(f"⚠️ DATA_ENGINE inválido: {preferred} - usando pandas")
+        preferred = 'pandas'
+    if preferred == 'polars' and not POLARS_AVAILABLE:
+        logger.warning("⚠️ DATA_ENGINE=polars, mas polars não está instalado - usando pandas")
+        preferred = 'pandas'
+    elif preferred == 'polars' and not polars_supported():
+        logger.warning(
+            f"⚠️ polars {pl.__version__} é anterior à mínima suportada "
+            f"({'.'.join(map(str, POLARS_MIN_VERSION))}) - usando pandas"
+        )
+        preferred = 'pandas'
+    engine = ENGINES[preferred]()
+    logger.info(f"🧮 Engine de dados: {engine.name}")
+    return engine
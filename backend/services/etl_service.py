@@ -6,199 +6,160 @@ ETL Service - Processamento de dados Innovatis
 ==============================================
 
 Responsável por:
-- Aplicar filtros específicos Innovatis
+- Aplicar filtros específicos Innovatis (regras declarativas, ver filter_service)
 - Processar dados brutos do SIOP
+- Converter valores monetários (formato brasileiro) uma única vez na ingestão
+- Gerar o código único da emenda (Codigo_Emenda)
 - Gerar resumos e estatísticas
+
+Operações de texto mais caras (valores monetários, regras de texto) passam
+pela engine de dados configurada (engine_service). build_codigo_emenda e
+ETLService.filter_partition são importáveis pelos processos do ETL paralelo
+(parallel_service).
 """
 
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import logging
 
+from services.engine_service import PandasEngine, create_engine
+from services.filter_service import FilterRuleSet
+
 logger = logging.getLogger(__name__)
 
+
+def build_codigo_emenda(df: pd.DataFrame) -> pd.Series:
+    """
+    Código oficial AAAA-BBBB-CCCC (Ano + Código Autor + Número Sequencial), vetorizado
+    
+    Ano é convertido por valor único (poucos anos distintos); linhas com Ano
+    inválido recebem o código de fallback ERRO-{Ano}-{Nro. Emenda com 8 dígitos}.
+    """
+    def _ano_text(value) -> Optional[str]:
+        try:
+            return str(int(value))
+        except (TypeError, ValueError, OverflowError):
+            return None
+    
+    anos = df['Ano']
+    codes, uniques = pd.factorize(anos)
+    ano_by_unique = np.array([_ano_text(v) for v in np.asarray(uniques, dtype=object)] + [None], dtype=object)
+    ano = pd.Series(ano_by_unique[codes], index=df.index)
+    
+    nro = df['Nro. Emenda'].astype(str).str.zfill(8)
+    codigo = ano + '-' + nro.str[:4] + '-' + nro.str[4:]
+    
+    invalid = ano.isna()
+    if invalid.any():
+        logger.warning(f"⚠️ {int(invalid.sum())} registros com Ano inválido - código de fallback ERRO-*")
+        codigo[invalid] = 'ERRO-' + anos[invalid].astype(str) + '-' + nro[invalid]
+    return codigo
+
+
 class ETLService:
     """Serviço de ETL para aplicar filtros Innovatis"""
     
-    def __init__(self):
+    MONEY_COLUMNS = ['Dotação Inicial Emenda', 'Dotação Atual Emenda', 'Empenhado', 'Liquidado', 'Pago']
+    
+    def __init__(self, engine: Optional[PandasEngine] = None):
         self.logger = logging.getLogger(__name__)
+        # Engine de dados (DATA_ENGINE): pandas ou Polars nos caminhos quentes
+        self.engine = engine or create_engine()
+        # Regras dos filtros Innovatis (filter_rules.json, recarregado quando muda)
+        self.filter_rules = FilterRuleSet()
+        self.reset_filter_stats()
     
     def apply_innovatis_filters(self, df: pd.DataFrame) -> pd.DataFrame:
         """
-        Aplica filtros Innovatis na nova sequência otimizada:
-        1. Filtro Financeiro: Dotação Atual >= R$ 10.000 e Empenhado = 0 (oportunidades viáveis)
+        Aplica os filtros Innovatis (regras declarativas de filter_rules.json)
+        numa única passada: as regras viram uma máscara combinada e o frame é
+        fatiado uma vez só.
+        
+        Regras padrão:
+        1. Dotação Atual >= R$ 10.000 e Empenhado = 0 (oportunidades viáveis)
         2. Natureza da despesa: código inicia em "33"
         3. Modalidade: apenas códigos 99, 90, 31, 41 ou 50
         4. Resultado primário: RP6, RP7 ou RP8 (Emendas Individuais e similares)
         
         NOTA: Filtro de ministérios foi removido - agora é feito no frontend
         """
-        original_count = len(df)
-        self.logger.info(f"🔍 Aplicando filtros Innovatis em {original_count:,} registros")
-        self.logger.info(f"📋 Nova sequência otimizada: Financeiro → Natureza → Modalidade → RP")
-        
-        # 1. Filtro Financeiro - PRIMEIRO para máxima eficiência (remove emendas já executadas)
-        df = self._filter_financeiro(df)
-        self.logger.info(f"   → Após filtro financeiro: {len(df):,} registros")
-        
-        # 2. Filtro Natureza da Despesa
-        df = self._filter_natureza_despesa(df)
-        self.logger.info(f"   → Após filtro natureza: {len(df):,} registros")
-        
-        # 3. Filtro Modalidade
-        df = self._filter_modalidade(df)
-        self.logger.info(f"   → Após filtro modalidade: {len(df):,} registros")
-        
-        # 4. Filtro RP (Resultado Primário) - ÚLTIMO por ter menor seletividade
-        df = self._filter_resultado_primario(df)
-        self.logger.info(f"   → Após filtro RP: {len(df):,} registros")
-        
-        # REMOVIDO: Filtro de ministérios vigentes - agora é responsabilidade do frontend
-        # df = self._filter_ministerios_vigentes(df)
-        
-        self.logger.info(f"✅ Filtros aplicados: {len(df):,} de {original_count:,} registros ({len(df)/original_count*100:.1f}%)")
-        self.logger.info(f"🏛️ Ministérios serão filtrados no frontend conforme seleção do usuário")
-        self.logger.info(f"💰 Apenas oportunidades viáveis (Dotação >= R$ 10.000 e Empenhado = 0)")
-        return df
+        filtered_df, report = self.filter_partition(df)
+        self.merge_filter_report(report)
+        return filtered_df
     
-    def _filter_financeiro(self, df: pd.DataFrame) -> pd.DataFrame:
+    def filter_partition(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict]:
         """
-        Filtro Financeiro: Remove emendas já executadas e com valores baixos
-        Condições:
-        - Dotação Atual Emenda >= R$ 10.000 (valor mínimo para viabilidade)
-        - Empenhado = 0 (ainda não foi executado)
+        Filtra um bloco/partição sem tocar na seletividade acumulada
         
-        Este filtro garante que apenas oportunidades reais de captação sejam mantidas.
-        """
-        dotacao_col = self._find_column(df, ['Dotação Atual Emenda', 'dotacao_atual', 'dotacao'])
-        empenhado_col = self._find_column(df, ['Empenhado', 'empenhado', 'valor_empenhado'])
-        
-        if not dotacao_col or not empenhado_col:
-            self.logger.warning("⚠️ Colunas financeiras não encontradas - pulando filtro financeiro")
-            if not dotacao_col:
-                self.logger.warning(f"   Coluna de dotação não encontrada. Colunas disponíveis: {list(df.columns)[:10]}...")
-            if not empenhado_col:
-                self.logger.warning(f"   Coluna de empenhado não encontrada. Colunas disponíveis: {list(df.columns)[:10]}...")
-            return df
+        Usado diretamente pelos processos do ETL paralelo (ver parallel_service):
+        o relatório volta ao processo principal e é somado com merge_filter_report().
         
-        self.logger.info(f"💰 Aplicando filtro financeiro nas colunas: '{dotacao_col}' e '{empenhado_col}'")
+        Returns:
+            (frame filtrado com valores monetários em float, relatório das regras)
+        """
         original_count = len(df)
-        
-        # Aplicar limpeza nos valores
-        df_clean = df.copy()
-        df_clean[dotacao_col + '_numeric'] = df_clean[dotacao_col].apply(self._clean_monetary_value)
-        df_clean[empenhado_col + '_numeric'] = df_clean[empenhado_col].apply(self._clean_monetary_value)
-        
-        # Aplicar filtros financeiros
-        # Condição 1: Dotação Atual >= 10.000 (valor mínimo para viabilidade)
-        mask_dotacao = df_clean[dotacao_col + '_numeric'] >= 10000
-        
-        # Condição 2: Empenhado = 0 (ainda não foi executado)
-        mask_empenhado = df_clean[empenhado_col + '_numeric'] == 0
-        
-        # Aplicar ambas as condições
-        mask_final = mask_dotacao & mask_empenhado
-        filtered_df = df[mask_final]
-        
-        # Estatísticas do filtro
-        removidos_dotacao = len(df) - len(df[mask_dotacao])
-        removidos_empenhado = len(df[mask_dotacao]) - len(filtered_df)
-        total_removidos = len(df) - len(filtered_df)
-        
-        self.logger.info(f"   📊 Estatísticas do filtro financeiro:")
-        self.logger.info(f"     • Registros originais: {original_count:,}")
-        self.logger.info(f"     • Removidos por Dotação = 0: {removidos_dotacao:,}")
-        self.logger.info(f"     • Removidos por Empenhado > 0: {removidos_empenhado:,}")
-        self.logger.info(f"     • Total removidos: {total_removidos:,}")
-        self.logger.info(f"     • Registros mantidos: {len(filtered_df):,}")
-        self.logger.info(f"     • Taxa de filtro: {(total_removidos/original_count)*100:.1f}%")
-        
-        if len(filtered_df) > 0:
-            # Calcular valor total disponível
-            valor_total = df_clean[mask_final][dotacao_col + '_numeric'].sum()
-            self.logger.info(f"     • Valor total disponível: R$ {valor_total:,.2f}")
-        
-        self.logger.info(f"✅ Filtro financeiro aplicado: {len(filtered_df):,} oportunidades válidas mantidas")
-        return filtered_df
+        self.logger.info(f"🔍 Aplicando filtros Innovatis em {original_count:,} registros (regras {self.filter_rules.signature})")
+        
+        # Valores monetários viram float aqui, na ingestão: filtros e consumidores leem números
+        df = self.parse_monetary_columns(df)
+        
+        mask, report = self.filter_rules.evaluate(
+            df, self._find_column, self.parse_monetary_series, rule_mask=self.engine.rule_mask
+        )
+        filtered_df = df[mask]
+        
+        for rule in report['rules']:
+            if not rule.get('skipped'):
+                self.logger.info(
+                    f"   → {rule['name']} ({rule['column']}): mantém {rule['kept']:,} "
+                    f"({rule['selectivity']:.1%}), remove {rule['removed']:,} além das regras anteriores"
+                )
+        
+        if original_count:
+            self.logger.info(f"✅ Filtros aplicados: {len(filtered_df):,} de {original_count:,} registros ({len(filtered_df)/original_count*100:.1f}%)")
+        return filtered_df, report
     
-    def _filter_natureza_despesa(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Filtro: código da natureza da despesa inicia em '33'"""
-        col_name = self._find_column(df, ['Natureza Despesa', 'natureza_despesa', 'natureza', 'cod_natureza'])
-        
-        if col_name:
-            self.logger.info(f"🔍 Aplicando filtro natureza despesa na coluna: '{col_name}'")
-            
-            # Filtrar códigos que iniciam com "33" (dados reais: "33410000", "33903001", etc.)
-            mask = df[col_name].astype(str).str.startswith('33', na=False)
-            filtered_df = df[mask]
-            
-            # Log dos tipos encontrados para debug
-            if len(filtered_df) > 0:
-                natureza_samples = filtered_df[col_name].value_counts().head(5)
-                self.logger.info(f"   → Exemplos de naturezas encontradas:")
-                for natureza, count in natureza_samples.items():
-                    self.logger.info(f"     • {natureza}: {count:,} registros")
-            
-            self.logger.info(f"   → Mantidos {len(filtered_df):,} de {len(df):,} registros com natureza '33xxx'")
-            return filtered_df
-        
-        self.logger.warning("⚠️ Coluna de natureza da despesa não encontrada")
-        return df
+    def reset_filter_stats(self):
+        """Zera a seletividade acumulada (início de uma nova ingestão)"""
+        self.filter_stats = {
+            "signature": self.filter_rules.signature,
+            "rows_in": 0,
+            "rows_out": 0,
+            "rules": {},
+        }
     
-    def _filter_modalidade(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Filtro: modalidade apenas 99, 90, 31, 41 ou 50"""
-        modalidades_permitidas = [99, 90, 31, 41, 50]
-        col_name = self._find_column(df, ['Modalidade', 'modalidade', 'cod_modalidade', 'mod'])
-        
-        if col_name:
-            self.logger.info(f"🔍 Aplicando filtro modalidade na coluna: '{col_name}'")
-            
-            # Extrair números do início das strings de modalidade (ex: "99 - A DEFINIR" -> 99)
-            df_copy = df.copy()
-            df_copy['modalidade_num'] = df_copy[col_name].astype(str).str.extract(r'^(\d+)').astype(float)
-            
-            # Filtrar pelas modalidades permitidas
-            filtered_df = df_copy[df_copy['modalidade_num'].isin(modalidades_permitidas)]
-            
-            self.logger.info(f"   → Mantidos {len(filtered_df)} de {len(df)} registros com modalidades {modalidades_permitidas}")
-            
-            # Remover coluna temporária e retornar
-            return filtered_df.drop('modalidade_num', axis=1)
-        
-        self.logger.warning("⚠️ Coluna de modalidade não encontrada")
-        return df
+    def merge_filter_report(self, report: Dict):
+        """Soma o relatório de um bloco/partição à seletividade da ingestão corrente"""
+        stats = self.filter_stats
+        stats["rows_in"] += report["rows_in"]
+        stats["rows_out"] += report["rows_out"]
+        for rule in report["rules"]:
+            entry = stats["rules"].setdefault(rule["name"], {
+                "column": rule["column"], "rows_in": 0, "kept": 0, "removed": 0, "wall_ms": 0.0, "cpu_ms": 0.0,
+            })
+            for key in ("rows_in", "kept", "removed", "wall_ms", "cpu_ms"):
+                entry[key] += rule.get(key, 0)
     
-    def _filter_resultado_primario(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Filtro: resultado primário RP6, RP7 ou RP8 (Emendas Individuais e similares)"""
-        col_name = self._find_column(df, ['RP', 'resultado_primario', 'rp', 'res_primario'])
-        
-        if col_name:
-            self.logger.info(f"🔍 Aplicando filtro RP na coluna: '{col_name}'")
-            
-            # Filtrar por códigos 6, 7 ou 8 (formato real do CSV: "6 - Emendas Individuais", etc.)
-            mask = (
-                df[col_name].astype(str).str.contains(r'^6\s*-', na=False, case=False, regex=True) |
-                df[col_name].astype(str).str.contains(r'^7\s*-', na=False, case=False, regex=True) |
-                df[col_name].astype(str).str.contains(r'^8\s*-', na=False, case=False, regex=True) |
-                df[col_name].astype(str).str.startswith('6', na=False) |
-                df[col_name].astype(str).str.startswith('7', na=False) |
-                df[col_name].astype(str).str.startswith('8', na=False)
-            )
-            
-            filtered_df = df[mask]
-            
-            # Log dos tipos encontrados para debug
-            if len(filtered_df) > 0:
-                rp_types = filtered_df[col_name].value_counts()
-                self.logger.info(f"   → Tipos de RP encontrados:")
-                for rp_type, count in rp_types.head(5).items():
-                    self.logger.info(f"     • {rp_type}: {count:,} registros")
-            
-            self.logger.info(f"   → Mantidos {len(filtered_df):,} de {len(df):,} registros com RP 6/7/8")
-            return filtered_df
-        
-        self.logger.warning("⚠️ Coluna de resultado primário não encontrada")
-        return df
+    def filter_report(self) -> Dict:
+        """Seletividade acumulada por regra na ingestão corrente"""
+        stats = self.filter_stats
+        rows_in = stats["rows_in"]
+        return {
+            "signature": stats["signature"],
+            "rows_in": rows_in,
+            "rows_out": stats["rows_out"],
+            "rules": [
+                {
+                    "name": name,
+                    **entry,
+                    "selectivity": round(entry["kept"] / rows_in, 4) if rows_in else None,
+                    "wall_ms": round(entry["wall_ms"], 3),
+                    "cpu_ms": round(entry["cpu_ms"], 3),
+                }
+                for name, entry in stats["rules"].items()
+            ],
+        }
     
     def _find_column(self, df: pd.DataFrame, possible_names: List[str]) -> str:
         """Encontra nome da coluna baseado em possíveis nomes"""
@@ -216,8 +177,32 @@ class ETLService:
         
         return ""
     
+    @staticmethod
+    def _aggregate_by(series: pd.Series, weights: Optional[np.ndarray] = None) -> Tuple[list, np.ndarray, Optional[np.ndarray]]:
+        """
+        Contagem (e soma dos pesos) por valor de uma dimensão, sobre os códigos do factorize
+        
+        Mesma semântica de groupby(observed=True).size()/sum(): chaves ordenadas,
+        nulos ignorados, só valores presentes.
+        """
+        codes, uniques = pd.factorize(series, sort=True)
+        present = codes >= 0
+        codes = codes[present]
+        counts = np.bincount(codes, minlength=len(uniques))
+        sums = None
+        if weights is not None:
+            # Soma compensada do groupby (mesmos totais de antes), sobre os códigos inteiros
+            sums = pd.Series(weights[present]).groupby(codes).sum().to_numpy()
+        return uniques.tolist(), counts, sums
+    
     def generate_summary(self, df: pd.DataFrame) -> Dict:
-        """Gera resumo das oportunidades encontradas"""
+        """
+        Gera resumo das oportunidades encontradas
+        
+        Todas as dimensões (ministério, modalidade, ano, UF, partido) são agregadas
+        na mesma passada sobre os códigos de cada coluna. Chamado uma vez por
+        geração do dataset (o resultado fica nos payloads da geração).
+        """
         if df.empty:
             return {
                 "total_opportunities": 0, 
@@ -225,13 +210,15 @@ class ETLService:
                 "summary": "Nenhuma oportunidade encontrada"
             }
         
-        # Encontrar colunas de valor, empenhado, órgão, modalidade, ano e UF
+        # Encontrar colunas de valor, órgão, modalidade, ano, UF e partido
         dotacao_col = self._find_column(df, ['Dotação Atual Emenda', 'dotacao_atual', 'dotacao'])
-        empenhado_col = self._find_column(df, ['Empenhado', 'empenhado', 'valor_empenhado'])
-        orgao_col = self._find_column(df, ['Órgão', 'orgao_orcamentario', 'ministerio', 'orgao'])
-        modalidade_col = self._find_column(df, ['Modalidade', 'modalidade', 'cod_modalidade'])
-        ano_col = self._find_column(df, ['Ano', 'ano', 'exercicio'])
-        uf_col = self._find_column(df, ['UF Autor', 'uf_autor', 'uf', 'estado'])
+        dimensions = {
+            "ministry": self._find_column(df, ['Órgão', 'orgao_orcamentario', 'ministerio', 'orgao']),
+            "modality": self._find_column(df, ['Modalidade', 'modalidade', 'cod_modalidade']),
+            "year": self._find_column(df, ['Ano', 'ano', 'exercicio']),
+            "uf": self._find_column(df, ['UF Autor', 'uf_autor', 'uf', 'estado']),
+            "partido": self._find_column(df, ['Partido', 'partido', 'sigla_partido']),
+        }
         
         summary = {
             "total_opportunities": len(df),
@@ -239,117 +226,64 @@ class ETLService:
             "average_value": 0,
         }
         
-        # NOVA LÓGICA: Valor Disponível = Soma da Dotação Atual dos dados filtrados
-        # Como o filtro financeiro já garantiu que Empenhado = 0 e Dotação > 0,
-        # o valor disponível é simplesmente a soma da Dotação Atual
-        df_clean = df.copy()
-        if dotacao_col and dotacao_col in df.columns:
+        # Valor Disponível = Soma da Dotação Atual dos dados filtrados
+        # (o filtro financeiro já garantiu Empenhado = 0 e Dotação > 0)
+        dotacao = None
+        if dotacao_col:
             try:
-                # Aplicar conversão na coluna de dotação
-                df_clean[dotacao_col + '_numeric'] = df_clean[dotacao_col].apply(self._clean_monetary_value)
-                
-                # NOVO CÁLCULO: Valor Disponível = Soma da Dotação Atual
-                # (Empenhado já é 0 devido ao filtro financeiro)
-                summary["total_value"] = float(df_clean[dotacao_col + '_numeric'].sum())
-                summary["average_value"] = float(df_clean[dotacao_col + '_numeric'].mean())
-                
-                # Log para debug
-                self.logger.info(f"   💰 Valores disponíveis calculados (Soma da Dotação Atual):")
-                self.logger.info(f"     Total Disponível: R$ {summary['total_value']:,.2f}")
-                self.logger.info(f"     Média Disponível: R$ {summary['average_value']:,.2f}")
-                self.logger.info(f"     ✅ Empenhado = 0 garantido pelo filtro financeiro")
-                
+                # Dotação já numérica na geração (no-op para colunas float)
+                dotacao = self.parse_monetary_series(df[dotacao_col]).to_numpy(dtype=float)
+                summary["total_value"] = float(dotacao.sum())
+                summary["average_value"] = float(dotacao.mean())
+                self.logger.info(f"   💰 Valor disponível (Soma da Dotação Atual): R$ {summary['total_value']:,.2f} "
+                                 f"(média R$ {summary['average_value']:,.2f})")
             except Exception as e:
                 self.logger.warning(f"⚠️ Erro ao calcular valores disponíveis: {e}")
+                dotacao = None
                 summary["total_value"] = 0
                 summary["average_value"] = 0
         else:
             self.logger.warning("⚠️ Coluna de dotação não encontrada - valor disponível será 0")
-            summary["total_value"] = 0
-            summary["average_value"] = 0
         
-        # Resumo por ministério (usando valores de dotação atual)
-        if orgao_col:
+        # Agregados de todas as dimensões (contagem; soma da dotação por ministério)
+        aggregates = {}
+        for name, column in dimensions.items():
+            if not column:
+                continue
             try:
-                # Usar valores de dotação atual (disponíveis)
-                if dotacao_col + '_numeric' in df_clean.columns:
-                    by_ministry_count = df_clean.groupby(orgao_col).size().to_dict()
-                    by_ministry_value = df_clean.groupby(orgao_col)[dotacao_col + '_numeric'].sum().to_dict()
-                else:
-                    by_ministry_count = df_clean.groupby(orgao_col).size().to_dict()
-                    by_ministry_value = {}
-                
-                summary["by_ministry"] = {
-                    "count": by_ministry_count,
-                    "value": by_ministry_value
-                }
+                aggregates[name] = self._aggregate_by(df[column], dotacao if name == "ministry" else None)
             except Exception as e:
-                self.logger.warning(f"⚠️ Erro ao calcular resumo por ministério: {e}")
-                summary["by_ministry"] = {"count": {}, "value": {}}
+                self.logger.warning(f"⚠️ Erro ao agregar resumo por {name} ({column}): {e}")
+                aggregates[name] = ([], np.zeros(0, dtype=np.int64), None)
+        
+        # Resumo por ministério (usando valores de dotação atual)
+        if "ministry" in aggregates:
+            keys, counts, sums = aggregates["ministry"]
+            summary["by_ministry"] = {
+                "count": dict(zip(keys, counts.tolist())),
+                "value": dict(zip(keys, sums.tolist())) if sums is not None else {},
+            }
         
         # Resumo por modalidade
-        if modalidade_col:
-            try:
-                by_modality = df_clean.groupby(modalidade_col).size().to_dict()
-                summary["by_modality"] = {str(k): v for k, v in by_modality.items()}
-            except Exception as e:
-                self.logger.warning(f"⚠️ Erro ao calcular resumo por modalidade: {e}")
-                summary["by_modality"] = {}
+        if "modality" in aggregates:
+            keys, counts, _ = aggregates["modality"]
+            summary["by_modality"] = {str(k): v for k, v in zip(keys, counts.tolist())}
         
-        # Resumo por ano
-        if ano_col:
-            try:
-                by_year = df_clean.groupby(ano_col).size().to_dict()
-                summary["years_covered"] = list(by_year.keys())
-            except Exception as e:
-                self.logger.warning(f"⚠️ Erro ao calcular anos cobertos: {e}")
-                summary["years_covered"] = [2025]  # Fallback
+        # Resumo por ano (sem coluna de ano, assume dados do ano atual)
+        if "year" in aggregates and aggregates["year"][0]:
+            summary["years_covered"] = [str(ano) for ano in aggregates["year"][0]]
         else:
-            # Se não encontrar coluna de ano, assumir dados do ano atual
             summary["years_covered"] = [2025]
-
-        # Resumo por UF
-        if uf_col:
-            try:
-                # Obter UFs únicas, removendo valores nulos
-                unique_ufs = df_clean[uf_col].dropna().unique().tolist()
-                # Ordenar alfabeticamente
-                unique_ufs.sort()
-                summary["unique_ufs"] = unique_ufs
-                
-                # Estatísticas por UF
-                by_uf = df_clean.groupby(uf_col).size().to_dict()
-                summary["by_uf"] = by_uf
-                
-            except Exception as e:
-                self.logger.warning(f"⚠️ Erro ao calcular resumo por UF: {e}")
-                summary["unique_ufs"] = []
-                summary["by_uf"] = {}
-        else:
-            summary["unique_ufs"] = []
-            summary["by_uf"] = {}
-
-        # Resumo por Partido
-        partido_col = self._find_column(df, ['Partido', 'partido', 'sigla_partido'])
-        if partido_col:
-            try:
-                # Obter partidos únicos, removendo valores nulos
-                unique_partidos = df_clean[partido_col].dropna().unique().tolist()
-                # Ordenar alfabeticamente
-                unique_partidos.sort()
-                summary["unique_partidos"] = unique_partidos
-                
-                # Estatísticas por Partido
-                by_partido = df_clean.groupby(partido_col).size().to_dict()
-                summary["by_partido"] = by_partido
-                
-            except Exception as e:
-                self.logger.warning(f"⚠️ Erro ao calcular resumo por Partido: {e}")
-                summary["unique_partidos"] = []
-                summary["by_partido"] = {}
-        else:
-            summary["unique_partidos"] = []
-            summary["by_partido"] = {}
+        
+        # Resumo por UF e por Partido: valores únicos em ordem alfabética + contagem
+        for name, unique_key, count_key in (("uf", "unique_ufs", "by_uf"), ("partido", "unique_partidos", "by_partido")):
+            if name in aggregates:
+                keys, counts, _ = aggregates[name]
+                summary[unique_key] = sorted(keys)
+                summary[count_key] = dict(zip(keys, counts.tolist()))
+            else:
+                summary[unique_key] = []
+                summary[count_key] = {}
         
         return summary
     
@@ -392,26 +326,20 @@ class ETLService:
         
         return {k: v for k, v in suggestions.items() if v}
 
-    def _clean_monetary_value(self, val) -> float:
-        """Limpa e converte um valor monetário (string ou numérico) para float."""
-        if pd.isna(val) or val is None or val == '':
-            return 0.0
-        
-        if isinstance(val, (int, float)):
-            return float(val)
-        
-        if isinstance(val, str):
-            try:
-                clean_val = str(val).strip()
-                # Lógica para formato brasileiro: "1.234,56" -> "1234.56"
-                clean_val = clean_val.replace('.', '').replace(',', '.')
-                
-                if not clean_val or clean_val.lower() in ['na', 'n/a', 'nan']:
-                    return 0.0
-                
-                return float(clean_val)
-            except (ValueError, TypeError):
-                self.logger.warning(f"⚠️ Não foi possível converter o valor monetário '{val}' para número.")
-                return 0.0
+    def parse_monetary_series(self, values: pd.Series) -> pd.Series:
+        """
+        Converte uma coluna monetária para float64 (vetorizado, na engine configurada)
         
-        return 0.0
\ No newline at end of file
+        Aceita "R$ 1.234,56", "1.234", "1234.56", negativos ("-1.234,56",
+        "(1.234,56)", "1.234,56-"), números já convertidos e vazios (→ 0.0).
+        """
+        return self.engine.parse_money(values)
+    
+    def parse_monetary_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Converte as colunas monetárias presentes para float64 (colunas já float são mantidas)"""
+        converted = {
+            col: self.parse_monetary_series(df[col])
+            for col in self.MONEY_COLUMNS
+            if col in df.columns and df[col].dtype != np.float64
+        }
+        return df.assign(**converted) if converted else df
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Excel Service - Leitura rápida de exportações SIOP em .xlsx/.xls
+================================================================
+
+Responsável por:
+- Escolher o leitor de planilhas mais rápido disponível
+  - calamine (python-calamine, em Rust): .xlsx e .xls
+  - openpyxl em modo read-only: .xlsx, linha a linha, sem carregar a planilha inteira
+  - pd.read_excel como último recurso
+- Entregar as linhas em blocos de DataFrame, com a mesma semântica de
+  pd.read_excel(skiprows=[1]): cabeçalho na 1ª linha, 2ª linha descartada
+"""
+
+import os
+from typing import Iterator, List
+import logging
+
+import pandas as pd
+
+# Leitores em requirements.txt; a detecção mantém ambientes mínimos funcionando
+# (sem eles, pd.read_excel, que para .xlsx também depende do openpyxl)
+try:
+    from python_calamine import CalamineWorkbook
+    CALAMINE_AVAILABLE = True
+except ImportError:
+    CALAMINE_AVAILABLE = False
+
+try:
+    import openpyxl
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class ExcelReader:
+    """Leitor de planilhas SIOP em blocos de linhas"""
+
+    ENGINES = ['calamine', 'openpyxl', 'pandas']
+    # Linhas descartadas após o cabeçalho (equivalente a skiprows=[1])
+    SKIP_ROWS = {1}
+    # Textos tratados como nulos (na_values padrão do pandas)
+    NA_STRINGS = frozenset([
+        '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+        '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+    ])
+
+    def __init__(self):
+        # auto | calamine | openpyxl | pandas
+        self.preferred_engine = os.getenv('SIOP_EXCEL_ENGINE', 'auto').lower()
+
+    def engine_for(self, filename: str) -> str:
+        """Leitor que será usado para o arquivo (pela extensão e bibliotecas instaladas)"""
+        is_xls = filename.lower().endswith('.xls')
+        available = {
+            'calamine': CALAMINE_AVAILABLE,
+            # openpyxl não lê o formato binário antigo (.xls)
+            'openpyxl': OPENPYXL_AVAILABLE and not is_xls,
+            'pandas': True,
+        }
+        if self.preferred_engine in available and available[self.preferred_engine]:
+            return self.preferred_engine
+        if self.preferred_engine not in ('auto', *self.ENGINES):
+            logger.warning(f"⚠️ SIOP_EXCEL_ENGINE inválido: {self.preferred_engine} - usando detecção automática")
+        return next(engine for engine in self.ENGINES if available[engine])
+
+    def iter_chunks(self, source, filename: str, chunksize: int) -> Iterator[pd.DataFrame]:
+        """
+        Lê a primeira aba em blocos de até `chunksize` linhas
+
+        Args:
+            source: Caminho ou arquivo binário com seek
+            filename: Nome do objeto (define o leitor pelo formato)
+            chunksize: Linhas por bloco
+
+        Yields:
+            DataFrames com as colunas do cabeçalho e valores nativos das células
+        """
+        engine = self.engine_for(filename)
+        logger.info(f"📗 Lendo planilha com engine '{engine}': {filename}")
+
+        if engine == 'pandas':
+            yield pd.read_excel(source, skiprows=sorted(self.SKIP_ROWS))
+            return
+
+        rows = self._iter_rows(source, engine)
+        header = self._make_header(next(rows, None) or [])
+        width = len(header)
+
+        block: List[tuple] = []
+        for position, row in enumerate(rows, start=1):
+            if position in self.SKIP_ROWS:
+                continue
+            # Linhas em branco são ignoradas (como no read_excel)
+            if all(value is None for value in row):
+                continue
+            values = tuple(self._convert_cell(value) for value in row[:width])
+            block.append(values + (None,) * (width - len(values)))
+            if len(block) >= chunksize:
+                yield pd.DataFrame(block, columns=header)
+                block = []
+        if block or width:
+            yield pd.DataFrame(block, columns=header)
+
+    def read(self, source, filename: str) -> pd.DataFrame:
+        """Lê a primeira aba inteira (mesmo resultado de pd.read_excel(skiprows=[1]))"""
+        return self.finalize(pd.concat(list(self.iter_chunks(source, filename, 100000)), ignore_index=True))
+
+    @staticmethod
+    def finalize(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Tipos finais por coluna, inferidos sobre o resultado concatenado (não por bloco)
+
+        Como o parser do read_excel, colunas de texto cujos valores são todos
+        numéricos (ex.: 'Nro. Emenda' gravado como texto) viram números.
+        """
+        df = df.infer_objects()
+        for col in df.columns[df.dtypes == object]:
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (ValueError, TypeError):
+                pass
+        return df
+
+    def _convert_cell(self, value):
+        """Valor da célula como o read_excel: float inteiro vira int, textos nulos viram None"""
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str) and value in self.NA_STRINGS:
+            return None
+        return value
+
+    def _iter_rows(self, source, engine: str) -> Iterator[list]:
+        if engine == 'calamine':
+            if isinstance(source, (str, os.PathLike)):
+                workbook = CalamineWorkbook.from_path(os.fspath(source))
+            else:
+                workbook = CalamineWorkbook.from_filelike(source)
+            sheet = workbook.get_sheet_by_index(0)
+            # calamine devolve '' para células vazias
+            for row in sheet.iter_rows():
+                yield [None if value == '' else value for value in row]
+            workbook.close()
+            return
+
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        try:
+            for row in workbook.worksheets[0].iter_rows(values_only=True):
+                yield list(row)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _make_header(row: list) -> List[str]:
+        """Nomes de colunas como o pandas: vazias viram 'Unnamed: N', repetidas ganham '.N'"""
+        while row and row[-1] is None:
+            row = row[:-1]
+        header: List[str] = []
+        seen = {}
+        for index, value in enumerate(row):
+            name = f"Unnamed: {index}" if value is None else str(value)
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            header.append(name)
+        return header
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Filter Service - Regras declarativas dos filtros Innovatis
+==========================================================
+
+Responsável por:
+- Carregar as regras de filtro de um arquivo JSON (filter_rules.json)
+- Recarregar as regras quando o arquivo muda (sem redeploy)
+- Compilar as regras numa única máscara booleana sobre o frame
+  (valores monetários já numéricos; códigos extraídos dos valores únicos)
+- Relatar a seletividade de cada regra
+- Assinar o conjunto de regras (hash) para invalidar caches pré-filtrados
+
+Tipos de regra:
+- minimo / maximo / igual: comparação numérica (colunas monetárias)
+- prefixo: texto inicia com um dos valores (ex.: natureza "33...")
+- codigo_em: código numérico no início do texto ("99 - A DEFINIR" → 99) está na lista
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Regras padrão (usadas se o arquivo de regras não existir)
+DEFAULT_RULES: Dict[str, Any] = {
+    "versao": "1.0.0",
+    "regras": [
+        {
+            "nome": "dotacao_minima",
+            "descricao": "Dotação Atual >= R$ 10.000 (valor mínimo para viabilidade)",
+            "tipo": "minimo",
+            "colunas": ["Dotação Atual Emenda", "dotacao_atual", "dotacao"],
+            "valor": 10000
+        },
+        {
+            "nome": "empenhado_zero",
+            "descricao": "Empenhado = 0 (emenda ainda não executada)",
+            "tipo": "igual",
+            "colunas": ["Empenhado", "empenhado", "valor_empenhado"],
+            "valor": 0
+        },
+        {
+            "nome": "natureza_despesa",
+            "descricao": "Natureza da despesa inicia em 33",
+            "tipo": "prefixo",
+            "colunas": ["Natureza Despesa", "natureza_despesa", "natureza", "cod_natureza"],
+            "valores": ["33"]
+        },
+        {
+            "nome": "modalidade",
+            "descricao": "Modalidades 99, 90, 31, 41 ou 50",
+            "tipo": "codigo_em",
+            "colunas": ["Modalidade", "modalidade", "cod_modalidade", "mod"],
+            "valores": [99, 90, 31, 41, 50]
+        },
+        {
+            "nome": "resultado_primario",
+            "descricao": "Resultado primário RP6, RP7 ou RP8",
+            "tipo": "codigo_em",
+            "colunas": ["RP", "resultado_primario", "rp", "res_primario"],
+            "valores": [6, 7, 8]
+        }
+    ]
+}
+
+RULE_TYPES = ('minimo', 'maximo', 'igual', 'prefixo', 'codigo_em')
+
+
+class FilterRuleSet:
+    """Conjunto de regras de filtro, recarregado quando o arquivo muda"""
+
+    def __init__(self, path: Optional[str] = None):
+        default_path = os.path.join(os.path.dirname(__file__), '..', 'filter_rules.json')
+        self.path = os.path.abspath(path or os.getenv('FILTER_RULES_PATH', default_path))
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._config: Dict[str, Any] = {}
+        self._signature = ""
+        # Assinatura das regras em disco ainda não aplicadas (por mtime)
+        self._pending: Tuple[Optional[float], str] = (None, "")
+        self.last_error: Optional[str] = None
+        self.refresh(force=True)
+
+    # ------------------------------------------------------------------ carga
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _read_config(self, mtime: Optional[float]) -> Dict[str, Any]:
+        if mtime is None:
+            return copy.deepcopy(DEFAULT_RULES)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        self.validate(config)
+        return config
+
+    @staticmethod
+    def validate(config: Dict[str, Any]):
+        """Valida a estrutura das regras (ValueError com a regra problemática)"""
+        rules = config.get('regras')
+        if not isinstance(rules, list):
+            raise ValueError("'regras' deve ser uma lista")
+        names = set()
+        for rule in rules:
+            name = rule.get('nome')
+            if not name or name in names:
+                raise ValueError(f"regra sem nome ou com nome repetido: {name!r}")
+            names.add(name)
+            if rule.get('tipo') not in RULE_TYPES:
+                raise ValueError(f"regra '{name}': tipo inválido {rule.get('tipo')!r} (use {', '.join(RULE_TYPES)})")
+            if not rule.get('colunas'):
+                raise ValueError(f"regra '{name}': 'colunas' vazio")
+            if rule['tipo'] in ('minimo', 'maximo', 'igual'):
+                float(rule['valor'])
+            elif not rule.get('valores'):
+                raise ValueError(f"regra '{name}': 'valores' vazio")
+
+    @staticmethod
+    def compute_signature(config: Dict[str, Any]) -> str:
+        """Hash das regras ativas (ignora descrições e campos informativos)"""
+        active = [
+            {k: rule.get(k) for k in ('nome', 'tipo', 'colunas', 'valor', 'valores')}
+            for rule in config.get('regras', []) if rule.get('ativo', True)
+        ]
+        canonical = json.dumps(active, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Aplica as regras do arquivo se ele mudou desde a última carga
+
+        Arquivo inválido mantém as regras atuais (erro em last_error).
+
+        Returns:
+            True se as regras ativas mudaram
+        """
+        mtime = self._file_mtime()
+        with self._lock:
+            if not force and mtime == self._mtime:
+                return False
+            try:
+                config = self._read_config(mtime)
+            except (OSError, ValueError) as e:
+                self.last_error = str(e)
+                logger.error(f"❌ Regras de filtro inválidas em {self.path}: {e} - mantendo regras atuais")
+                if not self._config:
+                    self._config = copy.deepcopy(DEFAULT_RULES)
+                    self._signature = self.compute_signature(self._config)
+                self._mtime = mtime
+                return False
+
+            signature = self.compute_signature(config)
+            changed = signature != self._signature
+            self._config, self._signature, self._mtime = config, signature, mtime
+            self.last_error = None
+
+        if changed:
+            origin = self.path if mtime is not None else "padrão (arquivo ausente)"
+            logger.info(f"📐 Regras de filtro carregadas: {origin} (assinatura {signature})")
+        return changed
+
+    @property
+    def signature(self) -> str:
+        """Assinatura das regras ativas"""
+        return self._signature
+
+    def pending_signature(self) -> str:
+        """
+        Assinatura das regras em disco, sem aplicá-las
+
+        Usado pelo poller de frescor: detectar a mudança não troca as regras
+        no meio de uma ingestão; a próxima construção chama refresh().
+        """
+        mtime = self._file_mtime()
+        if mtime == self._mtime:
+            return self._signature
+        if self._pending[0] == mtime and self._pending[1]:
+            return self._pending[1]
+        try:
+            signature = self.compute_signature(self._read_config(mtime))
+        except (OSError, ValueError):
+            return self._signature
+        self._pending = (mtime, signature)
+        return signature
+
+    @property
+    def rules(self) -> List[Dict[str, Any]]:
+        return [rule for rule in self._config.get('regras', []) if rule.get('ativo', True)]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "file_exists": self._mtime is not None,
+            "version": self._config.get('versao'),
+            "signature": self._signature,
+            "rules": self.rules,
+            "last_error": self.last_error,
+        }
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Cópia enviada aos processos do ETL paralelo: regras fixadas, sem o lock"""
+        state = self.__dict__.copy()
+        state.pop('_lock', None)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ avaliação
+
+    @staticmethod
+    def _by_unique_values(series: pd.Series, decide: Callable[[pd.Series], pd.Series]) -> np.ndarray:
+        """Avalia `decide` sobre os valores únicos (ou categorias) e espalha pelos códigos"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+        else:
+            codes, uniques = pd.factorize(series)
+        decided = decide(pd.Series(np.asarray(uniques, dtype=object))).to_numpy(dtype=bool)
+        # Código -1 (nulo) aponta para o False acrescentado ao final
+        return np.append(decided, False)[codes]
+
+    def _rule_mask(self, rule: Dict[str, Any], series: pd.Series,
+                   parse_money: Callable[[pd.Series], pd.Series]) -> np.ndarray:
+        kind = rule['tipo']
+        if kind in ('minimo', 'maximo', 'igual'):
+            values = parse_money(series).to_numpy()
+            threshold = float(rule['valor'])
+            if kind == 'minimo':
+                return values >= threshold
+            if kind == 'maximo':
+                return values <= threshold
+            return values == threshold
+
+        if kind == 'prefixo':
+            prefixes = tuple(str(v) for v in rule['valores'])
+            return self._by_unique_values(series, lambda u: u.astype(str).str.startswith(prefixes))
+
+        allowed = [float(v) for v in rule['valores']]
+        return self._by_unique_values(
+            series,
+            lambda u: pd.to_numeric(u.astype(str).str.extract(r'^\s*(\d+)', expand=False), errors='coerce').isin(allowed)
+        )
+
+    def evaluate(self, df: pd.DataFrame, find_column: Callable[[pd.DataFrame, List[str]], str],
+                 parse_money: Callable[[pd.Series], pd.Series],
+                 rule_mask: Optional[Callable[..., Optional[np.ndarray]]] = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """
+        Compila as regras numa única máscara
+
+        rule_mask(regra, coluna, parse_money) permite que a engine de dados avalie
+        a regra; se devolver None, vale a avaliação padrão (pandas).
+
+        Returns:
+            (máscara booleana, relatório com seletividade de cada regra)
+            - kept: linhas que a regra sozinha mantém
+            - removed: linhas removidas por ela, considerando as regras anteriores
+            - rows_in: linhas que chegam à regra (mantidas pelas anteriores)
+            - wall_ms / cpu_ms: tempo de avaliação da regra
+        """
+        total = len(df)
+        mask = np.ones(total, dtype=bool)
+        report_rules = []
+
+        for rule in self.rules:
+            column = find_column(df, rule['colunas'])
+            if not column:
+                logger.warning(f"⚠️ Regra '{rule['nome']}': coluna não encontrada ({rule['colunas'][0]}) - ignorada")
+                report_rules.append({"name": rule['nome'], "column": None, "skipped": True})
+                continue
+
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            rule_result = rule_mask(rule, df[column], parse_money) if rule_mask is not None else None
+            if rule_result is None:
+                rule_result = self._rule_mask(rule, df[column], parse_money)
+            rows_in = int(mask.sum())
+            kept = int(rule_result.sum())
+            removed = int((mask & ~rule_result).sum())
+            mask &= rule_result
+            report_rules.append({
+                "name": rule['nome'],
+                "column": column,
+                "rows_in": rows_in,
+                "kept": kept,
+                "removed": removed,
+                "selectivity": round(kept / total, 4) if total else None,
+                "wall_ms": (time.perf_counter() - wall_start) * 1000,
+                "cpu_ms": (time.process_time() - cpu_start) * 1000,
+            })
+
+        return mask, {
+            "signature": self._signature,
+            "rows_in": total,
+            "rows_out": int(mask.sum()),
+            "rules": report_rules,
+        }
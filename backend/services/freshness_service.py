@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Freshness Service - Detecção de novas versões SIOP em background
+================================================================
+
+Responsável por:
+- Consultar periodicamente a versão mais recente publicada no storage
+- Aplicar intervalo configurável com jitter e backoff exponencial em falhas
+- Sinalizar "nova versão disponível" para disparar a ingestão única
+  (também quando as regras de filtro mudam)
+
+Requisições nunca fazem round trip ao S3 para checar frescor: elas apenas leem
+o estado publicado por este poller.
+"""
+
+import asyncio
+import os
+import random
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FreshnessPoller:
+    """Poller assíncrono que detecta novas versões do arquivo SIOP"""
+
+    def __init__(
+        self,
+        check_latest: Callable[[], Optional[Dict]],
+        current_version: Callable[[], Optional[Dict]],
+        on_new_version: Callable[[Dict], None],
+        interval: Optional[float] = None,
+        jitter: Optional[float] = None,
+        max_backoff: Optional[float] = None,
+    ):
+        """
+        Args:
+            check_latest: Função (bloqueante) que retorna {'key', 'etag', ...} da versão mais recente
+                          (opcionalmente com 'filter_signature' das regras de filtro em disco)
+            current_version: Função que retorna {'key', 'etag', 'filter_signature'} da versão em memória (ou None)
+            on_new_version: Callback chamado no event loop quando há versão nova
+            interval: Intervalo base entre verificações, em segundos
+            jitter: Variação aleatória máxima (±) aplicada ao intervalo, em segundos
+            max_backoff: Teto do intervalo após falhas consecutivas, em segundos
+        """
+        self.check_latest = check_latest
+        self.current_version = current_version
+        self.on_new_version = on_new_version
+        self.interval = interval if interval is not None else float(os.getenv('FRESHNESS_POLL_INTERVAL_SECONDS', 300))
+        self.jitter = jitter if jitter is not None else float(os.getenv('FRESHNESS_POLL_JITTER_SECONDS', 30))
+        self.max_backoff = max_backoff if max_backoff is not None else float(os.getenv('FRESHNESS_POLL_MAX_BACKOFF_SECONDS', 1800))
+
+        self.latest_version: Optional[Dict] = None
+        self.new_version_available = False
+        self.last_check: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Inicia o loop de verificação no event loop corrente"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"⏱️ Poller de frescor iniciado (intervalo {self.interval:.0f}s ± {self.jitter:.0f}s)")
+
+    async def stop(self):
+        """Interrompe o loop de verificação"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def clear_signal(self):
+        """Reconhece o sinal de nova versão (após a ingestão publicar a geração)"""
+        self.new_version_available = False
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def next_delay(self, failures: Optional[int] = None) -> float:
+        """
+        Calcula a próxima espera: backoff exponencial em falhas + jitter
+
+        Args:
+            failures: Falhas consecutivas a considerar (padrão: as do próprio poller;
+                      o refresh disparado por requisições reusa o mesmo backoff)
+        """
+        failures = self.consecutive_failures if failures is None else failures
+        base = self.interval
+        if failures:
+            base = min(self.max_backoff, self.interval * (2 ** failures))
+        return max(1.0, base + random.uniform(-self.jitter, self.jitter))
+
+    async def check_now(self) -> bool:
+        """
+        Executa uma verificação imediata
+
+        Returns:
+            True se uma nova versão foi detectada
+        """
+        loop = asyncio.get_running_loop()
+        latest = await loop.run_in_executor(None, self.check_latest)
+        self.last_check = datetime.now(timezone.utc).isoformat()
+
+        if not latest:
+            return False
+
+        self.latest_version = latest
+        current = self.current_version()
+        if current is None:
+            # Nada carregado ainda: a primeira requisição fará a carga
+            return False
+
+        is_new = (
+            latest.get('key') != current.get('key')
+            or (latest.get('etag') and current.get('etag') and latest['etag'] != current['etag'])
+        )
+        # Regras de filtro alteradas exigem reprocessar a mesma versão do arquivo
+        rules_changed = bool(
+            latest.get('filter_signature') and current.get('filter_signature')
+            and latest['filter_signature'] != current['filter_signature']
+        )
+        if is_new:
+            logger.info(f"🆕 Nova versão SIOP disponível: {latest.get('key')} (etag {latest.get('etag')})")
+        elif rules_changed:
+            logger.info(f"📐 Regras de filtro alteradas ({current['filter_signature']} → {latest['filter_signature']})")
+            is_new = True
+        if is_new:
+            self.new_version_available = True
+            self.on_new_version(latest)
+        else:
+            self.new_version_available = False
+        return bool(is_new)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.next_delay())
+            try:
+                await self.check_now()
+                self.consecutive_failures = 0
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.consecutive_failures += 1
+                self.last_error = str(e)
+                logger.warning(f"⚠️ Falha ao verificar frescor ({self.consecutive_failures}x): {e}")
+
+    def status(self) -> Dict:
+        """Estado atual do poller (para health/debug)"""
+        return {
+            "running": self.is_running,
+            "interval_seconds": self.interval,
+            "jitter_seconds": self.jitter,
+            "last_check": self.last_check,
+            "latest_version": self.latest_version,
+            "new_version_available": self.new_version_available,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+        }
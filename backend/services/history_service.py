@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+History Service - Histórico de execução das emendas a partir dos snapshots SIOP
+===============================================================================
+
+Responsável por:
+- Ingerir cada exportação diária de siop-data/ uma única vez (catálogo por chave/ETag)
+- Guardar apenas o que mudou por emenda entre snapshots consecutivos
+  (valores de dotação/empenho/pagamento agregados por Codigo_Emenda)
+- Responder a série temporal de uma emenda sem reler os arquivos originais
+
+Formato em disco (HISTORY_STORE_DIR):
+    catalog.json                             snapshots ingeridos, em ordem
+    snapshot_date=YYYY-MM-DD/<stamp>.parquet mudanças daquele snapshot
+                                             (.pkl.gz quando pyarrow não está instalado)
+    state_<n>.parquet                        últimos valores de cada emenda após n snapshots
+
+Como cada partição só contém as emendas cujos valores mudaram, anos de snapshots
+diários ocupam uma fração do tamanho das exportações. Em memória ficam só o
+último estado (uma linha por emenda, usado para comparar o próximo snapshot) e,
+depois da primeira consulta, os ids das emendas alteradas em cada snapshot: a
+série de uma emenda lê apenas as partições em que ela mudou.
+
+Cada código entra com um único valor por snapshot: o mesmo vencedor da
+deduplicação da geração servida (maior Empenhado, depois maior Dotação Atual).
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+import logging
+
+import numpy as np
+import pandas as pd
+
+from services.engine_service import PandasEngine
+from services.etl_service import build_codigo_emenda
+
+# Parquet é opcional: sem pyarrow as partições são pickles comprimidos
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryStore:
+    """Armazena a evolução dos valores de cada emenda ao longo dos snapshots"""
+
+    KEY_COLUMN = 'Codigo_Emenda'
+    VALUE_COLUMNS = ['Dotação Inicial Emenda', 'Dotação Atual Emenda', 'Empenhado', 'Liquidado', 'Pago']
+
+    def __init__(
+        self,
+        value_parser: Callable[[pd.Series], pd.Series],
+        root: Optional[str] = None,
+        dedup_positions: Optional[Callable[[pd.Series, np.ndarray, np.ndarray], np.ndarray]] = None
+    ):
+        """
+        Args:
+            value_parser: Conversor vetorizado de coluna monetária (texto BRL → float)
+            root: Diretório do histórico (padrão: HISTORY_STORE_DIR ou .cache/history)
+            dedup_positions: Vencedor de cada código (engine de dados; padrão pandas)
+        """
+        default_root = os.path.join(os.path.dirname(__file__), '..', '.cache', 'history')
+        self.root = os.path.abspath(root or os.getenv('HISTORY_STORE_DIR', default_root))
+        self.enabled = os.getenv('HISTORY_ENABLED', 'true').lower() in ['true', '1', 'yes']
+        self.value_parser = value_parser
+        self.dedup_positions = dedup_positions or PandasEngine().dedup_positions
+        self.file_format = 'parquet' if PARQUET_AVAILABLE else 'pickle'
+
+        self._lock = threading.Lock()
+        self._catalog: Optional[Dict] = None
+        # Últimos valores de cada emenda (índice = código, NaN = ausente no último snapshot);
+        # a posição da emenda no frame é o seu id (códigos novos entram no fim)
+        self._state: Optional[pd.DataFrame] = None
+        # Por snapshot: ids (ordenados) das emendas alteradas, carregados na primeira consulta
+        self._changed_ids: Optional[List[np.ndarray]] = None
+
+    # ------------------------------------------------------------------ catálogo
+
+    def _catalog_path(self) -> str:
+        return os.path.join(self.root, 'catalog.json')
+
+    def catalog(self) -> Dict:
+        if self._catalog is None:
+            try:
+                with open(self._catalog_path(), 'r') as f:
+                    self._catalog = json.load(f)
+            except (OSError, ValueError):
+                self._catalog = {'snapshots': []}
+        return self._catalog
+
+    def _write_catalog(self, catalog: Dict):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.catalog_')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(catalog, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._catalog_path())
+        self._catalog = catalog
+
+    @staticmethod
+    def snapshot_time(file_info: Dict) -> str:
+        """Momento do snapshot: timestamp do nome (SIOP_..._YYYYMMDD_HHMMSS) ou LastModified"""
+        match = re.search(r'_(\d{8})_(\d{6})', file_info['key'])
+        if match:
+            stamp = datetime.strptime(''.join(match.groups()), '%Y%m%d%H%M%S')
+            return stamp.replace(tzinfo=timezone.utc).isoformat()
+        return file_info['last_modified']
+
+    # ------------------------------------------------------------------ ingestão
+
+    def project_chunk(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Reduz um bloco bruto da exportação a Codigo_Emenda + valores, um vencedor por código
+
+        Usado como row_filter na leitura em streaming: só os vencedores de cada
+        bloco ficam em memória (append_snapshot escolhe o vencedor entre blocos).
+        """
+        if 'Ano' not in chunk.columns or 'Nro. Emenda' not in chunk.columns:
+            return pd.DataFrame(columns=[self.KEY_COLUMN] + self.VALUE_COLUMNS)
+
+        # Mesmo código da geração servida (/api/history casa com /api/search);
+        # linhas com Ano inválido (ERRO-*) ficam fora do histórico
+        codes = build_codigo_emenda(chunk)
+        valid = ~codes.str.startswith('ERRO-')
+        codes = codes[valid]
+
+        projected = pd.DataFrame({self.KEY_COLUMN: codes})
+        for col in self.VALUE_COLUMNS:
+            if col in chunk.columns:
+                projected[col] = self.value_parser(chunk.loc[valid, col])
+            else:
+                projected[col] = 0.0
+        return self._winners(projected.reset_index(drop=True))
+
+    def _winners(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Uma linha por código, como na deduplicação da geração: maior Empenhado,
+        depois maior Dotação Atual, depois a primeira ocorrência
+
+        Como o critério é uma ordenação total com desempate pela posição, o vencedor
+        entre os vencedores de cada bloco (na ordem de leitura) é o vencedor global.
+        """
+        if frame.empty:
+            return frame
+        positions = self.dedup_positions(
+            frame[self.KEY_COLUMN],
+            frame['Empenhado'].to_numpy(dtype=np.float64),
+            frame['Dotação Atual Emenda'].to_numpy(dtype=np.float64),
+        )
+        return frame.iloc[np.sort(positions)].reset_index(drop=True)
+
+    def append_snapshot(self, file_info: Dict, frame: pd.DataFrame) -> Dict:
+        """
+        Acrescenta um snapshot (já projetado por `project_chunk`) ao histórico
+
+        Grava apenas as emendas novas, alteradas ou removidas desde o último snapshot.
+        Custo proporcional ao número de emendas do snapshot (não ao histórico).
+        """
+        with self._lock:
+            catalog = self.catalog()
+            ordinal = len(catalog['snapshots'])
+            snapshot_at = self.snapshot_time(file_info)
+
+            winners = self._winners(frame.reset_index(drop=True))
+            current = winners.set_index(self.KEY_COLUMN)[self.VALUE_COLUMNS].round(2)
+            previous = self._load_state()
+
+            common = current.index.intersection(previous.index)
+            differs = ~np.isclose(
+                current.loc[common].values, previous.loc[common].values, equal_nan=False
+            ).all(axis=1)
+            new_codes = current.index.difference(previous.index)
+            removed = previous.index.difference(current.index)
+            # Emendas já marcadas como ausentes não geram nova linha
+            removed = removed[previous.loc[removed, self.VALUE_COLUMNS[0]].notna().values]
+
+            changed = pd.concat([
+                current.loc[new_codes.append(common[differs])],
+                pd.DataFrame(np.nan, index=removed, columns=self.VALUE_COLUMNS),
+            ])
+            changed.index.name = self.KEY_COLUMN
+
+            # Novo estado: códigos novos no fim (ids existentes não mudam)
+            state = pd.concat([previous, current.loc[new_codes]])
+            state.loc[changed.index, self.VALUE_COLUMNS] = changed[self.VALUE_COLUMNS].values
+            state.index.name = self.KEY_COLUMN
+
+            changed = changed.reset_index()
+            changed['snapshot'] = np.int32(ordinal)
+
+            relative_path = self._write_partition(snapshot_at, file_info['key'], changed)
+            state_file = self._write_state(state, ordinal + 1)
+
+            entry = {
+                'key': file_info['key'],
+                'etag': file_info.get('etag'),
+                'snapshot_at': snapshot_at,
+                'file': relative_path,
+                'emendas': int(len(current)),
+                'changed': int(len(changed)),
+                'ingested_at': datetime.now(timezone.utc).isoformat(),
+            }
+            self._write_catalog({
+                **catalog,
+                'snapshots': catalog['snapshots'] + [entry],
+                'state': {'file': state_file, 'snapshots': ordinal + 1},
+            })
+            self._remove_state_file(catalog.get('state'))
+
+            self._state = state
+            if self._changed_ids is not None:
+                self._changed_ids.append(np.sort(state.index.get_indexer(changed[self.KEY_COLUMN])))
+
+        logger.info(
+            f"🗂️ Snapshot {snapshot_at[:10]} no histórico: {len(changed):,} mudanças "
+            f"({len(new_codes):,} novas, {int(differs.sum()):,} alteradas, {len(removed):,} ausentes)"
+        )
+        return entry
+
+    def _write_partition(self, snapshot_at: str, key: str, changed: pd.DataFrame) -> str:
+        partition = f"snapshot_date={snapshot_at[:10]}"
+        stem = os.path.splitext(os.path.basename(key))[0]
+        filename = f"{stem}.parquet" if self.file_format == 'parquet' else f"{stem}.pkl.gz"
+        relative_path = f"{partition}/{filename}"
+        self._write_frame(os.path.join(self.root, partition, filename), changed)
+        return relative_path
+
+    def _write_frame(self, path: str, frame: pd.DataFrame):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.file_format == 'parquet':
+            frame.to_parquet(path, index=False, compression='zstd')
+        else:
+            frame.to_pickle(path, compression='gzip')
+
+    def _read_partition(self, relative_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        path = os.path.join(self.root, relative_path)
+        if relative_path.endswith('.parquet'):
+            return pd.read_parquet(path, columns=columns)
+        frame = pd.read_pickle(path, compression='gzip')
+        return frame[columns] if columns else frame
+
+    def sync(self, files: List[Dict], read_frame: Callable[[str, Callable], pd.DataFrame]) -> Dict:
+        """
+        Ingere os snapshots ainda ausentes do catálogo, do mais antigo ao mais novo
+
+        Args:
+            files: Arquivos SIOP disponíveis ({'key', 'etag', 'last_modified'})
+            read_frame: Leitor (key, row_filter) → DataFrame projetado
+
+        Returns:
+            Resumo da sincronização
+        """
+        if not self.enabled:
+            return {'enabled': False}
+
+        catalog = self.catalog()
+        known = {entry['key'] for entry in catalog['snapshots']}
+        last_at = catalog['snapshots'][-1]['snapshot_at'] if catalog['snapshots'] else None
+
+        pending = sorted(
+            (f for f in files if f['key'] not in known),
+            key=self.snapshot_time,
+        )
+        ingested, skipped = 0, 0
+        for file_info in pending:
+            snapshot_at = self.snapshot_time(file_info)
+            if last_at and snapshot_at <= last_at:
+                # Mudanças são relativas ao snapshot anterior: não dá para inserir no meio
+                logger.warning(f"⚠️ Snapshot fora de ordem ignorado no histórico: {file_info['key']}")
+                skipped += 1
+                continue
+            try:
+                frame = read_frame(file_info['key'], self.project_chunk)
+                self.append_snapshot(file_info, frame)
+                last_at = snapshot_at
+                ingested += 1
+            except Exception as e:
+                logger.error(f"❌ Erro ao ingerir snapshot {file_info['key']} no histórico: {e}")
+                break
+
+        return {'ingested': ingested, 'skipped': skipped, 'pending': len(pending) - ingested - skipped}
+
+    # ------------------------------------------------------------------ estado
+
+    def _write_state(self, state: pd.DataFrame, snapshots: int) -> str:
+        """Grava o último estado; o catálogo passa a apontar para ele depois"""
+        extension = 'parquet' if self.file_format == 'parquet' else 'pkl.gz'
+        relative_path = f"state_{snapshots:06d}.{extension}"
+        self._write_frame(os.path.join(self.root, relative_path), state.reset_index())
+        return relative_path
+
+    def _remove_state_file(self, previous: Optional[Dict]):
+        if previous and previous.get('file'):
+            try:
+                os.remove(os.path.join(self.root, previous['file']))
+            except OSError:
+                pass
+
+    def _load_state(self) -> pd.DataFrame:
+        """Últimos valores de cada emenda (arquivo de estado; reconstruído das partições se ausente)"""
+        if self._state is not None:
+            return self._state
+
+        catalog = self.catalog()
+        snapshots = catalog['snapshots']
+        saved = catalog.get('state') or {}
+        if not snapshots:
+            state = pd.DataFrame(columns=self.VALUE_COLUMNS, dtype=float)
+        elif saved.get('snapshots') == len(snapshots):
+            state = self._read_partition(saved['file']).set_index(self.KEY_COLUMN)
+        else:
+            # Histórico sem arquivo de estado (formato anterior): uma passada pelas partições
+            logger.info(f"🗂️ Reconstruindo o estado do histórico a partir de {len(snapshots)} partições")
+            changes = pd.concat([self._read_partition(entry['file']) for entry in snapshots], ignore_index=True)
+            first_seen = changes.drop_duplicates(self.KEY_COLUMN)[self.KEY_COLUMN]
+            last = changes.drop_duplicates(self.KEY_COLUMN, keep='last').set_index(self.KEY_COLUMN)
+            state = last.loc[first_seen, self.VALUE_COLUMNS]
+        state.index = state.index.astype(str)
+        state.index.name = self.KEY_COLUMN
+        self._state = state
+        return state
+
+    def _load_changed_ids(self, state: pd.DataFrame) -> List[np.ndarray]:
+        """Ids alterados por snapshot (lê só a coluna de código de cada partição, uma vez)"""
+        if self._changed_ids is None:
+            self._changed_ids = [
+                np.sort(state.index.get_indexer(self._read_partition(entry['file'], [self.KEY_COLUMN])[self.KEY_COLUMN]))
+                for entry in self.catalog()['snapshots']
+            ]
+        return self._changed_ids
+
+    def memory_usage(self) -> Dict:
+        """Bytes em memória do histórico (último estado e índice de mudanças por snapshot)"""
+        state, changed_ids = self._state, self._changed_ids
+        state_bytes = int(state.memory_usage(index=True, deep=True).sum()) if state is not None else 0
+        index_bytes = int(sum(ids.nbytes for ids in changed_ids)) if changed_ids is not None else 0
+        return {
+            'loaded': state is not None,
+            'emendas': len(state) if state is not None else 0,
+            'change_index_loaded': changed_ids is not None,
+            'change_rows': int(sum(len(ids) for ids in changed_ids)) if changed_ids is not None else 0,
+            'bytes': state_bytes + index_bytes,
+        }
+
+    # ------------------------------------------------------------------ consulta
+
+    def series(self, codigo_emenda: str) -> Optional[Dict]:
+        """
+        Série temporal de uma emenda (pontos de mudança)
+
+        Cada ponto vale até o próximo; um ponto com valores nulos indica que a
+        emenda não constava daquele snapshot. Lê apenas as partições dos
+        snapshots em que a emenda mudou (bloqueante: rodar fora do event loop).
+        """
+        with self._lock:
+            snapshots = self.catalog()['snapshots']
+            state = self._load_state()
+            if codigo_emenda not in state.index:
+                return None
+            code_id = state.index.get_loc(codigo_emenda)
+            ordinals = [
+                ordinal for ordinal, ids in enumerate(self._load_changed_ids(state))
+                if ids.size and ids[min(np.searchsorted(ids, code_id), ids.size - 1)] == code_id
+            ]
+
+        points = []
+        for ordinal in ordinals:
+            snapshot = snapshots[ordinal]
+            part = self._read_partition(snapshot['file'])
+            row = part[part[self.KEY_COLUMN] == codigo_emenda].iloc[0]
+            present = not pd.isna(row[self.VALUE_COLUMNS[0]])
+            points.append({
+                'snapshot_at': snapshot['snapshot_at'],
+                'source_key': snapshot['key'],
+                'present': present,
+                **{col: (float(row[col]) if present else None) for col in self.VALUE_COLUMNS},
+            })
+
+        return {
+            'codigo_emenda': codigo_emenda,
+            'encoding': 'change_points',
+            'snapshots_total': len(snapshots),
+            'first_snapshot': snapshots[0]['snapshot_at'] if snapshots else None,
+            'last_snapshot': snapshots[-1]['snapshot_at'] if snapshots else None,
+            'points': points,
+        }
+
+    def status(self) -> Dict:
+        """Resumo do histórico (para status/debug)"""
+        snapshots = self.catalog()['snapshots']
+        size = 0
+        for entry in snapshots:
+            try:
+                size += os.path.getsize(os.path.join(self.root, entry['file']))
+            except OSError:
+                pass
+        return {
+            'enabled': self.enabled,
+            'format': self.file_format,
+            'snapshots': len(snapshots),
+            'first_snapshot': snapshots[0]['snapshot_at'] if snapshots else None,
+            'last_snapshot': snapshots[-1]['snapshot_at'] if snapshots else None,
+            'change_rows': int(sum(entry['changed'] for entry in snapshots)),
+            'disk_bytes': size,
+        }
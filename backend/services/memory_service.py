@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Memory Service - Contabilidade de memória e caches
+==================================================
+
+Responsável por:
+- Medir a memória do processo (RSS), com psutil quando disponível
+- Estimar o tamanho profundo de estruturas Python (listas de registros JSON, dicts)
+- Medir o tamanho em disco de diretórios de cache
+"""
+
+import os
+import sys
+from typing import Any, Dict, List
+import logging
+
+import pandas as pd
+
+# psutil é opcional: sem ele, /proc/self/status (Linux) ou resource
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def process_memory() -> Dict[str, Any]:
+    """RSS atual e pico do processo, em bytes"""
+    if PSUTIL_AVAILABLE:
+        info = psutil.Process().memory_info()
+        return {'rss_bytes': info.rss, 'vms_bytes': info.vms, 'source': 'psutil'}
+
+    try:
+        values = {}
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:', 'VmSize:')):
+                    name, amount = line.split(':', 1)
+                    values[name] = int(amount.split()[0]) * 1024
+        return {
+            'rss_bytes': values.get('VmRSS'),
+            'peak_rss_bytes': values.get('VmHWM'),
+            'vms_bytes': values.get('VmSize'),
+            'source': '/proc/self/status',
+        }
+    except OSError:
+        pass
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss é KB no Linux e bytes no macOS
+        return {'peak_rss_bytes': peak if sys.platform == 'darwin' else peak * 1024, 'source': 'resource'}
+    except ImportError:
+        return {'source': 'indisponível'}
+
+
+def deep_sizeof(obj: Any, _seen: set = None) -> int:
+    """Tamanho profundo aproximado de dicts/listas/tuplas de escalares (e frames)"""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif isinstance(obj, (pd.DataFrame, pd.Series)):
+        size = int(obj.memory_usage(deep=True).sum()) if isinstance(obj, pd.DataFrame) else int(obj.memory_usage(deep=True))
+    elif hasattr(obj, 'estimated_size'):
+        # Estruturas colunares (ex.: índice de consulta Polars)
+        size = int(obj.estimated_size())
+    return size
+
+
+def records_sizeof(records: List[Dict], sample_size: int = 200) -> int:
+    """
+    Estima o tamanho de uma lista de registros (dicts) por amostragem
+
+    Medir todos os registros seria caro; a média de uma amostra espaçada
+    ao longo da lista é suficiente para planejamento de capacidade.
+    """
+    if not records:
+        return sys.getsizeof(records)
+    step = max(1, len(records) // sample_size)
+    sample = records[::step][:sample_size]
+    average = sum(deep_sizeof(record) for record in sample) / len(sample)
+    return int(sys.getsizeof(records) + average * len(records))
+
+
+def frame_columns_sizeof(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Bytes por coluna (memória profunda), do maior para o menor"""
+    usage = frame.memory_usage(deep=True, index=False)
+    columns = [
+        {'column': col, 'dtype': str(frame[col].dtype), 'bytes': int(usage[col])}
+        for col in frame.columns
+    ]
+    return sorted(columns, key=lambda c: c['bytes'], reverse=True)
+
+
+def directory_size(path: str) -> Dict[str, Any]:
+    """Quantidade de arquivos e bytes sob um diretório"""
+    files, total = 0, 0
+    if os.path.isdir(path):
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                    files += 1
+                except OSError:
+                    pass
+    return {'path': os.path.abspath(path), 'files': files, 'bytes': total}
+
+
+def hit_rate(hits: int, misses: int) -> float:
+    total = hits + misses
+    return round(hits / total, 4) if total else 0.0
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Parallel Service - ETL particionado em processos
+================================================
+
+Responsável por:
+- Manter o pool de processos do ETL paralelo (ETL_PARALLEL_WORKERS)
+- Rodar as etapas de CPU da ingestão por partição
+  - blocos do streaming: correção de encoding + filtros Innovatis (com conversão monetária)
+  - frames inteiros: partições por Ano (ou blocos de linhas quando há poucos anos)
+    para filtros, Codigo_Emenda e blob de busca
+- Devolver os resultados na ordem original das linhas (a deduplicação global
+  continua no processo principal, sobre o frame já juntado)
+
+Com 0/1 worker (padrão) tudo roda no próprio processo, como antes. As partições
+vão para os workers por pickle: colunas de texto (object) não são compartilháveis
+sem cópia, então cada etapa envia só as colunas que usa. O pool usa 'spawn'
+(seguro com as threads do servidor); as funções enviadas precisam ser
+importáveis nos workers (funções de módulo ou métodos de objetos serializáveis).
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import logging
+
+import numpy as np
+import pandas as pd
+
+from services.trace_service import PipelineTrace
+
+logger = logging.getLogger(__name__)
+
+Frame = Union[pd.DataFrame, pd.Series]
+
+
+def _configured_workers() -> int:
+    """ETL_PARALLEL_WORKERS: número de processos, 'auto' (núcleos da máquina) ou 0 (desligado)"""
+    value = os.getenv('ETL_PARALLEL_WORKERS', '0').strip().lower()
+    if value == 'auto':
+        return os.cpu_count() or 1
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        logger.warning(f"⚠️ ETL_PARALLEL_WORKERS inválido ({value}) - ETL paralelo desligado")
+        return 0
+
+
+def _timed(fn: Callable, *args) -> Tuple[Any, float, float]:
+    """fn(*args) com tempo de parede e de CPU do worker, em ms"""
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    result = fn(*args)
+    return result, (time.perf_counter() - wall_start) * 1000, (time.process_time() - cpu_start) * 1000
+
+
+def _filter_partition(
+    part: pd.DataFrame,
+    task: Callable[[pd.DataFrame], Tuple[pd.DataFrame, Dict]],
+    prepare: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None
+) -> Tuple[pd.DataFrame, Dict, List[Tuple]]:
+    """
+    Executado no worker: prepare (correção de encoding) + filtro de uma partição
+
+    Returns:
+        (linhas mantidas, relatório das regras, medições (etapa, wall_ms, cpu_ms, rows_in, rows_out))
+    """
+    timings = []
+    rows = len(part)
+    if prepare is not None:
+        part, wall_ms, cpu_ms = _timed(prepare, part)
+        timings.append(('encoding_fix', wall_ms, cpu_ms, rows, len(part)))
+    (kept, report), wall_ms, cpu_ms = _timed(task, part)
+    timings.append(('filter', wall_ms, cpu_ms, len(part), len(kept)))
+    return kept, report, timings
+
+
+class PartitionExecutor:
+    """Pool de processos do ETL paralelo (criado na primeira partição enviada)"""
+
+    def __init__(self, workers: Optional[int] = None, min_rows: Optional[int] = None):
+        """
+        Args:
+            workers: Número de processos (padrão ETL_PARALLEL_WORKERS; 0/1 = no próprio processo)
+            min_rows: Frames menores que isso rodam no próprio processo (padrão ETL_PARALLEL_MIN_ROWS)
+        """
+        self.workers = workers if workers is not None else _configured_workers()
+        self.min_rows = min_rows if min_rows is not None else int(os.getenv('ETL_PARALLEL_MIN_ROWS', 50000))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 1
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                logger.info(f"⚙️ Pool do ETL paralelo iniciado ({self.workers} processos)")
+            return self._pool
+
+    def shutdown(self):
+        """Encerra o pool (recriado sob demanda na próxima ingestão)"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def map(self, fn: Callable[[Any], Any], items: Iterable[Any], max_in_flight: Optional[int] = None) -> Iterator[Any]:
+        """
+        fn(item) nos processos do pool, com resultados na ordem dos itens
+
+        No máximo max_in_flight itens (padrão 2 × workers) ficam em voo: no streaming
+        a leitura não se adianta ao processamento além disso (memória limitada).
+        """
+        if not self.enabled:
+            for item in items:
+                yield fn(item)
+            return
+
+        pool = self._get_pool()
+        limit = max_in_flight or 2 * self.workers
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(pool.submit(fn, item))
+                if len(pending) >= limit:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        except BrokenProcessPool:
+            logger.error("❌ Processo do ETL paralelo encerrado inesperadamente - pool será recriado")
+            self.shutdown()
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def partitions(self, df: pd.DataFrame, by: str = 'Ano') -> List[np.ndarray]:
+        """
+        Posições das linhas de cada partição
+
+        Uma partição por valor de `by` (nulos juntos); sem a coluna, ou com menos
+        valores distintos que workers, blocos contíguos de linhas.
+        """
+        if by in df.columns:
+            codes, uniques = pd.factorize(df[by])
+            if len(uniques) >= self.workers:
+                order = np.argsort(codes, kind='stable')
+                bounds = np.flatnonzero(np.diff(codes[order])) + 1
+                return np.split(order, bounds)
+        return [block for block in np.array_split(np.arange(len(df)), max(self.workers, 1)) if len(block)]
+
+    def map_frame(
+        self,
+        df: pd.DataFrame,
+        fn: Callable[[pd.DataFrame], Any],
+        by: str = 'Ano',
+        columns: Optional[List[str]] = None,
+        collect: Optional[Callable[[Any], None]] = None
+    ) -> Frame:
+        """
+        Aplica fn a cada partição de df e junta os resultados na ordem original
+
+        fn recebe a partição (só `columns`, se dado) e devolve um Series/DataFrame
+        com o índice da partição (pode remover linhas). Com `collect`, fn devolve
+        (resultado, extra) e collect recebe o extra de cada partição, na ordem.
+        Frames pequenos (ou pool desligado) rodam no próprio processo.
+        """
+        source = df if columns is None else df[columns]
+        if not self.enabled or len(df) < self.min_rows:
+            return self._collect(fn(source), collect)
+
+        # Rótulos posicionais: a junção volta à ordem original com sort_index
+        positional = source.set_axis(pd.RangeIndex(len(source)), axis=0)
+        parts = [positional.iloc[positions] for positions in self.partitions(df, by)]
+        results = [self._collect(result, collect) for result in self.map(fn, parts)]
+        merged = pd.concat(results).sort_index(kind='stable')
+        return merged.set_axis(df.index[merged.index.to_numpy()], axis=0)
+
+    @staticmethod
+    def _collect(result: Any, collect: Optional[Callable[[Any], None]]) -> Frame:
+        if collect is None:
+            return result
+        frame, extra = result
+        collect(extra)
+        return frame
+
+
+class PartitionedFilter:
+    """
+    row_filter da ingestão, particionável entre os processos do pool
+
+    `task(frame) -> (frame filtrado, relatório)` roda nos workers (precisa ser
+    serializável, ex.: ETLService.filter_partition) e `collect(relatório)` soma
+    cada relatório no processo principal. Chamado diretamente, filtra no
+    próprio processo (mesmo contrato de um row_filter comum).
+    """
+
+    def __init__(
+        self,
+        executor: PartitionExecutor,
+        task: Callable[[pd.DataFrame], Tuple[pd.DataFrame, Dict]],
+        collect: Callable[[Dict], None]
+    ):
+        self.executor = executor
+        self.task = task
+        self.collect = collect
+
+    @property
+    def enabled(self) -> bool:
+        return self.executor.enabled
+
+    def __call__(self, df: pd.DataFrame) -> pd.DataFrame:
+        kept, report = self.task(df)
+        self.collect(report)
+        return kept
+
+    def map_chunks(
+        self,
+        chunks: Iterable[pd.DataFrame],
+        prepare: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+        trace: Optional[PipelineTrace] = None
+    ) -> Iterator[Tuple[int, pd.DataFrame]]:
+        """
+        Blocos do streaming: prepare + filtro nos workers, na ordem de leitura
+
+        As etapas encoding_fix e filter entram no trace com o tempo medido nos
+        workers (CPU somada entre os processos).
+
+        Yields:
+            (linhas lidas no bloco, linhas mantidas)
+        """
+        trace = trace or PipelineTrace(enabled=False)
+        work = partial(_filter_partition, task=self.task, prepare=prepare)
+        for kept, report, timings in self.executor.map(work, chunks):
+            self.collect(report)
+            for name, wall_ms, cpu_ms, rows_in, rows_out in timings:
+                trace.add(name, wall_ms, cpu_ms, rows_in=rows_in, rows_out=rows_out)
+            yield report['rows_in'], kept
+
+    def apply_frame(self, df: pd.DataFrame, by: str = 'Ano') -> pd.DataFrame:
+        """Frame inteiro (cópia local sem pré-filtro): filtra por partição de `by`"""
+        return self.executor.map_frame(df, self.task, by=by, collect=self.collect)
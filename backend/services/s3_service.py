@@ -9,26 +9,107 @@ Responsável por:
 - Baixar dados mais recentes do S3
 - Verificar disponibilidade
 - Gerenciar metadados
+
+O acesso aos objetos passa por um StorageBackend (S3 ou diretório local).
 """
 
 import boto3
+from botocore.exceptions import ClientError
 import pandas as pd
+import hashlib
+import io
 import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from typing import Any, Callable, Iterator, Optional, Dict, List, Tuple
 import logging
 from dotenv import load_dotenv
 
+from services.excel_service import ExcelReader
+from services.memory_service import hit_rate
+from services.parallel_service import PartitionedFilter
+from services.storage_service import create_storage_backend
+from services.trace_service import PipelineTrace
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+
+class _PrefixedStream(io.RawIOBase):
+    """Stream somente-leitura: bytes já lidos (amostra) seguidos do restante do body S3"""
+    
+    def __init__(self, prefix: bytes, body):
+        self._prefix = prefix
+        self._body = body
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        data = self._body.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        return n
+
+
+class ObjectNotModified(Exception):
+    """GET condicional respondeu 304: o objeto não mudou desde o ETag informado"""
+
+
 class S3Service:
     """Serviço para interagir com dados no S3"""
     
+    # Prefixo onde o bot salva os arquivos (estrutura YYYY/MM/DD/)
+    DATA_PREFIX = "siop-data/"
+    # Manifesto publicado pelo bot com a versão mais recente
+    MANIFEST_KEY = "siop-data/latest.json"
+    
     def __init__(self):
-        self.s3_client = self._init_s3_client()
+        # Backend de armazenamento: S3 (padrão) ou diretório local (STORAGE_BACKEND=local)
+        self.storage_backend_type = os.getenv('STORAGE_BACKEND', 's3').lower()
+        self.s3_client = self._init_s3_client() if self.storage_backend_type != 'local' else None
         self.bucket_name = os.getenv('S3_BUCKET_NAME')
-        self.is_configured = self.s3_client is not None and self.bucket_name is not None
+        self.storage = create_storage_backend(self.s3_client, self.bucket_name)
+        self.is_configured = self.storage is not None
+        # Chave/ETag do último arquivo carregado (S3 ou cache local)
+        self.last_loaded_key: Optional[str] = None
+        self.last_loaded_etag: Optional[str] = None
+        # Quantos dias de partições consultar antes da listagem completa (sem manifesto)
+        self.listing_lookback_days = int(os.getenv('S3_LISTING_LOOKBACK_DAYS', 31))
+        
+        # Cache em memória (TTL curto) para manifesto, listagens e head_object
+        self.metadata_cache_ttl = float(os.getenv('S3_METADATA_CACHE_TTL_SECONDS', 60))
+        self._metadata_cache: Dict[str, Tuple[float, Any]] = {}
+        self._metadata_cache_lock = threading.Lock()
+        self._metadata_cache_hits = 0
+        self._metadata_cache_misses = 0
+        
+        # Último dialeto CSV detectado ({'encoding', 'sep'})
+        self.last_detected_dialect: Optional[Dict] = None
+        
+        # Ingestão em streaming: CSV/planilha lidos em blocos, filtros aplicados por bloco
+        self.streaming_enabled = os.getenv('SIOP_STREAMING_INGEST', 'true').lower() in ['true', '1', 'yes']
+        self.stream_chunksize = int(os.getenv('SIOP_STREAM_CHUNK_ROWS', 50000))
+        # Planilhas (.xlsx/.xls): calamine ou openpyxl read-only quando instalados
+        self.excel_reader = ExcelReader()
+        # True se o último DataFrame retornado já passou pelo row_filter
+        self.last_loaded_prefiltered = False
+        # True se o GET condicional confirmou que a versão em memória continua atual
+        self.last_not_modified = False
+        
+        # Download em partes (Range) paralelas para objetos grandes
+        self.ranged_download_enabled = os.getenv('S3_RANGED_DOWNLOAD', 'true').lower() in ['true', '1', 'yes']
+        self.download_part_size = int(float(os.getenv('S3_DOWNLOAD_PART_SIZE_MB', 8)) * 1024 * 1024)
+        self.download_concurrency = max(1, int(os.getenv('S3_DOWNLOAD_CONCURRENCY', 8)))
     
     def _init_s3_client(self):
         """Inicializa cliente S3"""
@@ -54,22 +135,45 @@ class S3Service:
         """Verifica se S3 está disponível"""
         return self.is_configured
     
-    def download_latest_csv(self, force_download: bool = False) -> Optional[pd.DataFrame]:
+    def download_latest_csv(
+        self,
+        force_download: bool = False,
+        row_filter: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+        loaded_version: Optional[Dict] = None,
+        filter_signature: Optional[str] = None,
+        trace: Optional[PipelineTrace] = None
+    ) -> Optional[pd.DataFrame]:
         """
         Baixa o arquivo SIOP mais recente do S3
         
+        Se existe cópia local com ETag, o GET é condicional (IfNoneMatch): um
+        objeto inalterado custa apenas um 304, inclusive com force_download.
+        
         Args:
-            force_download: Se True, força download mesmo se já existe cache
+            force_download: Se True, ignora o cache local sem ETag e a listagem em cache
+            row_filter: Filtro aplicado bloco a bloco na ingestão em streaming (CSV).
+                        Quando aplicado, `last_loaded_prefiltered` fica True.
+            loaded_version: {'key', 'etag', 'filter_signature'} da versão já carregada em
+                            memória. Se o 304 confirmar essa versão (com as mesmas regras),
+                            retorna None com `last_not_modified=True` (nada a reprocessar).
+            filter_signature: Assinatura das regras do row_filter. Cópia local pré-filtrada
+                              com outra assinatura é descartada (download e filtragem completos).
+            trace: Trace da ingestão (etapas download, parse, encoding_fix, filter, load_cache)
             
         Returns:
             DataFrame pandas com dados SIOP
         """
         logger.info(f"🔄 download_latest_csv chamado (force_download={force_download})")
+        trace = trace or PipelineTrace(enabled=False)
         
         if not self.is_configured:
             logger.error("❌ S3 não configurado - sistema requer dados reais")
             return None
         
+        if force_download:
+            # Refresh forçado sempre enxerga o estado atual do bucket
+            self.invalidate_metadata_cache()
+        
         try:
             logger.info("🔍 Iniciando busca pelo arquivo SIOP mais recente...")
             
@@ -80,40 +184,102 @@ class S3Service:
                 logger.error("❌ Nenhum arquivo SIOP encontrado no S3 - sistema requer dados reais")
                 return None
             
-            # Verificar cache local (evitar downloads desnecessários)
-            if not force_download and self._is_file_cached(latest_key):
+            self.last_loaded_prefiltered = False
+            self.last_not_modified = False
+            
+            # ETag da cópia local habilita o GET condicional
+            cache_metadata = self._read_cache_metadata(latest_key)
+            cache_file = os.path.join(self._get_cache_dir(), self._get_cache_filename(latest_key))
+            cached_etag = cache_metadata.get('s3_etag') if os.path.exists(cache_file) else None
+            
+            # Cópia pré-filtrada com outras regras de filtro não serve: baixa e filtra de novo
+            stale_filters = (
+                row_filter is not None
+                and bool(cache_metadata.get('prefiltered'))
+                and cache_metadata.get('filter_signature') != filter_signature
+            )
+            if stale_filters:
+                logger.info("📐 Regras de filtro mudaram desde a cópia local - ignorando cache pré-filtrado")
+                cached_etag = None
+            
+            # Cache local sem ETag (metadados antigos): comparação por LastModified
+            if not cached_etag and not force_download and not stale_filters and self._is_file_cached(latest_key):
                 logger.info("📋 Usando arquivo em cache local")
-                return self._load_cached_file(latest_key)
+                cache_metadata = self._read_cache_metadata(latest_key)
+                self.last_loaded_key = latest_key
+                self.last_loaded_etag = cache_metadata.get('s3_etag')
+                self.last_loaded_prefiltered = bool(cache_metadata.get('prefiltered'))
+                return self._load_cached_file(latest_key, trace)
             
-            if force_download:
+            if cached_etag:
+                logger.info(f"🏷️ GET condicional (IfNoneMatch={cached_etag})")
+            elif force_download:
                 logger.info("🚫 Cache ignorado devido ao force_download=True")
             
-            logger.info(f"⬇️ Baixando arquivo do S3: {latest_key}")
+            try:
+                # Ingestão em streaming (memória proporcional ao resultado filtrado)
+                if row_filter is not None and self.streaming_enabled and latest_key.lower().endswith(('.csv', '.xlsx', '.xls')):
+                    try:
+                        if latest_key.lower().endswith('.csv'):
+                            df = self._stream_filtered_csv(latest_key, row_filter, if_none_match=cached_etag,
+                                                           filter_signature=filter_signature, trace=trace)
+                        else:
+                            df = self._stream_filtered_excel(latest_key, row_filter, if_none_match=cached_etag,
+                                                             filter_signature=filter_signature, trace=trace)
+                        self.last_loaded_key = latest_key
+                        self.last_loaded_prefiltered = True
+                        return df
+                    except ObjectNotModified:
+                        raise
+                    except Exception as e:
+                        logger.warning(f"⚠️ Ingestão em streaming falhou ({e}) - usando download completo")
+                
+                logger.info(f"⬇️ Baixando arquivo do S3: {latest_key}")
+                
+                # Download para memória (em partes paralelas se o objeto for grande)
+                buffer = io.BytesIO()
+                with trace.stage('download'):
+                    s3_metadata = self._download_object(latest_key, buffer, if_none_match=cached_etag)
+                file_content = buffer.getvalue()
+            except ObjectNotModified:
+                return self._use_unchanged_copy(latest_key, cache_metadata, loaded_version, filter_signature, trace)
             
-            # Download para memória
-            obj = self.s3_client.get_object(Bucket=self.bucket_name, Key=latest_key)
-            file_content = obj['Body'].read()
+            # A resposta do GET já traz os metadados: evita head_object adicional
+            self._store_metadata_cache(f"head:{latest_key}", s3_metadata)
             
             logger.info(f"📥 Arquivo baixado: {len(file_content)} bytes")
             
             # Detectar tipo de arquivo e processar adequadamente
-            if latest_key.lower().endswith('.csv'):
-                # Usar estratégia robusta de detecção de encoding
-                df = self._parse_csv_with_encoding_detection(file_content)
-            elif latest_key.lower().endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(pd.io.common.BytesIO(file_content), skiprows=[1])
-            else:
-                # Fallback para CSV
-                try:
-                    df = pd.read_csv(pd.io.common.BytesIO(file_content), skiprows=[1])
-                except Exception as e:
-                    df = pd.read_csv(pd.io.common.BytesIO(file_content), sep=';', encoding='latin1', skiprows=[1])
+            with trace.stage('parse') as stage:
+                if latest_key.lower().endswith('.csv'):
+                    # Usar estratégia robusta de detecção de encoding (dialeto da fonte primeiro)
+                    self.last_detected_dialect = None
+                    df = self._parse_csv_with_encoding_detection(
+                        file_content, known_dialect=self._get_known_dialect(latest_key)
+                    )
+                    if self.last_detected_dialect:
+                        self._remember_dialect(latest_key, self.last_detected_dialect)
+                elif latest_key.lower().endswith(('.xlsx', '.xls')):
+                    df = self.excel_reader.read(io.BytesIO(file_content), latest_key)
+                else:
+                    # Fallback para CSV
+                    try:
+                        df = pd.read_csv(pd.io.common.BytesIO(file_content), skiprows=[1])
+                    except Exception as e:
+                        df = pd.read_csv(pd.io.common.BytesIO(file_content), sep=';', encoding='latin1', skiprows=[1])
+                stage['rows_out'] = len(df)
             
             # Salvar cache local
-            self._save_to_cache(latest_key, df)
+            with trace.stage('cache_write'):
+                self._save_to_cache(latest_key, df, s3_metadata)
             
             # --- Correção extra de encoding (strings "TransferÃªncia" etc.)
-            df = self._fix_encoding(df)
+            with trace.stage('encoding_fix', rows_in=len(df)) as stage:
+                df = self._fix_encoding(df)
+                stage['rows_out'] = len(df)
+            
+            self.last_loaded_key = latest_key
+            self.last_loaded_etag = s3_metadata.get('etag')
             
             logger.info(f"✅ Arquivo carregado com sucesso!")
             logger.info(f"   📁 Arquivo: {latest_key}")
@@ -135,113 +301,662 @@ class S3Service:
                     cache_key = latest_cache['metadata'].get('s3_key', '')
                     if cache_key:
                         logger.info(f"📋 Carregando do cache: {cache_key}")
-                        return self._load_cached_file(cache_key)
+                        self.last_loaded_key = cache_key
+                        self.last_loaded_etag = latest_cache['metadata'].get('s3_etag')
+                        return self._load_cached_file(cache_key, trace)
             except Exception as cache_error:
                 logger.warning(f"⚠️ Erro ao carregar cache: {cache_error}")
             
             logger.error("❌ Nenhum dado disponível (S3 e cache falharam)")
             return None
     
-    def _find_latest_file(self) -> Optional[str]:
+    def _use_unchanged_copy(
+        self,
+        s3_key: str,
+        cache_metadata: Dict,
+        loaded_version: Optional[Dict],
+        filter_signature: Optional[str] = None,
+        trace: Optional[PipelineTrace] = None
+    ) -> Optional[pd.DataFrame]:
+        """Objeto inalterado (304): reaproveita a versão em memória ou a cópia local"""
+        self.last_loaded_key = s3_key
+        self.last_loaded_etag = cache_metadata.get('s3_etag')
+        self.last_loaded_prefiltered = bool(cache_metadata.get('prefiltered'))
+        
+        if (
+            loaded_version
+            and loaded_version.get('key') == s3_key
+            and loaded_version.get('etag') == self.last_loaded_etag
+            and loaded_version.get('filter_signature') == filter_signature
+        ):
+            logger.info("✅ 304 Not Modified: versão em memória já é a mais recente")
+            self.last_not_modified = True
+            return None
+        
+        logger.info("✅ 304 Not Modified: usando cópia local")
+        return self._load_cached_file(s3_key, trace)
+    
+    def _get_object(
+        self,
+        s3_key: str,
+        if_none_match: Optional[str] = None,
+        byte_range: Optional[Tuple[int, int]] = None,
+        if_match: Optional[str] = None
+    ) -> Dict:
+        """get_object no backend com condições opcionais; 304 vira ObjectNotModified"""
+        try:
+            return self.storage.get_object(
+                s3_key, byte_range=byte_range, if_match=if_match, if_none_match=if_none_match
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+                raise ObjectNotModified(s3_key) from e
+            raise
+    
+    def _stream_filtered_csv(
+        self,
+        s3_key: str,
+        row_filter: Callable[[pd.DataFrame], pd.DataFrame],
+        if_none_match: Optional[str] = None,
+        save_cache: bool = True,
+        filter_signature: Optional[str] = None,
+        trace: Optional[PipelineTrace] = None
+    ) -> pd.DataFrame:
         """
-        Encontra o arquivo SIOP mais recente no S3
-        Busca em siop-data/ com estrutura YYYY/MM/DD/
+        Lê o CSV direto do body S3 em blocos, aplicando correção de encoding e
+        o filtro a cada bloco; apenas as linhas que sobrevivem são acumuladas.
+        
+        O dialeto é detectado numa amostra inicial do stream (sem baixar o arquivo inteiro).
+        Com save_cache=False (leituras auxiliares, ex.: histórico) o cache local e o
+        estado do último carregamento não são alterados.
         """
+        logger.info(f"🌊 Ingestão em streaming: {s3_key} (blocos de {self.stream_chunksize:,} linhas)")
+        trace = trace or PipelineTrace(enabled=False)
+        
+        if self.ranged_download_enabled:
+            # Partes paralelas gravadas em arquivo temporário (disco, não memória)
+            body = tempfile.TemporaryFile(prefix='siop_', suffix='.csv')
+            try:
+                with trace.stage('download'):
+                    s3_metadata = self._download_object(s3_key, body, if_none_match=if_none_match)
+            except Exception:
+                body.close()
+                raise
+            body.seek(0)
+        else:
+            # Body lido sob demanda: o tempo de rede entra na etapa parse
+            with trace.stage('download'):
+                obj = self._get_object(s3_key, if_none_match=if_none_match)
+            s3_metadata = {
+                'size': obj.get('ContentLength'),
+                'last_modified': obj.get('LastModified'),
+                'etag': obj.get('ETag'),
+                'metadata': obj.get('Metadata', {})
+            }
+            body = obj['Body']
+        self._store_metadata_cache(f"head:{s3_key}", s3_metadata)
+        
+        head = body.read(self.DIALECT_SAMPLE_BYTES)
+        sample = self._head_sample(head) if len(head) == self.DIALECT_SAMPLE_BYTES else head
+        
+        candidates = []
+        known_dialect = self._get_known_dialect(s3_key)
+        if known_dialect and known_dialect.get('encoding') and known_dialect.get('sep'):
+            candidates.append((known_dialect['encoding'], known_dialect['sep']))
+        candidates.append(self._sniff_dialect(sample))
+        
+        dialect = next((c for c in candidates if self._dialect_parses(sample, *c)), None)
+        if dialect is None:
+            body.close()
+            raise ValueError("dialeto não validado na amostra inicial")
+        encoding, separator = dialect
+        logger.info(f"✅ Dialeto do stream: encoding={encoding}, separador='{separator}'")
+        
+        stream = io.BufferedReader(_PrefixedStream(head, body), buffer_size=1024 * 1024)
+        reader = pd.read_csv(
+            stream,
+            sep=separator,
+            encoding=encoding,
+            skiprows=[1],
+            dtype=str,
+            chunksize=self.stream_chunksize
+        )
+        
         try:
-            # Prefixo onde o bot salva os arquivos
-            prefix = "siop-data/"
-            
-            logger.info(f"🔍 Procurando arquivos em s3://{self.bucket_name}/{prefix}")
-            
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=prefix
-            )
-            
-            if 'Contents' not in response:
-                logger.warning(f"⚠️ Nenhum arquivo encontrado em {prefix}")
-                return None
+            df, raw_rows = self._filter_chunks(reader, row_filter, trace)
+        finally:
+            body.close()
+        
+        self._remember_dialect(s3_key, {'encoding': encoding, 'sep': separator})
+        if not save_cache:
+            logger.info(f"✅ Leitura em streaming concluída: {len(df):,} linhas de {raw_rows:,} registros")
+            return df
+        
+        self.last_detected_dialect = {'encoding': encoding, 'sep': separator}
+        self.last_loaded_etag = s3_metadata.get('etag')
+        
+        # Cache local guarda apenas o resultado filtrado
+        with trace.stage('cache_write'):
+            self._save_to_cache(s3_key, df, s3_metadata, extra_metadata={
+                'prefiltered': True,
+                'raw_records_count': raw_rows,
+                'filter_signature': filter_signature
+            })
+        
+        logger.info(f"✅ Streaming concluído: {len(df):,} de {raw_rows:,} registros mantidos")
+        return df
+    
+    def _filter_chunks(
+        self,
+        chunks,
+        row_filter: Callable[[pd.DataFrame], pd.DataFrame],
+        trace: Optional[PipelineTrace] = None
+    ) -> Tuple[pd.DataFrame, int]:
+        """
+        Corrige encoding e aplica `row_filter` bloco a bloco
+        
+        Com um PartitionedFilter e o ETL paralelo ligado, encoding e filtro de
+        cada bloco rodam nos processos do pool enquanto os próximos blocos são lidos.
+        
+        Etapas no trace (somadas entre os blocos): parse (leitura do bloco),
+        encoding_fix e filter.
+        
+        Returns:
+            (linhas mantidas concatenadas, total de linhas lidas)
+        """
+        trace = trace or PipelineTrace(enabled=False)
+        chunks = self._read_chunks(chunks, trace)
+        if isinstance(row_filter, PartitionedFilter) and row_filter.enabled:
+            results = row_filter.map_chunks(chunks, prepare=self._fix_encoding_if_needed, trace=trace)
+        else:
+            results = self._filter_each(chunks, row_filter, trace)
+        
+        raw_rows = 0
+        kept_parts = []
+        kept = None
+        for chunk_rows, kept in results:
+            raw_rows += chunk_rows
+            if len(kept) > 0:
+                kept_parts.append(kept)
+            logger.info(f"   🌊 Bloco processado: {len(kept):,} de {chunk_rows:,} linhas mantidas (total lido: {raw_rows:,})")
+        
+        with trace.stage('concat', rows_in=raw_rows) as stage:
+            if kept_parts:
+                df = pd.concat(kept_parts, ignore_index=True)
+            else:
+                df = kept.iloc[0:0] if kept is not None else pd.DataFrame()
+            stage['rows_out'] = len(df)
+        return df, raw_rows
+    
+    @staticmethod
+    def _read_chunks(chunks, trace: PipelineTrace) -> Iterator[pd.DataFrame]:
+        """Blocos do leitor, com a leitura de cada um medida na etapa parse"""
+        chunks = iter(chunks)
+        while True:
+            with trace.stage('parse') as stage:
+                chunk = next(chunks, None)
+                stage['rows_out'] = len(chunk) if chunk is not None else None
+            if chunk is None:
+                return
+            yield chunk
+    
+    def _filter_each(
+        self,
+        chunks: Iterator[pd.DataFrame],
+        row_filter: Callable[[pd.DataFrame], pd.DataFrame],
+        trace: PipelineTrace
+    ) -> Iterator[Tuple[int, pd.DataFrame]]:
+        """Encoding e filtro de cada bloco no próprio processo: (linhas lidas, linhas mantidas)"""
+        for chunk in chunks:
+            with trace.stage('encoding_fix', rows_in=len(chunk)) as stage:
+                chunk = self._fix_encoding_if_needed(chunk)
+                stage['rows_out'] = len(chunk)
+            with trace.stage('filter', rows_in=len(chunk)) as stage:
+                kept = row_filter(chunk)
+                stage['rows_out'] = len(kept)
+            yield len(chunk), kept
+    
+    def _stream_filtered_excel(
+        self,
+        s3_key: str,
+        row_filter: Callable[[pd.DataFrame], pd.DataFrame],
+        if_none_match: Optional[str] = None,
+        save_cache: bool = True,
+        filter_signature: Optional[str] = None,
+        trace: Optional[PipelineTrace] = None
+    ) -> pd.DataFrame:
+        """
+        Lê uma planilha SIOP em blocos de linhas com o leitor rápido disponível,
+        aplicando correção de encoding e o filtro a cada bloco.
+        
+        A planilha é baixada para um arquivo temporário (leitores de .xlsx precisam
+        de seek) e convertida uma única vez para o cache local: enquanto o ETag não
+        mudar, os próximos carregamentos não leem a planilha de novo.
+        """
+        logger.info(f"📗 Ingestão de planilha: {s3_key} (blocos de {self.stream_chunksize:,} linhas)")
+        trace = trace or PipelineTrace(enabled=False)
+        
+        with tempfile.TemporaryFile(prefix='siop_', suffix=os.path.splitext(s3_key)[1]) as body:
+            with trace.stage('download'):
+                s3_metadata = self._download_object(s3_key, body, if_none_match=if_none_match)
+            self._store_metadata_cache(f"head:{s3_key}", s3_metadata)
+            body.seek(0)
             
-            # Filtrar apenas arquivos SIOP (.csv, .xlsx, .xls)
-            siop_files = []
-            for obj in response['Contents']:
-                key = obj['Key']
-                if any(key.lower().endswith(ext) for ext in ['.csv', '.xlsx', '.xls']):
-                    # Verificar se segue padrão SIOP_
-                    filename = key.split('/')[-1]
-                    if filename.startswith('SIOP_'):
-                        siop_files.append(obj)
-                        logger.info(f"   📄 Encontrado: {key} (modificado em {obj['LastModified']})")
-            
-            if not siop_files:
-                logger.warning("⚠️ Nenhum arquivo SIOP válido encontrado")
-                return None
+            chunks = self.excel_reader.iter_chunks(body, s3_key, self.stream_chunksize)
+            df, raw_rows = self._filter_chunks(chunks, row_filter, trace)
+        with trace.stage('parse'):
+            df = self.excel_reader.finalize(df)
+        
+        if not save_cache:
+            logger.info(f"✅ Leitura da planilha concluída: {len(df):,} linhas de {raw_rows:,} registros")
+            return df
+        
+        self.last_loaded_etag = s3_metadata.get('etag')
+        with trace.stage('cache_write'):
+            self._save_to_cache(s3_key, df, s3_metadata, extra_metadata={
+                'prefiltered': True,
+                'raw_records_count': raw_rows,
+                'filter_signature': filter_signature,
+                'excel_engine': self.excel_reader.engine_for(s3_key)
+            })
+        
+        logger.info(f"✅ Planilha convertida: {len(df):,} de {raw_rows:,} registros mantidos")
+        return df
+    
+    def read_object_frame(self, s3_key: str, row_filter: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Lê um arquivo SIOP qualquer (não só o mais recente) aplicando `row_filter`
+        
+        Usado por leituras auxiliares (ex.: histórico de snapshots): não altera o
+        cache local nem o estado do último carregamento.
+        """
+        if s3_key.lower().endswith(('.xlsx', '.xls')):
+            return self._stream_filtered_excel(s3_key, row_filter, save_cache=False)
+        return self._stream_filtered_csv(s3_key, row_filter, save_cache=False)
+    
+    def _download_object(self, s3_key: str, target, if_none_match: Optional[str] = None) -> Dict:
+        """
+        Baixa um objeto S3 para `target` (arquivo ou buffer binário com seek)
+        
+        O primeiro GET pede apenas a primeira parte (Range) e descobre o tamanho
+        total pelo Content-Range. Se o objeto couber numa parte, termina aí; senão
+        as partes restantes são buscadas em paralelo, com IfMatch no ETag da
+        primeira resposta para garantir que todas vêm da mesma versão.
+        
+        Com `if_none_match`, o primeiro GET é condicional e levanta
+        ObjectNotModified (304) sem transferir o corpo.
+        
+        Returns:
+            Metadados do objeto ({'size', 'last_modified', 'etag', 'metadata'})
+        """
+        if not self.ranged_download_enabled:
+            obj = self._get_object(s3_key, if_none_match=if_none_match)
+            self._copy_body(obj['Body'], target)
+            return {
+                'size': obj.get('ContentLength'),
+                'last_modified': obj.get('LastModified'),
+                'etag': obj.get('ETag'),
+                'metadata': obj.get('Metadata', {})
+            }
+        
+        part_size = self.download_part_size
+        started = time.time()
+        try:
+            first = self._get_object(s3_key, if_none_match=if_none_match, byte_range=(0, part_size - 1))
+        except ClientError as e:
+            # Objeto vazio não aceita Range: baixar normalmente
+            if e.response.get('Error', {}).get('Code') != 'InvalidRange':
+                raise
+            first = self._get_object(s3_key, if_none_match=if_none_match)
+        
+        content_range = first.get('ContentRange') or ''
+        match = re.search(r'/(\d+)$', content_range)
+        total_size = int(match.group(1)) if match else first.get('ContentLength', 0)
+        etag = first.get('ETag')
+        s3_metadata = {
+            'size': total_size,
+            'last_modified': first.get('LastModified'),
+            'etag': etag,
+            'metadata': first.get('Metadata', {}),
+            'server_side_encryption': first.get('ServerSideEncryption'),
+            'sse_customer_algorithm': first.get('SSECustomerAlgorithm'),
+        }
+        
+        target.seek(0)
+        self._copy_body(first['Body'], target)
+        
+        ranges = [
+            (start, min(start + part_size, total_size) - 1)
+            for start in range(part_size, total_size, part_size)
+        ]
+        if ranges:
+            write_lock = threading.Lock()
             
-            # Ordenar por data de modificação (mais recente primeiro)
-            latest_file = sorted(
-                siop_files, 
-                key=lambda x: x['LastModified'], 
-                reverse=True
-            )[0]
+            def fetch_part(byte_range: Tuple[int, int]) -> int:
+                start, end = byte_range
+                part = self._get_object(s3_key, byte_range=(start, end), if_match=etag)
+                data = part['Body'].read()
+                if len(data) != end - start + 1:
+                    raise IOError(f"parte {start}-{end} incompleta ({len(data)} bytes)")
+                with write_lock:
+                    target.seek(start)
+                    target.write(data)
+                return len(data)
             
-            logger.info(f"✅ Arquivo mais recente: {latest_file['Key']}")
-            logger.info(f"�� Última modificação: {latest_file['LastModified']}")
+            workers = min(self.download_concurrency, len(ranges))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='s3-range') as executor:
+                list(executor.map(fetch_part, ranges))
             
-            return latest_file['Key']
+            logger.info(
+                f"⚡ Download em {len(ranges) + 1} partes ({workers} em paralelo): "
+                f"{total_size:,} bytes em {time.time() - started:.2f}s"
+            )
+        
+        target.seek(0, io.SEEK_END)
+        if target.tell() != total_size:
+            raise IOError(f"download incompleto: {target.tell():,} de {total_size:,} bytes")
+        self._verify_checksum(target, s3_metadata)
+        target.seek(0)
+        return s3_metadata
+    
+    def _copy_body(self, body, target, chunk_size: int = 1024 * 1024):
+        """Copia o body S3 para o destino em blocos"""
+        for chunk in iter(lambda: body.read(chunk_size), b''):
+            target.write(chunk)
+    
+    def _verify_checksum(self, target, s3_metadata: Dict):
+        """
+        Confere o conteúdo baixado: SHA-256 publicado pelo bot (metadado `sha256`)
+        ou MD5 do ETag. Levanta IOError em divergência.
+        
+        O ETag só é o MD5 do conteúdo em uploads de uma parte sem criptografia ou
+        com SSE-S3 (AES256); com SSE-KMS/SSE-C (ou multipart) confere-se apenas o tamanho.
+        """
+        expected_sha256 = (s3_metadata.get('metadata') or {}).get('sha256')
+        etag = (s3_metadata.get('etag') or '').strip('"')
+        etag_is_md5 = (
+            bool(etag) and '-' not in etag
+            and s3_metadata.get('server_side_encryption') in (None, 'AES256')
+            and not s3_metadata.get('sse_customer_algorithm')
+        )
+        
+        if expected_sha256:
+            algorithm, expected = 'sha256', expected_sha256.lower()
+        elif etag_is_md5:
+            algorithm, expected = 'md5', etag.lower()
+        else:
+            logger.info("ℹ️ Sem checksum disponível (multipart ou SSE-KMS/SSE-C, sem sha256) - conferido apenas o tamanho")
+            return
+        
+        digest = hashlib.new(algorithm)
+        target.seek(0)
+        for chunk in iter(lambda: target.read(1024 * 1024), b''):
+            digest.update(chunk)
+        if digest.hexdigest() != expected:
+            raise IOError(f"checksum {algorithm} divergente: {digest.hexdigest()} != {expected}")
+        logger.info(f"🔐 Checksum {algorithm} conferido")
+    
+    def _find_latest_file(self) -> Optional[str]:
+        """
+        Encontra o arquivo SIOP mais recente no S3
+        Lê o manifesto siop-data/latest.json; se ausente, busca em siop-data/
+        com estrutura YYYY/MM/DD/ (listagem paginada por partição de data)
+        """
+        try:
+            latest = self._discover_latest()
+            return latest['key'] if latest else None
             
         except Exception as e:
             logger.error(f"❌ Erro ao buscar arquivos no S3: {e}")
             return None
     
+    def _discover_latest(self) -> Optional[Dict]:
+        """
+        Descobre a versão mais recente (chave, ETag, tamanho, data)
+        
+        Exceções de acesso ao S3 são propagadas para o chamador.
+        """
+        manifest = self.read_manifest()
+        if manifest:
+            newer = self._newer_than_manifest(manifest)
+            if newer is None:
+                logger.info(f"🧾 Arquivo mais recente (manifesto): {manifest['key']}")
+                return {
+                    'key': manifest['key'],
+                    'etag': manifest.get('etag'),
+                    'size': manifest.get('size'),
+                    'last_modified': manifest.get('last_modified'),
+                    'discovered_by': 'manifest'
+                }
+            logger.warning(
+                f"⚠️ Manifesto desatualizado ({manifest['key']}) - "
+                f"partição recente tem {newer['Key']}"
+            )
+            return self._listing_entry(newer)
+        
+        logger.info(f"🔍 Manifesto ausente - procurando arquivos em {self.storage.describe()}/{self.DATA_PREFIX}")
+        
+        # Fallback 1: partições de data recentes (mais nova primeiro)
+        siop_files = []
+        for prefix in self._date_prefixes(self.listing_lookback_days):
+            siop_files = self._list_siop_objects(prefix)
+            if siop_files:
+                break
+        
+        # Fallback 2: listagem paginada completa do prefixo
+        if not siop_files:
+            siop_files = self._list_siop_objects(self.DATA_PREFIX)
+        
+        if not siop_files:
+            logger.warning("⚠️ Nenhum arquivo SIOP válido encontrado")
+            return None
+        
+        # Ordenar por data de modificação (mais recente primeiro)
+        latest_file = max(siop_files, key=lambda x: (x['LastModified'], x['Key']))
+        
+        logger.info(f"✅ Arquivo mais recente: {latest_file['Key']}")
+        logger.info(f"🕒 Última modificação: {latest_file['LastModified']}")
+        return self._listing_entry(latest_file)
+    
+    def _newer_than_manifest(self, manifest: Dict) -> Optional[Dict]:
+        """
+        Confere o manifesto contra a listagem da partição de data mais recente
+        
+        O bot grava o arquivo antes do manifesto; se a gravação do manifesto falhar
+        (ou ele for sobrescrito por um upload antigo), a partição de hoje já tem um
+        arquivo mais novo. Uma listagem de um único prefixo (em cache) detecta isso.
+        
+        Returns:
+            Objeto listado mais novo que o manifesto, ou None se o manifesto está em dia
+        """
+        recent = []
+        prefix = None
+        for prefix in self._date_prefixes(0):
+            recent = self._list_siop_objects(prefix)
+            if recent:
+                break
+        if not recent:
+            return None
+        
+        newest = max(recent, key=lambda x: (x['LastModified'], x['Key']))
+        if newest['Key'] == manifest['key']:
+            return None
+        if manifest['key'].startswith(prefix) and manifest['key'] not in {obj['Key'] for obj in recent}:
+            # Manifesto aponta para um arquivo que não existe mais na partição
+            return newest
+        try:
+            manifest_modified = datetime.fromisoformat(manifest['last_modified'])
+            return newest if newest['LastModified'] > manifest_modified else None
+        except (KeyError, TypeError, ValueError):
+            # Manifesto sem data comparável: nomes SIOP_..._YYYYMMDD_HHMMSS ordenam no tempo
+            return newest if os.path.basename(newest['Key']) > os.path.basename(manifest['key']) else None
+    
+    @staticmethod
+    def _listing_entry(latest_file: Dict) -> Dict:
+        return {
+            'key': latest_file['Key'],
+            'etag': latest_file.get('ETag'),
+            'size': latest_file.get('Size'),
+            'last_modified': latest_file['LastModified'].isoformat(),
+            'discovered_by': 'listing'
+        }
+    
+    def read_manifest(self) -> Optional[Dict]:
+        """
+        Lê o manifesto siop-data/latest.json publicado pelo bot de automação
+        
+        Returns:
+            Dicionário com key, etag, size, row_count e schema_hash, ou None se ausente/inválido
+        """
+        return self._cached_metadata("manifest", self._fetch_manifest)
+    
+    def _fetch_manifest(self) -> Optional[Dict]:
+        try:
+            obj = self.storage.get_object(self.MANIFEST_KEY)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                logger.debug("🧾 Manifesto latest.json não encontrado")
+                return None
+            raise
+        
+        try:
+            import json
+            manifest = json.loads(obj['Body'].read().decode('utf-8'))
+        except ValueError as e:
+            logger.warning(f"⚠️ Manifesto inválido: {e}")
+            return None
+        
+        if not isinstance(manifest, dict) or not manifest.get('key'):
+            logger.warning("⚠️ Manifesto sem chave de arquivo - ignorando")
+            return None
+        return manifest
+    
+    def _date_prefixes(self, days: int) -> List[str]:
+        """Prefixos siop-data/YYYY/MM/DD/ dos últimos `days` dias (mais recente primeiro)"""
+        # Começa em "amanhã" para tolerar diferença de fuso entre o bot e o backend
+        today = datetime.now()
+        return [
+            f"{self.DATA_PREFIX}{(today - timedelta(days=offset)).strftime('%Y/%m/%d')}/"
+            for offset in range(-1, days + 1)
+        ]
+    
+    def _list_siop_objects(self, prefix: str) -> List[Dict]:
+        """
+        Lista arquivos SIOP (.csv, .xlsx, .xls) sob um prefixo, seguindo a paginação
+        (list_objects_v2 retorna no máximo 1000 objetos por página)
+        """
+        return self._cached_metadata(f"list:{prefix}", lambda: self._fetch_siop_objects(prefix))
+    
+    def _fetch_siop_objects(self, prefix: str) -> List[Dict]:
+        siop_files = []
+        for obj in self.storage.list_objects(prefix):
+            key = obj['Key']
+            filename = key.split('/')[-1]
+            if filename.startswith('SIOP_') and key.lower().endswith(('.csv', '.xlsx', '.xls')):
+                siop_files.append(obj)
+        return siop_files
+    
     def get_file_metadata(self, s3_key: str) -> Dict:
         """Obtém metadados de um arquivo no S3"""
         if not self.is_configured:
             return {}
         
         try:
-            response = self.s3_client.head_object(
-                Bucket=self.bucket_name, 
-                Key=s3_key
-            )
-            
-            return {
-                'size': response['ContentLength'],
-                'last_modified': response['LastModified'],
-                'metadata': response.get('Metadata', {})
-            }
+            return self._cached_metadata(f"head:{s3_key}", lambda: self._fetch_file_metadata(s3_key))
         except Exception as e:
             logger.error(f"Erro ao obter metadados: {e}")
             return {}
     
+    def _fetch_file_metadata(self, s3_key: str) -> Dict:
+        response = self.storage.head_object(s3_key)
+        
+        return {
+            'size': response['ContentLength'],
+            'last_modified': response['LastModified'],
+            'etag': response.get('ETag'),
+            'metadata': response.get('Metadata', {})
+        }
+    
+    def _cached_metadata(self, cache_key: str, loader: Callable[[], Any]) -> Any:
+        """
+        Retorna o valor em cache (se dentro do TTL) ou carrega e armazena
+        
+        Exceções do loader não são cacheadas.
+        """
+        now = time.monotonic()
+        with self._metadata_cache_lock:
+            entry = self._metadata_cache.get(cache_key)
+            if entry is not None and entry[0] > now:
+                self._metadata_cache_hits += 1
+                return entry[1]
+            self._metadata_cache_misses += 1
+        
+        value = loader()
+        self._store_metadata_cache(cache_key, value)
+        return value
+    
+    def _store_metadata_cache(self, cache_key: str, value: Any):
+        with self._metadata_cache_lock:
+            self._metadata_cache[cache_key] = (time.monotonic() + self.metadata_cache_ttl, value)
+    
+    def invalidate_metadata_cache(self, prefix: Optional[str] = None):
+        """
+        Invalida o cache de metadados S3
+        
+        Args:
+            prefix: Se informado, remove apenas entradas cujo nome começa com ele
+                    (ex.: "manifest", "list:", "head:siop-data/...")
+        """
+        with self._metadata_cache_lock:
+            if prefix is None:
+                self._metadata_cache.clear()
+            else:
+                for cache_key in [k for k in self._metadata_cache if k.startswith(prefix)]:
+                    del self._metadata_cache[cache_key]
+    
+    def get_metadata_cache_stats(self) -> Dict:
+        """Tamanho e taxa de acerto do cache de metadados S3"""
+        with self._metadata_cache_lock:
+            return {
+                'entries': len(self._metadata_cache),
+                'ttl_seconds': self.metadata_cache_ttl,
+                'hits': self._metadata_cache_hits,
+                'misses': self._metadata_cache_misses,
+                'hit_rate': hit_rate(self._metadata_cache_hits, self._metadata_cache_misses)
+            }
+    
+    def get_latest_version(self) -> Optional[Dict]:
+        """
+        Identifica a versão mais recente do arquivo SIOP (chave + ETag)
+        
+        Usado pelo poller de frescor em background; exceções são propagadas
+        para que o poller aplique backoff.
+        """
+        if not self.is_configured:
+            return None
+        
+        # Sempre consulta o manifesto atual; o resultado fica em cache para a ingestão
+        self.invalidate_metadata_cache("manifest")
+        return self._discover_latest()
+    
     def list_recent_files(self, days: int = 7) -> List[Dict]:
-        """Lista arquivos recentes no S3"""
+        """Lista arquivos recentes no S3 (apenas as partições de data do período)"""
         if not self.is_configured:
             return []
         
         try:
-            prefix = "siop-data/"  # Prefixo correto onde os arquivos são salvos
-            
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=prefix
-            )
+            cutoff_date = datetime.now() - timedelta(days=days)
             
             files = []
-            if 'Contents' in response:
-                cutoff_date = datetime.now() - timedelta(days=days)
-                
-                for obj in response['Contents']:
-                    # Filtrar apenas arquivos SIOP válidos
-                    key = obj['Key']
-                    filename = key.split('/')[-1]
-                    if filename.startswith('SIOP_') and any(key.lower().endswith(ext) for ext in ['.csv', '.xlsx', '.xls']):
-                        if obj['LastModified'].replace(tzinfo=None) > cutoff_date:
-                            files.append({
-                                'key': obj['Key'],
-                                'filename': filename,
-                                'size': obj['Size'],
-                                'last_modified': obj['LastModified']
-                            })
+            for prefix in self._date_prefixes(days):
+                for obj in self._list_siop_objects(prefix):
+                    if obj['LastModified'].replace(tzinfo=None) > cutoff_date:
+                        files.append({
+                            'key': obj['Key'],
+                            'filename': obj['Key'].split('/')[-1],
+                            'size': obj['Size'],
+                            'last_modified': obj['LastModified']
+                        })
             
             return sorted(files, key=lambda x: x['last_modified'], reverse=True)
             
@@ -249,6 +964,23 @@ class S3Service:
             logger.error(f"Erro ao listar arquivos: {e}")
             return []
     
+    def list_all_siop_files(self) -> List[Dict]:
+        """Lista todos os arquivos SIOP do prefixo siop-data/ (paginado, mais recente primeiro)"""
+        if not self.is_configured:
+            return []
+        
+        files = [
+            {
+                'key': obj['Key'],
+                'filename': obj['Key'].split('/')[-1],
+                'last_modified': obj['LastModified'].isoformat(),
+                'size': obj['Size'],
+                'etag': obj.get('ETag')
+            }
+            for obj in self._list_siop_objects(self.DATA_PREFIX)
+        ]
+        return sorted(files, key=lambda x: x['last_modified'], reverse=True)
+    
     def _is_file_cached(self, s3_key: str) -> bool:
         """Verifica se arquivo já está em cache local"""
         try:
@@ -289,16 +1021,29 @@ class S3Service:
             logger.error(f"Erro ao verificar cache: {e}")
             return False
     
-    def _load_cached_file(self, s3_key: str) -> Optional[pd.DataFrame]:
+    def _read_cache_metadata(self, s3_key: str) -> Dict:
+        """Lê os metadados (.meta) do arquivo em cache, se existirem"""
+        try:
+            cache_file = os.path.join(self._get_cache_dir(), self._get_cache_filename(s3_key))
+            with open(f"{cache_file}.meta", 'r') as f:
+                import json
+                return json.load(f)
+        except Exception:
+            return {}
+    
+    def _load_cached_file(self, s3_key: str, trace: Optional[PipelineTrace] = None) -> Optional[pd.DataFrame]:
         """Carrega arquivo do cache local"""
+        trace = trace or PipelineTrace(enabled=False)
         try:
             cache_dir = self._get_cache_dir()
             cache_file = os.path.join(cache_dir, self._get_cache_filename(s3_key))
             
-            if cache_file.endswith('.csv'):
-                df = pd.read_csv(cache_file, sep=';', encoding='utf-8', low_memory=False)
-            else:
-                df = pd.read_pickle(cache_file)  # Formato pickle para preservar tipos
+            with trace.stage('load_cache') as stage:
+                if cache_file.endswith('.csv'):
+                    df = pd.read_csv(cache_file, sep=';', encoding='utf-8', low_memory=False)
+                else:
+                    df = pd.read_pickle(cache_file)  # Formato pickle para preservar tipos
+                stage['rows_out'] = len(df)
             
             logger.info(f"📋 Cache carregado: {len(df)} registros")
             return df
@@ -307,7 +1052,13 @@ class S3Service:
             logger.error(f"Erro ao carregar cache: {e}")
             return None
     
-    def _save_to_cache(self, s3_key: str, df: pd.DataFrame):
+    def _save_to_cache(
+        self,
+        s3_key: str,
+        df: pd.DataFrame,
+        s3_metadata: Optional[Dict] = None,
+        extra_metadata: Optional[Dict] = None
+    ):
         """Salva DataFrame no cache local"""
         try:
             cache_dir = self._get_cache_dir()
@@ -320,14 +1071,19 @@ class S3Service:
             df.to_pickle(cache_file)
             
             # Salvar metadados
-            s3_metadata = self.get_file_metadata(s3_key)
+            if s3_metadata is None:
+                s3_metadata = self.get_file_metadata(s3_key)
             cache_metadata = {
                 's3_key': s3_key,
                 's3_last_modified': s3_metadata.get('last_modified', '').isoformat() if s3_metadata.get('last_modified') else '',
+                's3_etag': s3_metadata.get('etag'),
                 'cache_created': datetime.now().isoformat(),
                 'records_count': len(df),
-                'columns_count': len(df.columns)
+                'columns_count': len(df.columns),
+                'csv_dialect': self.last_detected_dialect if s3_key.lower().endswith('.csv') else None,
+                'prefiltered': False
             }
+            cache_metadata.update(extra_metadata or {})
             
             import json
             with open(metadata_file, 'w') as f:
@@ -357,6 +1113,7 @@ class S3Service:
                 import shutil
                 shutil.rmtree(cache_dir)
                 logger.info("🧹 Cache limpo com sucesso")
+            self.invalidate_metadata_cache()
             
         except Exception as e:
             logger.error(f"Erro ao limpar cache: {e}")
@@ -402,80 +1159,73 @@ class S3Service:
             logger.error(f"Erro ao obter info do cache: {e}")
             return {'cache_enabled': False, 'error': str(e)}
 
-    def _parse_csv_with_encoding_detection(self, file_content: bytes) -> pd.DataFrame:
+    # Tamanho da amostra inicial usada para detectar encoding/separador
+    DIALECT_SAMPLE_BYTES = 256 * 1024
+    
+    # Combinações de fallback (em ordem de prioridade)
+    FALLBACK_DIALECTS = [
+        ('utf-8-sig', ';'),      # UTF-8 com BOM, separador ;
+        ('utf-8', ';'),          # UTF-8 sem BOM, separador ;
+        ('latin1', ';'),         # Latin1, separador ;
+        ('cp1252', ';'),         # Windows-1252, separador ;
+        ('iso-8859-1', ';'),     # ISO-8859-1, separador ;
+        ('utf-16', ';'),         # UTF-16, separador ;
+        ('utf-8-sig', ','),      # UTF-8 com BOM, separador ,
+        ('utf-8', ','),          # UTF-8 sem BOM, separador ,
+        ('latin1', ','),         # Latin1, separador ,
+        ('cp1252', ','),         # Windows-1252, separador ,
+        ('iso-8859-1', ','),     # ISO-8859-1, separador ,
+    ]
+    
+    def _parse_csv_with_encoding_detection(self, file_content: bytes, known_dialect: Optional[Dict] = None) -> pd.DataFrame:
         """
         Parse CSV com detecção robusta de encoding
         
+        O dialeto (encoding + separador) é detectado e validado apenas numa
+        amostra do início do arquivo; o arquivo completo é lido uma única vez.
+        O dialeto vencedor fica em `self.last_detected_dialect`.
+        
         Args:
             file_content: Conteúdo do arquivo em bytes
+            known_dialect: Dialeto já conhecido desta fonte ({'encoding', 'sep'}), tentado primeiro
             
         Returns:
             DataFrame pandas
         """
         logger.info("🔍 Iniciando detecção de encoding...")
         
-        # Lista de encodings para tentar (em ordem de prioridade)
-        encodings_to_try = [
-            ('utf-8-sig', ';'),      # UTF-8 com BOM, separador ;
-            ('utf-8', ';'),          # UTF-8 sem BOM, separador ;
-            ('latin1', ';'),         # Latin1, separador ;
-            ('cp1252', ';'),         # Windows-1252, separador ;
-            ('iso-8859-1', ';'),     # ISO-8859-1, separador ;
-            ('utf-16', ';'),         # UTF-16, separador ;
-            ('utf-8-sig', ','),      # UTF-8 com BOM, separador ,
-            ('utf-8', ','),          # UTF-8 sem BOM, separador ,
-            ('latin1', ','),         # Latin1, separador ,
-            ('cp1252', ','),         # Windows-1252, separador ,
-            ('iso-8859-1', ','),     # ISO-8859-1, separador ,
-        ]
+        sample = self._head_sample(file_content)
         
-        # Tentar detecção automática de encoding se disponível
-        try:
-            import chardet
-            detected = chardet.detect(file_content[:10000])  # Analisa primeiros 10KB
-            if detected and detected['encoding'] and detected['confidence'] > 0.7:
-                detected_encoding = detected['encoding']
-                logger.info(f"🔍 Encoding detectado: {detected_encoding} (confiança: {detected['confidence']:.2f})")
-                # Adicionar encoding detectado no início da lista
-                encodings_to_try.insert(0, (detected_encoding, ';'))
-                encodings_to_try.insert(1, (detected_encoding, ','))
-        except ImportError:
-            logger.warning("⚠️ chardet não disponível - usando lista padrão de encodings")
-        except Exception as e:
-            logger.warning(f"⚠️ Erro na detecção automática: {e}")
+        candidates = []
+        if known_dialect and known_dialect.get('encoding') and known_dialect.get('sep'):
+            logger.info(f"📋 Dialeto conhecido da fonte: encoding={known_dialect['encoding']}, separador='{known_dialect['sep']}'")
+            candidates.append((known_dialect['encoding'], known_dialect['sep']))
+        candidates.append(self._sniff_dialect(sample))
+        for candidate in self.FALLBACK_DIALECTS:
+            if candidate not in candidates:
+                candidates.append(candidate)
+        
+        # 1ª passada: valida cada candidato só na amostra; arquivo completo lido uma vez
+        for encoding, separator in candidates:
+            if not self._dialect_parses(sample, encoding, separator):
+                continue
+            try:
+                df = self._read_csv_dialect(file_content, encoding, separator)
+            except Exception as e:
+                logger.warning(f"⚠️ Amostra válida mas arquivo falhou com {encoding}/{separator}: {str(e)[:100]}...")
+                continue
+            if self._is_valid_frame(df):
+                return self._accept_dialect(df, encoding, separator)
         
-        # Tentar cada combinação de encoding + separador
-        for encoding, separator in encodings_to_try:
+        # 2ª passada (amostra não representativa, ex.: campo com quebra de linha cortado)
+        logger.warning("⚠️ Nenhum dialeto validado na amostra - tentando arquivo completo")
+        for encoding, separator in candidates:
             try:
                 logger.info(f"🔄 Tentando: encoding={encoding}, separador='{separator}'")
-                
-                # Criar buffer de bytes
-                buffer = pd.io.common.BytesIO(file_content)
-                
-                # Tentar ler CSV
-                df = pd.read_csv(
-                    buffer, 
-                    sep=separator, 
-                    encoding=encoding, 
-                    low_memory=False, 
-                    skiprows=[1],  # Pular primeira linha se for header duplicado
-                    dtype=str      # ← força leitura como string para manter formatação brasileira
-                )
-                
-                # Verificar se DataFrame é válido
-                if df is not None and len(df) > 0 and len(df.columns) > 5:
-                    logger.info(f"✅ Sucesso! encoding={encoding}, separador='{separator}'")
-                    logger.info(f"   📊 Registros: {len(df):,}")
-                    logger.info(f"   📋 Colunas: {len(df.columns)}")
-                    logger.info(f"   📋 Primeiras colunas: {list(df.columns[:5])}")
-                    
-                    # Aplicar correção de encoding adicional se necessário
-                    df = self._fix_encoding_if_needed(df)
-                    
-                    return df
-                else:
-                    logger.warning(f"⚠️ DataFrame inválido: {len(df) if df is not None else 0} registros")
-                    
+                df = self._read_csv_dialect(file_content, encoding, separator)
+                if self._is_valid_frame(df):
+                    return self._accept_dialect(df, encoding, separator)
+                logger.warning(f"⚠️ DataFrame inválido: {len(df) if df is not None else 0} registros")
             except Exception as e:
                 logger.warning(f"⚠️ Falha com {encoding}/{separator}: {str(e)[:100]}...")
                 continue
@@ -484,10 +1234,137 @@ class S3Service:
         logger.error("❌ Todas as tentativas de parsing falharam")
         raise Exception("Não foi possível decodificar o arquivo CSV com nenhum encoding disponível")
     
-    def _fix_encoding_if_needed(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _head_sample(self, file_content: bytes) -> bytes:
+        """Início do arquivo cortado na última quebra de linha completa"""
+        if len(file_content) <= self.DIALECT_SAMPLE_BYTES:
+            return file_content
+        sample = file_content[:self.DIALECT_SAMPLE_BYTES]
+        last_newline = sample.rfind(b'\n')
+        return sample[:last_newline + 1] if last_newline > 0 else sample
+    
+    def _sniff_dialect(self, sample: bytes) -> Tuple[str, str]:
+        """Detecta encoding (BOM → UTF-8 estrito → chardet → cp1252) e separador pelo cabeçalho"""
+        if sample.startswith(b'\xef\xbb\xbf'):
+            encoding = 'utf-8-sig'
+        elif sample.startswith((b'\xff\xfe', b'\xfe\xff')):
+            encoding = 'utf-16'
+        else:
+            try:
+                sample.decode('utf-8')
+                encoding = 'utf-8'
+            except UnicodeDecodeError:
+                encoding = 'cp1252'
+                try:
+                    import chardet
+                    detected = chardet.detect(sample[:10000])  # Analisa primeiros 10KB
+                    if detected and detected['encoding'] and detected['confidence'] > 0.7:
+                        encoding = detected['encoding']
+                        logger.info(f"🔍 Encoding detectado: {encoding} (confiança: {detected['confidence']:.2f})")
+                except ImportError:
+                    logger.debug("chardet não disponível - usando cp1252")
+                except Exception as e:
+                    logger.warning(f"⚠️ Erro na detecção automática: {e}")
+        
+        try:
+            header = sample.decode(encoding, errors='replace').splitlines()[0]
+        except IndexError:
+            header = ''
+        separator = max([';', ',', '\t'], key=header.count)
+        
+        logger.info(f"🔍 Dialeto detectado na amostra: encoding={encoding}, separador='{separator}'")
+        return encoding, separator
+    
+    def _dialect_parses(self, sample: bytes, encoding: str, separator: str) -> bool:
+        """Valida o dialeto apenas na amostra inicial"""
+        try:
+            return self._is_valid_frame(self._read_csv_dialect(sample, encoding, separator))
+        except Exception:
+            return False
+    
+    def _read_csv_dialect(self, content: bytes, encoding: str, separator: str) -> pd.DataFrame:
+        return pd.read_csv(
+            pd.io.common.BytesIO(content),
+            sep=separator,
+            encoding=encoding,
+            low_memory=False,
+            skiprows=[1],  # Pular primeira linha se for header duplicado
+            dtype=str      # ← força leitura como string para manter formatação brasileira
+        )
+    
+    def _is_valid_frame(self, df: Optional[pd.DataFrame]) -> bool:
+        return df is not None and len(df) > 0 and len(df.columns) > 5
+    
+    def _accept_dialect(self, df: pd.DataFrame, encoding: str, separator: str) -> pd.DataFrame:
+        logger.info(f"✅ Sucesso! encoding={encoding}, separador='{separator}'")
+        logger.info(f"   📊 Registros: {len(df):,}")
+        logger.info(f"   📋 Colunas: {len(df.columns)}")
+        logger.info(f"   📋 Primeiras colunas: {list(df.columns[:5])}")
+        
+        self.last_detected_dialect = {'encoding': encoding, 'sep': separator}
+        
+        # Aplicar correção de encoding adicional se necessário
+        return self._fix_encoding_if_needed(df)
+    
+    def _get_source_id(self, s3_key: str) -> str:
+        """Identificador da fonte: nome do arquivo sem data/hora (ex.: SIOP_emendas.csv)"""
+        import re
+        filename = s3_key.split('/')[-1]
+        return re.sub(r'_\d{8}_\d{6}', '', filename)
+    
+    def _get_dialects_file(self) -> str:
+        return os.path.join(self._get_cache_dir(), 'dialects.json')
+    
+    def _get_known_dialect(self, s3_key: str) -> Optional[Dict]:
+        """Dialeto CSV já detectado para a fonte deste arquivo (metadados do cache)"""
+        dialect = self._read_cache_metadata(s3_key).get('csv_dialect')
+        if dialect:
+            return dialect
+        try:
+            import json
+            with open(self._get_dialects_file(), 'r') as f:
+                return json.load(f).get(self._get_source_id(s3_key))
+        except Exception:
+            return None
+    
+    def _remember_dialect(self, s3_key: str, dialect: Dict):
+        """Persiste o dialeto vencedor por fonte no diretório de cache"""
+        try:
+            import json
+            os.makedirs(self._get_cache_dir(), exist_ok=True)
+            dialects_file = self._get_dialects_file()
+            dialects = {}
+            if os.path.exists(dialects_file):
+                with open(dialects_file, 'r') as f:
+                    dialects = json.load(f)
+            dialects[self._get_source_id(s3_key)] = dialect
+            with open(dialects_file, 'w') as f:
+                json.dump(dialects, f, indent=2)
+        except Exception as e:
+            logger.warning(f"⚠️ Não foi possível salvar dialeto CSV: {e}")
+    
+    # UTF-8 lido como latin1/cp1252: 'Ã¡', 'Ã§', 'Ã£', 'Ã\xa0', 'Âº'...
+    MOJIBAKE_PATTERN = re.compile('[ÂÃ][\x80-\xbf\u0152\u0153\u0160\u0161\u0178\u017d\u017e\u0192\u02c6\u02dc\u2013-\u2122]')
+    
+    @staticmethod
+    def _repair_mojibake(value: str) -> str:
+        """Desfaz UTF-8 lido como latin1/cp1252; se a conversão não for exata, mantém o valor"""
+        for encoding in ('latin1', 'cp1252'):
+            try:
+                return value.encode(encoding).decode('utf-8')
+            except UnicodeError:
+                continue
+        return value
+    
+    @classmethod
+    def _fix_encoding_if_needed(cls, df: pd.DataFrame) -> pd.DataFrame:
         """
         Corrige problemas de encoding em strings do DataFrame
         
+        A detecção é feita por coluna sobre os valores únicos (ou categorias), e só
+        os valores com mojibake são reconvertidos - o custo é proporcional aos
+        dados danificados, e texto correto nunca é reprocessado. Não depende da
+        instância: roda também nos processos do ETL paralelo.
+        
         Args:
             df: DataFrame para corrigir
             
@@ -495,32 +1372,43 @@ class S3Service:
             DataFrame com encoding corrigido
         """
         try:
-            # Verificar se há caracteres mal codificados (indicativo de problema de encoding)
-            problematic_chars = ['Ã¡', 'Ã©', 'Ã­', 'Ã³', 'Ãº', 'Ã¢', 'Ãª', 'Ã§', 'Ã ', 'Ã¤']
+            repaired_cells = 0
+            repaired_columns = []
             
-            needs_fix = False
             for column in df.columns:
-                if df[column].dtype == 'object':
-                    # Verificar se alguma string contém caracteres problemáticos
-                    sample_values = df[column].dropna().astype(str).head(10).tolist()
-                    for value in sample_values:
-                        if any(char in value for char in problematic_chars):
-                            needs_fix = True
-                            break
-                    if needs_fix:
-                        break
-            
-            if needs_fix:
-                logger.info("🔧 Aplicando correção de encoding adicional...")
-                for column in df.columns:
-                    if df[column].dtype == 'object':
-                        # Tentar decodificar latin1 -> utf8
-                        try:
-                            df[column] = df[column].astype(str).str.encode('latin1', errors='ignore').str.decode('utf-8', errors='ignore')
-                        except:
-                            pass  # Se falhar, manter valor original
-                            
-                logger.info("✅ Correção de encoding aplicada")
+                series = df[column]
+                is_categorical = isinstance(series.dtype, pd.CategoricalDtype)
+                if not (is_categorical or series.dtype == object or pd.api.types.is_string_dtype(series.dtype)):
+                    continue
+                
+                uniques = series.cat.categories if is_categorical else pd.unique(series.dropna())
+                mapping = {}
+                for value in uniques:
+                    if isinstance(value, str) and cls.MOJIBAKE_PATTERN.search(value):
+                        fixed = cls._repair_mojibake(value)
+                        if fixed != value:
+                            mapping[value] = fixed
+                if not mapping:
+                    continue
+                
+                affected = series.isin(list(mapping))
+                repaired_cells += int(affected.sum())
+                repaired_columns.append(column)
+                
+                if is_categorical:
+                    categories = [mapping.get(c, c) for c in series.cat.categories]
+                    if len(set(categories)) == len(categories):
+                        df[column] = series.cat.rename_categories(categories)
+                    else:
+                        # Valor corrigido já existia como categoria: recategoriza
+                        df[column] = series.astype(object).replace(mapping).astype('category')
+                else:
+                    series = series.copy()
+                    series[affected] = series[affected].map(mapping)
+                    df[column] = series
+            
+            if repaired_columns:
+                logger.info(f"🔧 Encoding corrigido: {repaired_cells:,} células em {len(repaired_columns)} colunas ({', '.join(map(str, repaired_columns))})")
             
             return df
             
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Schema Service - Tipos em memória do dataset processado
+=======================================================
+
+Responsável por:
+- Aplicar um schema explícito ao frame da geração (o CSV é lido com dtype=str)
+  - categóricas para colunas de baixa cardinalidade (Órgão, UO, Partido...)
+  - inteiros pequenos para Ano e colunas de código numérico (Nro. Emenda; GND,
+    Modalidade e RP quando a exportação traz só o código)
+  - float64 para valores monetários
+  - strings Arrow para texto livre (string[python] quando pyarrow não está instalado)
+- Devolver a representação original (object) para serialização JSON
+- Relatório de bytes por coluna antes/depois do schema
+"""
+
+from typing import Dict, Optional
+import logging
+
+import numpy as np
+import pandas as pd
+
+from services.memory_service import frame_columns_sizeof
+
+# pyarrow está em requirements.txt; sem ele (ambientes mínimos) o texto livre usa
+# string[python]: mesmo dtype e semântica de nulos, sem a economia de memória
+try:
+    import pyarrow  # noqa: F401
+    ARROW_STRINGS_AVAILABLE = True
+except ImportError:
+    ARROW_STRINGS_AVAILABLE = False
+TEXT_DTYPE = 'string[pyarrow]' if ARROW_STRINGS_AVAILABLE else 'string[python]'
+
+logger = logging.getLogger(__name__)
+
+
+class DatasetSchema:
+    """Schema de memória do dataset de oportunidades"""
+
+    CATEGORICAL_COLUMNS = ['Órgão', 'UO', 'Partido', 'UF Autor', 'RP', 'Modalidade', 'GND', 'Tipo Autor']
+    # Aplicadas antes das categóricas: GND/Modalidade/RP com rótulo ("3 - Outras...") não
+    # passam na ida e volta e seguem como categóricas
+    SMALL_INT_COLUMNS = {'Ano': 'Int16', 'Nro. Emenda': 'Int32', 'GND': 'Int8', 'Modalidade': 'Int8', 'RP': 'Int8'}
+    MONEY_COLUMNS = ['Dotação Inicial Emenda', 'Dotação Atual Emenda', 'Empenhado', 'Liquidado', 'Pago']
+
+    def apply(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Converte as colunas do frame para o schema de memória (in place)
+
+        Colunas ausentes são ignoradas; conversões que mudariam o conteúdo
+        (ex.: Ano não numérico) mantêm a coluna como estava.
+        """
+        for col, dtype in self.SMALL_INT_COLUMNS.items():
+            if col in frame.columns and frame[col].dtype == object:
+                converted = self._small_int(frame[col], dtype)
+                if converted is not None:
+                    frame[col] = converted
+                elif col not in self.CATEGORICAL_COLUMNS:
+                    logger.warning(f"⚠️ Coluna '{col}' mantida como texto (valores não inteiros)")
+
+        for col in self.CATEGORICAL_COLUMNS:
+            if col in frame.columns and frame[col].dtype == object:
+                frame[col] = frame[col].astype('category')
+
+        for col in self.MONEY_COLUMNS:
+            if col in frame.columns and frame[col].dtype != np.float64:
+                frame[col] = pd.to_numeric(frame[col], errors='coerce').astype(np.float64)
+
+        for col in frame.columns:
+            if frame[col].dtype == object:
+                frame[col] = frame[col].astype(TEXT_DTYPE)
+
+        return frame
+
+    @staticmethod
+    def _small_int(values: pd.Series, dtype: str) -> Optional[pd.Series]:
+        """Coluna convertida para o inteiro `dtype`, ou None se a conversão perderia conteúdo"""
+        parsed = pd.to_numeric(values, errors='coerce')
+        present = values.notna()
+        limits = np.iinfo(dtype.lower())
+        if parsed[present].isna().any() or not parsed[present].between(limits.min, limits.max).all():
+            return None
+        # Só converte se o texto original é exatamente o inteiro (ida e volta sem perda)
+        if (parsed[present] % 1 != 0).any():
+            return None
+        roundtrip = parsed[present].astype('Int64').astype(str) == values[present].astype(str)
+        return parsed.astype(dtype) if roundtrip.all() else None
+
+    def to_object_frame(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Cópia do frame com a representação original (object, nulos como NaN)
+
+        Mantém o JSON idêntico ao de antes do schema: Ano e os códigos voltam a
+        ser texto e pd.NA (strings, inteiros nulos) vira NaN.
+        """
+        frame = frame.copy()
+        for col in frame.columns:
+            dtype = frame[col].dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                frame[col] = frame[col].astype(object)
+            elif col in self.SMALL_INT_COLUMNS and pd.api.types.is_integer_dtype(dtype):
+                frame[col] = frame[col].astype(object).map(lambda v: np.nan if v is pd.NA else str(v))
+            elif isinstance(dtype, pd.StringDtype):
+                frame[col] = frame[col].astype(object).where(frame[col].notna(), np.nan)
+        return frame
+
+    @staticmethod
+    def memory_report(frame: pd.DataFrame) -> Dict:
+        """Bytes por coluna (memória profunda), do maior para o menor"""
+        columns = frame_columns_sizeof(frame)
+        return {
+            'rows': len(frame),
+            'total_bytes': sum(c['bytes'] for c in columns),
+            'index_bytes': int(frame.index.memory_usage(deep=True)),
+            'columns': columns,
+        }
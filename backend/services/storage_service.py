@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Storage Service - Backends de armazenamento de objetos
+======================================================
+
+Responsável por:
+- Definir a interface mínima usada pelo S3Service (list, head, get com Range, put)
+- Implementação S3 (boto3) e implementação em diretório local
+- Permitir rodar o caminho completo download → ETL sem credenciais AWS
+  (benchmarks, testes de carga, ambientes sem acesso à internet)
+
+As respostas seguem o formato do boto3 (Key, Size, ETag, LastModified, Body,
+ContentRange...) e os erros são ClientError com os mesmos códigos do S3
+('NoSuchKey', '404', '304', 'PreconditionFailed', 'InvalidRange'), para que o
+S3Service trate os dois backends da mesma forma.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+
+def _client_error(code: str, message: str, operation: str) -> ClientError:
+    """ClientError no mesmo formato das respostas do boto3"""
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+class StorageBackend:
+    """Interface de armazenamento de objetos usada pelo S3Service"""
+
+    def describe(self) -> str:
+        """Identificação legível do destino (para logs/status)"""
+        raise NotImplementedError
+
+    def list_objects(self, prefix: str) -> List[Dict]:
+        """Lista objetos sob o prefixo: [{'Key', 'Size', 'LastModified', 'ETag'}]"""
+        raise NotImplementedError
+
+    def head_object(self, key: str) -> Dict:
+        """Metadados do objeto: {'ContentLength', 'LastModified', 'ETag', 'Metadata'}"""
+        raise NotImplementedError
+
+    def get_object(
+        self,
+        key: str,
+        byte_range: Optional[Tuple[int, int]] = None,
+        if_match: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+    ) -> Dict:
+        """
+        Lê o objeto (ou o intervalo de bytes inclusivo `byte_range`)
+
+        Returns:
+            {'Body', 'ContentLength', 'ContentRange', 'LastModified', 'ETag', 'Metadata'}
+        """
+        raise NotImplementedError
+
+    def put_object(
+        self,
+        key: str,
+        body: bytes,
+        metadata: Optional[Dict[str, str]] = None,
+        content_type: Optional[str] = None,
+    ) -> Dict:
+        """Grava o objeto e retorna {'ETag'}"""
+        raise NotImplementedError
+
+
+class S3StorageBackend(StorageBackend):
+    """Backend S3 (boto3)"""
+
+    def __init__(self, client, bucket_name: str):
+        self.client = client
+        self.bucket_name = bucket_name
+
+    def describe(self) -> str:
+        return f"s3://{self.bucket_name}"
+
+    def list_objects(self, prefix: str) -> List[Dict]:
+        objects = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            objects.extend(page.get('Contents', []))
+        return objects
+
+    def head_object(self, key: str) -> Dict:
+        return self.client.head_object(Bucket=self.bucket_name, Key=key)
+
+    def get_object(self, key, byte_range=None, if_match=None, if_none_match=None) -> Dict:
+        kwargs = {}
+        if byte_range is not None:
+            kwargs['Range'] = f"bytes={byte_range[0]}-{byte_range[1]}"
+        if if_match:
+            kwargs['IfMatch'] = if_match
+        if if_none_match:
+            kwargs['IfNoneMatch'] = if_none_match
+        return self.client.get_object(Bucket=self.bucket_name, Key=key, **kwargs)
+
+    def put_object(self, key, body, metadata=None, content_type=None) -> Dict:
+        kwargs = {'Metadata': metadata or {}}
+        if content_type:
+            kwargs['ContentType'] = content_type
+        return self.client.put_object(Bucket=self.bucket_name, Key=key, Body=body, **kwargs)
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Backend em diretório local
+
+    Chaves são caminhos relativos à raiz (siop-data/YYYY/MM/DD/arquivo.csv).
+    O ETag é o MD5 do conteúdo (como num upload S3 simples), calculado uma vez
+    por (tamanho, mtime). Metadados do usuário ficam em `<arquivo>.metadata.json`.
+    """
+
+    METADATA_SUFFIX = ".metadata.json"
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._etag_cache: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self._etag_lock = threading.Lock()
+
+    def describe(self) -> str:
+        return f"file://{self.root}"
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, *key.split('/')))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            raise _client_error('InvalidKey', f"chave fora da raiz: {key}", 'GetObject')
+        return path
+
+    def _stat(self, key: str, operation: str) -> Tuple[str, os.stat_result]:
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            code = '404' if operation == 'HeadObject' else 'NoSuchKey'
+            raise _client_error(code, f"objeto não encontrado: {key}", operation)
+        if not os.path.isfile(path):
+            raise _client_error('NoSuchKey', f"objeto não encontrado: {key}", operation)
+        return path, stat
+
+    def _etag(self, path: str, stat: os.stat_result) -> str:
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._etag_lock:
+            cached = self._etag_cache.get(path)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+        digest = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        etag = f'"{digest.hexdigest()}"'
+
+        with self._etag_lock:
+            self._etag_cache[path] = (signature, etag)
+        return etag
+
+    def _user_metadata(self, path: str) -> Dict[str, str]:
+        try:
+            import json
+            with open(path + self.METADATA_SUFFIX, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _last_modified(stat: os.stat_result) -> datetime:
+        return datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc)
+
+    def list_objects(self, prefix: str) -> List[Dict]:
+        # Descer direto ao diretório do prefixo (ex.: siop-data/2025/07/20/)
+        directory = prefix.rsplit('/', 1)[0] if '/' in prefix else ''
+        start = self._path(directory) if directory else self.root
+        if not os.path.isdir(start):
+            return []
+
+        objects = []
+        for dirpath, _, filenames in os.walk(start):
+            for filename in filenames:
+                if filename.endswith(self.METADATA_SUFFIX):
+                    continue
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if not key.startswith(prefix):
+                    continue
+                stat = os.stat(path)
+                objects.append({
+                    'Key': key,
+                    'Size': stat.st_size,
+                    'LastModified': self._last_modified(stat),
+                    'ETag': self._etag(path, stat),
+                })
+        objects.sort(key=lambda obj: obj['Key'])
+        return objects
+
+    def head_object(self, key: str) -> Dict:
+        path, stat = self._stat(key, 'HeadObject')
+        return {
+            'ContentLength': stat.st_size,
+            'LastModified': self._last_modified(stat),
+            'ETag': self._etag(path, stat),
+            'Metadata': self._user_metadata(path),
+        }
+
+    def get_object(self, key, byte_range=None, if_match=None, if_none_match=None) -> Dict:
+        path, stat = self._stat(key, 'GetObject')
+        etag = self._etag(path, stat)
+
+        if if_match and if_match != etag:
+            raise _client_error('PreconditionFailed', f"ETag mudou: {key}", 'GetObject')
+        if if_none_match and if_none_match == etag:
+            raise _client_error('304', 'Not Modified', 'GetObject')
+
+        response = {
+            'LastModified': self._last_modified(stat),
+            'ETag': etag,
+            'Metadata': self._user_metadata(path),
+        }
+
+        if byte_range is None:
+            response['Body'] = open(path, 'rb')
+            response['ContentLength'] = stat.st_size
+            return response
+
+        start, end = byte_range
+        if start >= stat.st_size:
+            raise _client_error('InvalidRange', f"intervalo inválido: {start}-{end}", 'GetObject')
+        end = min(end, stat.st_size - 1)
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start + 1)
+        response['Body'] = io.BytesIO(data)
+        response['ContentLength'] = len(data)
+        response['ContentRange'] = f"bytes {start}-{end}/{stat.st_size}"
+        return response
+
+    def put_object(self, key, body, metadata=None, content_type=None) -> Dict:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Escrita atômica: leitores nunca veem um arquivo pela metade
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+        if metadata:
+            import json
+            with open(path + self.METADATA_SUFFIX, 'w') as f:
+                json.dump(metadata, f)
+        elif os.path.exists(path + self.METADATA_SUFFIX):
+            os.remove(path + self.METADATA_SUFFIX)
+
+        return {'ETag': self._etag(path, os.stat(path))}
+
+
+def create_storage_backend(s3_client=None, bucket_name: Optional[str] = None) -> Optional[StorageBackend]:
+    """
+    Cria o backend configurado por STORAGE_BACKEND ('s3' padrão, ou 'local')
+
+    Args:
+        s3_client: Cliente boto3 (obrigatório para o backend S3)
+        bucket_name: Bucket S3
+
+    Returns:
+        Backend pronto, ou None se o backend escolhido não está configurado
+    """
+    backend = os.getenv('STORAGE_BACKEND', 's3').lower()
+
+    if backend == 'local':
+        root = os.getenv('LOCAL_STORAGE_ROOT', './storage')
+        if not os.path.isdir(root):
+            logger.warning(f"⚠️ LOCAL_STORAGE_ROOT não existe: {root}")
+            return None
+        logger.info(f"📂 Storage local: {os.path.abspath(root)}")
+        return LocalStorageBackend(root)
+
+    if s3_client is None or not bucket_name:
+        return None
+    return S3StorageBackend(s3_client, bucket_name)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trace Service - Instrumentação das etapas da ingestão
+=====================================================
+
+Responsável por:
+- Medir cada etapa nomeada da ingestão (download, parse, correção de encoding,
+  filtros, deduplicação, tipagem, índices, codificação dos payloads)
+  - tempo de parede e de CPU do processo
+  - variação de memória (RSS) do processo
+  - linhas de entrada e de saída
+- Acumular etapas repetidas (ex.: blocos do streaming) numa única entrada
+- Entregar o trace estruturado que fica guardado em cada geração do dataset
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+import logging
+
+from services.memory_service import process_memory
+
+logger = logging.getLogger(__name__)
+
+
+def _rss_bytes() -> Optional[int]:
+    return process_memory().get('rss_bytes')
+
+
+class PipelineTrace:
+    """
+    Trace de uma ingestão: etapas na ordem em que aparecem pela primeira vez
+
+    Uso:
+        with trace.stage('dedup', rows_in=len(df)) as stage:
+            df = deduplicate(df)
+            stage['rows_out'] = len(df)
+
+    Com enabled=False as etapas não medem nada (chamadas auxiliares, ex.: histórico).
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self._started = time.perf_counter()
+        self._started_cpu = time.process_time()
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.finished_at: Optional[str] = None
+        self._total_wall_ms: Optional[float] = None
+        self._total_cpu_ms: Optional[float] = None
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Mede o bloco como etapa `name`; o chamador preenche stage['rows_out']"""
+        record: Dict[str, Any] = {'rows_in': rows_in, 'rows_out': None}
+        if not self.enabled:
+            yield record
+            return
+
+        rss_before = _rss_bytes()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            wall_ms = (time.perf_counter() - wall_start) * 1000
+            cpu_ms = (time.process_time() - cpu_start) * 1000
+            rss_after = _rss_bytes()
+            memory_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            self.add(name, wall_ms, cpu_ms, memory_delta, record['rows_in'], record['rows_out'])
+
+    def add(
+        self,
+        name: str,
+        wall_ms: Optional[float],
+        cpu_ms: Optional[float] = None,
+        memory_delta_bytes: Optional[int] = None,
+        rows_in: Optional[int] = None,
+        rows_out: Optional[int] = None,
+        calls: int = 1
+    ):
+        """Soma uma medição à etapa `name` (medições feitas fora de stage())"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._stages.setdefault(name, {
+                'name': name, 'calls': 0, 'wall_ms': None, 'cpu_ms': None,
+                'memory_delta_bytes': None, 'rows_in': None, 'rows_out': None,
+            })
+            entry['calls'] += calls
+            for key, value in (('wall_ms', wall_ms), ('cpu_ms', cpu_ms), ('memory_delta_bytes', memory_delta_bytes),
+                               ('rows_in', rows_in), ('rows_out', rows_out)):
+                if value is not None:
+                    entry[key] = (entry[key] or 0) + value
+
+    def finish(self):
+        """Fecha o trace (tempo total da ingestão)"""
+        self._total_wall_ms = (time.perf_counter() - self._started) * 1000
+        self._total_cpu_ms = (time.process_time() - self._started_cpu) * 1000
+        self.finished_at = datetime.now(timezone.utc).isoformat()
+
+    @property
+    def stages(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    **entry,
+                    'wall_ms': round(entry['wall_ms'], 3) if entry['wall_ms'] is not None else None,
+                    'cpu_ms': round(entry['cpu_ms'], 3) if entry['cpu_ms'] is not None else None,
+                }
+                for entry in self._stages.values()
+            ]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'total_wall_ms': round(self._total_wall_ms, 3) if self._total_wall_ms is not None else None,
+            'total_cpu_ms': round(self._total_cpu_ms, 3) if self._total_cpu_ms is not None else None,
+            'stages': self.stages,
+        }
+
+    def log_summary(self):
+        """Uma linha com o tempo de cada etapa principal"""
+        parts = [
+            f"{entry['name']} {entry['wall_ms']:.0f}ms"
+            for entry in self.stages
+            if entry['wall_ms'] is not None and '.' not in entry['name']
+        ]
+        total = f" (total {self._total_wall_ms:.0f}ms)" if self._total_wall_ms is not None else ""
+        logger.info(f"⏱️ Etapas da ingestão: {', '.join(parts)}{total}")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Configuração dos testes do backend
+==================================
+
+Os serviços usam imports absolutos (`from services.x import Y`), como quando o
+app roda de dentro de backend/: o diretório entra no sys.path aqui.
+
+Uso (de dentro de backend/):
+    python -m pytest -q tests
+"""
+
+import itertools
+import os
+import shutil
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Colunas de uma exportação SIOP (a 2ª linha do arquivo é um cabeçalho repetido, ignorado na leitura)
+SIOP_HEADER = [
+    "Ano", "RP", "Autor", "Tipo Autor", "Partido", "UF Autor", "Nro. Emenda", "Órgão", "UO", "Ação",
+    "Localizador", "GND", "Modalidade", "Natureza Despesa", "Dotação Inicial Emenda",
+    "Dotação Atual Emenda", "Empenhado", "Liquidado", "Pago",
+]
+
+# Nome único por exportação publicada (a cópia local é indexada pelo nome do arquivo)
+_EXPORT_SEQUENCE = itertools.count(1)
+
+
+def siop_row(**values) -> dict:
+    """Linha que passa nos filtros Innovatis padrão; `values` sobrescreve colunas"""
+    row = {
+        "Ano": "2025", "RP": "6 - Emendas Individuais", "Autor": "Dep. Alfa", "Tipo Autor": "Deputado",
+        "Partido": "PT", "UF Autor": "SP", "Nro. Emenda": "12340001",
+        "Órgão": "36000 - MINISTÉRIO DA SAÚDE", "UO": "36901 - FUNDO NACIONAL DE SAÚDE",
+        "Ação": "2E89 - Incremento temporário", "Localizador": "0001 - Nacional",
+        "GND": "3 - Outras Despesas Correntes", "Modalidade": "99 - A DEFINIR",
+        "Natureza Despesa": "33903001", "Dotação Inicial Emenda": "150.000,00",
+        "Dotação Atual Emenda": "150.000,00", "Empenhado": "0,00", "Liquidado": "0,00", "Pago": "0,00",
+    }
+    row.update(values)
+    return row
+
+
+def siop_csv(rows) -> bytes:
+    lines = [";".join(SIOP_HEADER), ";".join(["xx"] * len(SIOP_HEADER))]
+    lines += [";".join(row[col] for col in SIOP_HEADER) for row in rows]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+@pytest.fixture(scope="session")
+def app_main(tmp_path_factory):
+    """
+    Módulo main sobre storage local temporário (sem S3, poller nem histórico)
+
+    As variáveis de ambiente valem para o import do app (serviços criados na importação).
+    """
+    storage_root = tmp_path_factory.mktemp("storage")
+    cache_dir = tmp_path_factory.mktemp("s3_cache")
+    patch = pytest.MonkeyPatch()
+    patch.setenv("STORAGE_BACKEND", "local")
+    patch.setenv("LOCAL_STORAGE_ROOT", str(storage_root))
+    patch.setenv("FRESHNESS_POLL_ENABLED", "false")
+    patch.setenv("HISTORY_ENABLED", "false")
+    patch.setenv("ETL_PARALLEL_WORKERS", "0")
+    import main
+
+    patch.setattr(main.s3_service, "_get_cache_dir", lambda: str(cache_dir))
+    main.storage_root = str(storage_root)
+    yield main
+    patch.undo()
+
+
+@pytest.fixture
+def publish_export(app_main):
+    """Publica uma geração a partir de linhas SIOP: publish_export(rows) → DatasetGeneration"""
+    def publish(rows):
+        partition = os.path.join(app_main.storage_root, "siop-data", datetime.now().strftime("%Y/%m/%d"))
+        shutil.rmtree(os.path.join(app_main.storage_root, "siop-data"), ignore_errors=True)
+        os.makedirs(partition)
+        name = f"SIOP_emendas_{datetime.now().strftime('%Y%m%d')}_{next(_EXPORT_SEQUENCE):06d}.csv"
+        with open(os.path.join(partition, name), "wb") as f:
+            f.write(siop_csv(rows))
+        app_main.s3_service.invalidate_metadata_cache()
+        built = app_main._build_dataset(force_download=True, source="teste")
+        return app_main.dataset_store.publish(
+            built['frame'],
+            source="teste",
+            source_key=built['source_key'],
+            source_etag=built['source_etag'],
+            indexes=built['indexes'],
+            payloads=built['payloads'],
+        )
+
+    return publish
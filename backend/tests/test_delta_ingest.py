@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Ingestão em modo delta
+======================
+
+Uma exportação com poucas emendas alteradas reaproveita search_blob e
+full_records da geração anterior, com o mesmo resultado de uma reconstrução
+completa.
+"""
+
+import pandas as pd
+
+from conftest import siop_row
+
+
+def _rows(pago_primeira: str):
+    return [
+        siop_row(**{'Pago': pago_primeira}),
+        siop_row(**{'Nro. Emenda': "12340002", 'Autor': "Dep. Beta"}),
+        siop_row(**{'Nro. Emenda': "12340003", 'Autor': "Dep. Gama"}),
+    ]
+
+
+def test_delta_generation_matches_full_rebuild(app_main, publish_export, monkeypatch):
+    publish_export(_rows("0,00"))
+    delta_built = publish_export(_rows("10,00"))
+
+    assert delta_built.payloads['ingest_delta']['mode'] == 'delta'
+    assert delta_built.payloads['ingest_delta']['updated'] == 1
+    assert delta_built.payloads['ingest_delta']['reused'] == ['search_blob', 'full_records']
+
+    monkeypatch.setattr(app_main.delta_service, 'enabled', False)
+    full_built = publish_export(_rows("10,00"))
+
+    assert full_built.payloads['ingest_delta'] == {"mode": "full"}
+    pd.testing.assert_series_equal(delta_built.indexes['search_blob'], full_built.indexes['search_blob'])
+    assert delta_built.payloads['full_records'] == full_built.payloads['full_records']
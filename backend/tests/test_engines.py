@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Equivalência entre PandasEngine e PolarsEngine
+==============================================
+
+Mesmo resultado nas operações da engine sobre um frame pequeno com os casos
+difíceis (formatos monetários, nulos, categóricas, acentos, empates e -0.0 na
+deduplicação). Pulado quando polars (>= POLARS_MIN_VERSION) não está instalado
+(requirements-dev.txt instala).
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.engine_service import PandasEngine, PolarsEngine, polars_supported
+from services.filter_service import FilterRuleSet
+
+pytestmark = pytest.mark.skipif(not polars_supported(), reason="polars (>= 1.20) não instalado")
+
+
+@pytest.fixture
+def frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        'Ano': [2024, 2024, 2025, 2025, 2025, 2024],
+        'Codigo_Emenda': ['2024-1234-0001', '2024-1234-0001', '2025-0001-0002', None, '2025-0001-0002', '2024-9999-0003'],
+        'Autor': ['Fulano de Tal', 'Fulano de Tal', 'Beltrana Ação', None, 'Beltrana  Ação', 'CICLANO'],
+        'Órgão': pd.Categorical([
+            '36000 - MINISTÉRIO DA SAÚDE', '36000 - MINISTÉRIO DA SAÚDE', '26000 - MINISTÉRIO DA EDUCAÇÃO',
+            None, '26000 - MINISTÉRIO DA EDUCAÇÃO', '36000 - MINISTÉRIO DA SAÚDE',
+        ]),
+        'UF Autor': [' sp', 'SP', 'RJ', None, 'rj ', 'MG'],
+        'Partido': ['PT', 'PT', 'PL', 'PSD', None, 'MDB'],
+        'RP': ['6 - EMENDA INDIVIDUAL', '6', '7 - BANCADA', None, '8', 'x'],
+        'Modalidade': ['99 - A DEFINIR', '90', ' 31 - ESTADOS', '41', None, '50'],
+        'Natureza Despesa': ['33903900', '44905200', '33', None, '3390', '339'],
+        'Dotação Atual Emenda': ['R$ 1.234,56', '1234.56', '(10.000,00)', None, '10.000', '2.500,5-'],
+        'Empenhado': ['0', '0,00', '-0', 'n/a', '', 'abc'],
+    })
+
+
+def test_parse_money_matches(frame):
+    for column in ('Dotação Atual Emenda', 'Empenhado'):
+        expected = PandasEngine().parse_money(frame[column])
+        result = PolarsEngine().parse_money(frame[column])
+        pd.testing.assert_series_equal(result, expected)
+
+    categorical = frame['Dotação Atual Emenda'].astype('category')
+    pd.testing.assert_series_equal(PolarsEngine().parse_money(categorical), PandasEngine().parse_money(categorical))
+
+
+def test_rule_masks_match_default_evaluation(frame):
+    rules = FilterRuleSet()
+    engine = PolarsEngine()
+
+    def find_column(df, candidates):
+        return next((c for c in candidates if c in df.columns), None)
+
+    for rule in rules.rules:
+        column = find_column(frame, rule['colunas'])
+        if column is None:
+            continue
+        expected = rules._rule_mask(rule, frame[column], PandasEngine().parse_money)
+        result = engine.rule_mask(rule, frame[column], engine.parse_money)
+        if result is None:
+            result = rules._rule_mask(rule, frame[column], engine.parse_money)
+        np.testing.assert_array_equal(result, expected, err_msg=rule['nome'])
+
+
+def test_dedup_positions_match(frame):
+    empenhado = np.array([0.0, -0.0, 5.0, 5.0, 5.0, 1.0])
+    dotacao = np.array([10.0, 10.0, 1.0, 2.0, 2.0, 0.0])
+
+    expected = PandasEngine().dedup_positions(frame['Codigo_Emenda'], empenhado, dotacao)
+    result = PolarsEngine().dedup_positions(frame['Codigo_Emenda'], empenhado, dotacao)
+
+    # Mesma ordem (ranking), não só o mesmo conjunto: o frame deduplicado segue essa ordem
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_search_blob_matches(frame):
+    expected = PandasEngine().search_blob(frame)
+    result = PolarsEngine().search_blob(frame)
+
+    pd.testing.assert_series_equal(result, expected)
+    assert 'beltrana acao' in result.iloc[2]
+
+
+def test_query_index_matches_pandas_filters(frame):
+    blob = PandasEngine().search_blob(frame)
+    index = PolarsEngine().query_index(frame, blob)
+    assert index is not None
+
+    positions = index.select([('anos', 'years', ['2025']), ('ministério', 'ministry', 'educa')])
+    expected = np.flatnonzero(
+        (frame['Ano'] == 2025)
+        & frame['Órgão'].astype(str).str.contains('educa', case=False, na=False)
+    )
+    np.testing.assert_array_equal(positions, expected)
+
+    positions = index.select([('ufs', 'ufs', ['SP', 'RJ'])])
+    expected = np.flatnonzero(frame['UF Autor'].astype(str).str.strip().str.upper().isin(['SP', 'RJ']))
+    np.testing.assert_array_equal(positions, expected)
+
+    all_rows = np.arange(len(frame))
+    expected = np.flatnonzero(blob.str.contains('fulano', regex=False) & blob.str.contains('saude', regex=False))
+    np.testing.assert_array_equal(index.match_tokens(all_rows, ['fulano', 'saude']), expected)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HistoryStore
+============
+
+Um valor por emenda e snapshot (o vencedor da deduplicação, não a soma das
+linhas), séries lidas só das partições em que a emenda mudou e o estado
+persistido entre instâncias.
+"""
+
+import pandas as pd
+import pytest
+
+from services.etl_service import ETLService
+from services.history_service import HistoryStore
+
+from conftest import SIOP_HEADER, siop_row
+
+CODE_A = "2025-1234-0001"
+CODE_B = "2025-1234-0002"
+
+
+def _snapshot(*rows) -> pd.DataFrame:
+    return pd.DataFrame([[row[col] for col in SIOP_HEADER] for row in rows], columns=SIOP_HEADER)
+
+
+def _file(day: int) -> dict:
+    return {'key': f"siop-data/2025/07/{day:02d}/SIOP_emendas_202507{day:02d}_100000.csv", 'etag': f'"{day}"'}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv('HISTORY_ENABLED', 'true')
+    return HistoryStore(value_parser=ETLService().parse_monetary_series, root=str(tmp_path))
+
+
+def _ingest(store: HistoryStore, day: int, *rows):
+    return store.append_snapshot(_file(day), store.project_chunk(_snapshot(*rows)))
+
+
+def test_duplicated_code_keeps_served_winner(store):
+    _ingest(
+        store, 1,
+        siop_row(**{'Empenhado': "10,00", 'Dotação Atual Emenda': "100,00"}),
+        siop_row(**{'Empenhado': "30,00", 'Dotação Atual Emenda': "50,00"}),
+        siop_row(**{'Empenhado': "30,00", 'Dotação Atual Emenda': "80,00"}),
+    )
+
+    point = store.series(CODE_A)['points'][0]
+
+    assert point['Empenhado'] == 30.0
+    assert point['Dotação Atual Emenda'] == 80.0
+
+
+def test_winner_across_chunks_matches_single_pass(store):
+    rows = [
+        siop_row(**{'Empenhado': "30,00", 'Pago': "1,00"}),
+        siop_row(**{'Empenhado': "30,00", 'Pago': "2,00"}),
+    ]
+    chunks = pd.concat([store.project_chunk(_snapshot(row)) for row in rows], ignore_index=True)
+
+    store.append_snapshot(_file(1), chunks)
+
+    assert store.series(CODE_A)['points'][0]['Pago'] == 1.0
+
+
+def test_series_reads_only_partitions_where_code_changed(store, monkeypatch):
+    _ingest(store, 1, siop_row(), siop_row(**{'Nro. Emenda': "12340002"}))
+    _ingest(store, 2, siop_row(**{'Pago': "5,00"}), siop_row(**{'Nro. Emenda': "12340002"}))
+    _ingest(store, 3, siop_row(**{'Pago': "5,00"}))
+
+    store._changed_ids = None
+    read = []
+    original = store._read_partition
+    monkeypatch.setattr(store, '_read_partition', lambda path, columns=None: read.append((path, columns)) or original(path, columns))
+
+    series = store.series(CODE_B)
+
+    full_reads = [path for path, columns in read if columns is None]
+    assert full_reads == [store.catalog()['snapshots'][0]['file'], store.catalog()['snapshots'][2]['file']]
+    assert [point['present'] for point in series['points']] == [True, False]
+    assert series['snapshots_total'] == 3
+
+
+def test_state_survives_restart(store):
+    _ingest(store, 1, siop_row())
+    _ingest(store, 2, siop_row(**{'Pago': "5,00"}))
+
+    reopened = HistoryStore(value_parser=store.value_parser, root=store.root)
+    entry = reopened.append_snapshot(_file(3), reopened.project_chunk(_snapshot(siop_row(**{'Pago': "5,00"}))))
+
+    assert entry['changed'] == 0
+    assert [point['Pago'] for point in reopened.series(CODE_A)['points']] == [0.0, 5.0]
+
+
+def test_memory_usage_counts_state_and_change_index(store):
+    assert store.memory_usage()['bytes'] == 0
+
+    _ingest(store, 1, siop_row(), siop_row(**{'Nro. Emenda': "12340002"}))
+    store.series(CODE_A)
+    usage = store.memory_usage()
+
+    assert usage['emendas'] == 2
+    assert usage['change_rows'] == 2
+    assert usage['bytes'] >= int(store._state.memory_usage(deep=True).sum())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LocalStorageBackend
+===================
+
+GET condicional (IfNoneMatch → 304, IfMatch → PreconditionFailed), Range e
+listagem com as mesmas respostas do S3, e o 304 visto pelo S3Service.
+"""
+
+import hashlib
+import io
+
+import pytest
+from botocore.exceptions import ClientError
+
+from services.s3_service import ObjectNotModified, S3Service
+from services.storage_service import LocalStorageBackend
+
+KEY = "siop-data/2025/07/20/SIOP_emendas_20250720_100000.csv"
+BODY = b"Ano;Nro. Emenda\n2025;12340001\n"
+
+
+@pytest.fixture
+def storage(tmp_path):
+    backend = LocalStorageBackend(str(tmp_path))
+    backend.put_object(KEY, BODY)
+    return backend
+
+
+def _error_code(excinfo) -> str:
+    return excinfo.value.response['Error']['Code']
+
+
+def test_etag_is_quoted_md5(storage):
+    assert storage.head_object(KEY)['ETag'] == f'"{hashlib.md5(BODY).hexdigest()}"'
+
+
+def test_if_none_match_current_etag_is_not_modified(storage):
+    etag = storage.head_object(KEY)['ETag']
+
+    with pytest.raises(ClientError) as excinfo:
+        storage.get_object(KEY, if_none_match=etag)
+
+    assert _error_code(excinfo) == '304'
+
+
+def test_if_none_match_old_etag_returns_body(storage):
+    old_etag = storage.head_object(KEY)['ETag']
+    storage.put_object(KEY, BODY + b"2025;12340002\n")
+
+    response = storage.get_object(KEY, if_none_match=old_etag)
+
+    assert response['ETag'] != old_etag
+    assert response['Body'].read() == BODY + b"2025;12340002\n"
+
+
+def test_if_match_other_etag_fails_precondition(storage):
+    with pytest.raises(ClientError) as excinfo:
+        storage.get_object(KEY, if_match='"outra-versao"')
+
+    assert _error_code(excinfo) == 'PreconditionFailed'
+
+
+def test_range_matches_s3_response(storage):
+    response = storage.get_object(KEY, byte_range=(4, 9))
+
+    assert response['Body'].read() == BODY[4:10]
+    assert response['ContentRange'] == f"bytes 4-9/{len(BODY)}"
+
+    with pytest.raises(ClientError) as excinfo:
+        storage.get_object(KEY, byte_range=(len(BODY), len(BODY) + 10))
+    assert _error_code(excinfo) == 'InvalidRange'
+
+
+def test_missing_key_codes(storage):
+    with pytest.raises(ClientError) as excinfo:
+        storage.get_object("siop-data/ausente.csv")
+    assert _error_code(excinfo) == 'NoSuchKey'
+
+    with pytest.raises(ClientError) as excinfo:
+        storage.head_object("siop-data/ausente.csv")
+    assert _error_code(excinfo) == '404'
+
+
+def test_list_objects_skips_metadata_files(storage):
+    storage.put_object("siop-data/2025/07/21/SIOP_emendas_20250721_100000.csv", BODY, metadata={'sha256': 'x'})
+
+    keys = [obj['Key'] for obj in storage.list_objects("siop-data/2025/07/")]
+
+    assert keys == [KEY, "siop-data/2025/07/21/SIOP_emendas_20250721_100000.csv"]
+
+
+def test_service_conditional_get_raises_not_modified(tmp_path, monkeypatch):
+    monkeypatch.setenv('STORAGE_BACKEND', 'local')
+    monkeypatch.setenv('LOCAL_STORAGE_ROOT', str(tmp_path))
+    service = S3Service()
+    service.storage.put_object(KEY, BODY)
+    etag = service.storage.head_object(KEY)['ETag']
+
+    with pytest.raises(ObjectNotModified):
+        service._get_object(KEY, if_none_match=etag)
+    with pytest.raises(ObjectNotModified):
+        service._download_object(KEY, io.BytesIO(), if_none_match=etag)
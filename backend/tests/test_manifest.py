@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Manifesto siop-data/latest.json
+===============================
+
+O manifesto só é usado quando confere com a listagem da partição de data mais
+recente: um arquivo mais novo (manifesto que não chegou a ser gravado) ou um
+arquivo ausente fazem a descoberta cair para a listagem.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.s3_service import S3Service
+
+TODAY = datetime.now().strftime('%Y/%m/%d')
+OLD_KEY = f"siop-data/{TODAY}/SIOP_emendas_20250720_080000.csv"
+NEW_KEY = f"siop-data/{TODAY}/SIOP_emendas_20250720_100000.csv"
+BASE_TIME = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=2)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setenv('STORAGE_BACKEND', 'local')
+    monkeypatch.setenv('LOCAL_STORAGE_ROOT', str(tmp_path))
+    return S3Service()
+
+
+def _put(service, key, minutes):
+    service.storage.put_object(key, b"Ano;Nro. Emenda\nxx\n2025;12340001\n")
+    stamp = (BASE_TIME + timedelta(minutes=minutes)).timestamp()
+    os.utime(os.path.join(service.storage.root, key), (stamp, stamp))
+
+
+def _publish_manifest(service, key, minutes):
+    modified = BASE_TIME + timedelta(minutes=minutes)
+    manifest = {'key': key, 'etag': '"x"', 'last_modified': modified.isoformat()}
+    service.storage.put_object(service.MANIFEST_KEY, json.dumps(manifest).encode('utf-8'))
+    service.invalidate_metadata_cache()
+
+
+def test_manifest_in_sync_with_partition_is_used(service):
+    _put(service, OLD_KEY, 0)
+    _publish_manifest(service, OLD_KEY, 0)
+
+    latest = service._discover_latest()
+
+    assert latest['key'] == OLD_KEY
+    assert latest['discovered_by'] == 'manifest'
+
+
+def test_stale_manifest_falls_back_to_newer_listed_file(service):
+    _put(service, OLD_KEY, 0)
+    _publish_manifest(service, OLD_KEY, 0)
+    _put(service, NEW_KEY, 30)
+
+    latest = service._discover_latest()
+
+    assert latest['key'] == NEW_KEY
+    assert latest['discovered_by'] == 'listing'
+
+
+def test_manifest_pointing_to_missing_file_is_ignored(service):
+    _put(service, OLD_KEY, 0)
+    _publish_manifest(service, NEW_KEY, 30)
+
+    latest = service._discover_latest()
+
+    assert latest['key'] == OLD_KEY
+    assert latest['discovered_by'] == 'listing'
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Download em partes (Range) do S3Service
+=======================================
+
+Roda sobre o backend local (mesmos códigos de erro do S3): o objeto muda no
+meio do download (IfMatch → PreconditionFailed) e checksum divergente.
+"""
+
+import hashlib
+import io
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+from services.s3_service import S3Service
+
+KEY = "siop-data/2025/07/20/SIOP_emendas_20250720_100000.csv"
+PART_SIZE = 16
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setenv('STORAGE_BACKEND', 'local')
+    monkeypatch.setenv('LOCAL_STORAGE_ROOT', str(tmp_path))
+    monkeypatch.setenv('S3_RANGED_DOWNLOAD', 'true')
+    service = S3Service()
+    service.download_part_size = PART_SIZE
+    return service
+
+
+def _content(fill: bytes = b'a') -> bytes:
+    return fill * (PART_SIZE * 4 + 5)
+
+
+def test_ranged_download_reassembles_parts(service):
+    body = bytes(range(256)) * 2
+    service.storage.put_object(KEY, body, metadata={'sha256': hashlib.sha256(body).hexdigest()})
+
+    target = io.BytesIO()
+    metadata = service._download_object(KEY, target)
+
+    assert target.getvalue() == body
+    assert metadata['size'] == len(body)
+
+
+def test_object_changed_between_parts_fails_with_precondition(service):
+    service.storage.put_object(KEY, _content(b'a'))
+    storage_get = service.storage.get_object
+    calls = []
+
+    def get_object(key, byte_range=None, if_match=None, if_none_match=None):
+        calls.append(if_match)
+        response = storage_get(key, byte_range=byte_range, if_match=if_match, if_none_match=if_none_match)
+        if len(calls) == 1:
+            # Nova versão publicada depois da primeira parte (mesmo tamanho, outro conteúdo)
+            path = service.storage._path(key)
+            with open(path, 'wb') as f:
+                f.write(_content(b'b'))
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        return response
+
+    service.storage.get_object = get_object
+
+    with pytest.raises(ClientError) as excinfo:
+        service._download_object(KEY, io.BytesIO())
+
+    assert excinfo.value.response['Error']['Code'] == 'PreconditionFailed'
+    # Primeira parte sem condição; as demais presas ao ETag da primeira resposta
+    assert calls[0] is None
+    assert calls[1] and set(calls[1:]) == {calls[1]}
+
+
+def test_checksum_mismatch_raises(service):
+    service.storage.put_object(KEY, _content(), metadata={'sha256': '0' * 64})
+
+    with pytest.raises(IOError, match='checksum sha256 divergente'):
+        service._download_object(KEY, io.BytesIO())
+
+
+def test_md5_etag_checked_without_sha256_metadata(service):
+    service.storage.put_object(KEY, _content())
+    storage_get = service.storage.get_object
+
+    def corrupted(key, byte_range=None, if_match=None, if_none_match=None):
+        response = storage_get(key, byte_range=byte_range, if_match=if_match, if_none_match=if_none_match)
+        data = response['Body'].read()
+        response['Body'] = io.BytesIO(data.replace(b'a', b'x', 1))
+        return response
+
+    service.storage.get_object = corrupted
+
+    with pytest.raises(IOError, match='checksum md5 divergente'):
+        service._download_object(KEY, io.BytesIO())
+
+
+@pytest.mark.parametrize('encryption', [
+    {'ServerSideEncryption': 'aws:kms'},
+    {'ServerSideEncryption': 'AES256', 'SSECustomerAlgorithm': 'AES256'},
+])
+def test_encrypted_object_etag_is_not_treated_as_md5(service, encryption):
+    # SSE-KMS/SSE-C: ETag sem '-' que não é o MD5 do conteúdo (arquivo antigo, sem sha256)
+    body = _content()
+    service.storage.put_object(KEY, body)
+    real_etag = service.storage.head_object(KEY)['ETag']
+    opaque_etag = '"0123456789abcdef0123456789abcdef"'
+    storage_get = service.storage.get_object
+
+    def get_object(key, byte_range=None, if_match=None, if_none_match=None):
+        if if_match == opaque_etag:
+            if_match = real_etag
+        response = storage_get(key, byte_range=byte_range, if_match=if_match, if_none_match=if_none_match)
+        response.update(encryption, ETag=opaque_etag)
+        return response
+
+    service.storage.get_object = get_object
+    target = io.BytesIO()
+
+    metadata = service._download_object(KEY, target)
+
+    assert target.getvalue() == body
+    assert metadata['size'] == len(body)
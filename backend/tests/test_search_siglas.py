@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Siglas de ministério na busca (/api/search)
+===========================================
+
+Sigla sem outro sentido ("MEC") vira filtro por Órgão; sigla que também é UF
+("MS", "PR", "MT") soma o filtro por Órgão ao casamento de texto, como antes.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import siop_row
+
+SAUDE = "36000 - MINISTÉRIO DA SAÚDE"
+EDUCACAO = "26000 - MINISTÉRIO DA EDUCAÇÃO"
+PRESIDENCIA = "20000 - PRESIDÊNCIA DA REPÚBLICA"
+
+
+@pytest.fixture
+def client(app_main, publish_export):
+    publish_export([
+        siop_row(**{"Nro. Emenda": "10000001", "Autor": "Dep. Alfa", "Órgão": SAUDE, "UF Autor": "MS"}),
+        siop_row(**{"Nro. Emenda": "10000002", "Autor": "Dep. Beta", "Órgão": SAUDE, "UF Autor": "SP"}),
+        siop_row(**{"Nro. Emenda": "10000003", "Autor": "Dep. Gama", "Órgão": PRESIDENCIA,
+                    "UO": "20101 - GABINETE DA PRESIDÊNCIA DA REPÚBLICA", "UF Autor": "SP"}),
+        siop_row(**{"Nro. Emenda": "10000004", "Autor": "Dep. Delta", "Órgão": EDUCACAO,
+                    "UO": "26101 - MINISTÉRIO DA EDUCAÇÃO", "UF Autor": "MS"}),
+        siop_row(**{"Nro. Emenda": "10000005", "Autor": "Dep. Eta", "Órgão": EDUCACAO,
+                    "UO": "26101 - MINISTÉRIO DA EDUCAÇÃO", "UF Autor": "PR"}),
+        siop_row(**{"Nro. Emenda": "10000006", "Autor": "Dep. Teta", "Órgão": SAUDE, "UF Autor": "PR"}),
+    ])
+    return TestClient(app_main.app)
+
+
+def _autores(client, query: str):
+    response = client.get("/api/search", params={"q": query, "limit": 100})
+    assert response.status_code == 200
+    return sorted(row["autor"] for row in response.json()["opportunities"])
+
+
+def test_uf_colliding_sigla_keeps_state_rows(client):
+    # Saúde (sigla) ou autores de MS (UF): nenhum dos dois sentidos some
+    assert _autores(client, "MS") == ["Dep. Alfa", "Dep. Beta", "Dep. Delta", "Dep. Teta"]
+
+
+def test_uf_colliding_sigla_combined_with_text(client):
+    # "pr" não vira só Presidência: Saúde de autor do PR continua encontrada
+    assert _autores(client, "saude pr") == ["Dep. Teta"]
+
+
+def test_unambiguous_sigla_is_orgao_facet(client):
+    assert _autores(client, "MEC") == ["Dep. Delta", "Dep. Eta"]